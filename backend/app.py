@@ -1,23 +1,52 @@
 # app.py - FastAPI Backend API Server
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 import os
+import asyncio
 import uuid
+import time
 import tempfile
 import json
+import hashlib
 from pathlib import Path
+from concurrent.futures import Future
 
 # Import our Python modules
-from misra_chat_client import init_vertex_ai, load_cpp_file, start_chat, send_file_intro, send_misra_violations
+from misra_chat_client import (
+    init_vertex_ai, load_cpp_file, start_chat, send_file_intro, send_misra_violations,
+    send_message_resilient, get_resilience_stats, LLMCallError, LLMDeadlineExceeded,
+    fork_chat, history_chars
+)
+from model_router import choose_model, should_escalate
+from local_fixers import apply_local_fixes, merge_snippet_sets, format_local_response
+from violation_compaction import normalize_violations, format_violations_prompt, map_snippets_to_violations
 from excel_utils import extract_violations_for_file
 from numbering import add_line_numbers
 from denumbering import remove_line_numbers
 from replace import merge_fixed_snippets_into_file
 from fixed_response_code_snippet import extract_snippets_from_response, save_snippets_to_json
 from diff_utils import create_temp_fixed_denumbered_file, get_file_content, create_diff_data, cleanup_temp_files
+from export_utils import stream_zip, stream_patch
+from source_buffer import SourceEncodingError
+from report_delta import classify_violations
+from line_shift import LineShiftIndex, ProjectLineIndex
+from line_index import read_line_range
+from snippet_validation import build_validation_tasks, failing_regions, build_reask_prompt, replace_regions, base_line
+from fix_attribution import AttributionIndex, AttributionConflict, ACCEPTED, REJECTED, REFIXED, remove_regions, build_refix_prompt
+from job_queue import JobQueue, TERMINAL_STATES
+from rate_limiter import get_rate_limiter, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from history_compaction import compact_history
+from fix_memory import apply_remembered_fixes, record_accepted_fixes, record_llm_time, get_fix_memory_stats
+from executors import get_executor, ExecutorBusy, THREAD, PROCESS
+from speculative import SpeculativePipeline, SpeculationCancelled, speculation_settings, await_result
+from profiling import (
+    profiling_settings, stage_timer, track_request, requested_mode, start_profiler, stop_profiler,
+    record_request, list_profiles, get_profile, get_slow_requests
+)
+from structured_logging import get_logger, new_correlation_id, bind_project
 
 app = FastAPI(
     title="MISRA Fix Copilot API",
@@ -25,6 +54,8 @@ app = FastAPI(
     version="1.0.0"
 )
 
+logger = get_logger("app")
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -32,12 +63,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id", "X-Request-Id"],
 )
 
+# Per-stage timings for every request; a profile when asked for with the X-Profile header
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    mode = requested_mode(request.headers.get("X-Profile"))
+    profiler = start_profiler(mode) if mode else None
+    started = time.perf_counter()
+    response = None
+    profile_id = None
+    
+    with track_request() as stages:
+        try:
+            response = await call_next(request)
+        finally:
+            seconds = time.perf_counter() - started
+            if profiler:
+                profile_id = stop_profiler(profiler, mode, request.method, request.url.path, seconds)
+            record_request(
+                request.method, request.url.path, seconds, stages,
+                response.status_code if response is not None else 500, profile_id
+            )
+    
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+# Correlation ID (and project, when given as a query parameter) for every log record of a request
+@app.middleware("http")
+async def correlate_requests(request: Request, call_next):
+    correlation_id = new_correlation_id(request.headers.get("X-Request-Id"))
+    bind_project(request.query_params.get("projectId"))
+    response = await call_next(request)
+    response.headers["X-Request-Id"] = correlation_id
+    return response
+
 # Global storage for sessions
 sessions = {}
 chat_sessions = {}
 
+# Uploaded reports and line-shift indexes per project, kept across re-uploads
+# of the fixed file (which reset the session)
+report_history = {}
+line_indexes = {}
+
+# Which snippet regions of each project's current fixes address which violations
+attributions = {}
+
 # Default model settings
 default_model_settings = {
     "model_name": "gemini-2.5-pro",
@@ -50,6 +124,19 @@ default_model_settings = {
 # Global model settings storage
 model_settings = default_model_settings.copy()
 
+# Local validation of extracted snippets
+validation_settings = {
+    "enabled": True,
+    "max_reask_rounds": 1,
+    # e.g. "g++ -fsyntax-only -x c++"; the syntax check is skipped when unset
+    "syntax_check_cmd": os.environ.get("MISRA_SYNTAX_CHECK_CMD")
+}
+
+# Deterministic local fixes for mechanical rules, applied before Gemini
+local_fixer_settings = {
+    "enabled": os.environ.get("MISRA_LOCAL_FIXERS", "1") == "1"
+}
+
 # Configure upload settings
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'cpp', 'c', 'xlsx', 'xls'}
@@ -57,6 +144,28 @@ ALLOWED_EXTENSIONS = {'cpp', 'c', 'xlsx', 'xls'}
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Background jobs for long-running steps
+job_queue = JobQueue(
+    os.path.join(UPLOAD_FOLDER, 'jobs'),
+    workers=int(os.environ.get("MISRA_JOB_WORKERS", "2")),
+    # Finished jobs are forgotten after a day
+    ttl=float(os.environ.get("MISRA_JOB_TTL", "86400"))
+)
+
+# Numbering, local fixes and the file intro, started as soon as the uploads land
+speculation = SpeculativePipeline(workers=speculation_settings['workers'])
+
+async def _offload(stage: str, fn: Callable, *args, kind: str = THREAD, **kwargs):
+    """Run a blocking stage on the shared thread or process pool; a pool that stays full answers 503"""
+    try:
+        return await get_executor().run(stage, fn, *args, kind=kind, **kwargs)
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def _write_file(path: str, content: bytes):
+    with open(path, "wb") as buffer:
+        buffer.write(content)
+
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -74,6 +183,16 @@ class FixViolationsRequest(BaseModel):
 class ApplyFixesRequest(BaseModel):
     projectId: str
 
+class JobRequest(BaseModel):
+    kind: str  # 'first-prompt', 'fix-violations' or 'apply-fixes'
+    projectId: str
+    violations: List[Dict[str, Any]] = []
+
+class ViolationReviewRequest(BaseModel):
+    projectId: str
+    violationIds: List[str]
+    feedback: Optional[str] = None
+
 class ChatRequest(BaseModel):
     message: str
     projectId: str
@@ -98,17 +217,56 @@ class GeminiResponse(BaseModel):
 class FixViolationsResponse(BaseModel):
     response: str
     codeSnippets: List[Dict[str, Any]]
+    validation: Dict[str, Any] = {}
+    routing: Dict[str, Any] = {}
+    violationFixes: List[Dict[str, Any]] = []
+    attribution: Dict[str, Any] = {}
 
 class ApplyFixesResponse(BaseModel):
     fixedFilePath: str
 
 class ChatResponse(BaseModel):
     response: str
+    historyCompaction: Dict[str, Any] = {}
+
+class AttributionResponse(BaseModel):
+    attribution: Dict[str, Any]
+    # Other violations whose fix was in the reverted or re-done lines
+    affected: List[str] = []
+    response: Optional[str] = None
+    validation: Dict[str, Any] = {}
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    projectId: str
+    state: str
+    stage: Optional[str] = None
+    progress: float = 0.0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancelRequested: bool = False
+    createdAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+    version: int = 0
+
+class ProfilingSettings(BaseModel):
+    enabled: bool
+    profile_all: bool
+    mode: str
+    slow_threshold: float
 
 class SettingsResponse(BaseModel):
     success: bool
     message: str
 
+class LineRangeResponse(BaseModel):
+    start: int
+    count: int
+    totalLines: int
+    lines: List[str]
+
 class DiffResponse(BaseModel):
     original: str
     fixed: str
@@ -120,6 +278,10 @@ class DiffResponse(BaseModel):
 async def startup_event():
     init_vertex_ai()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    get_executor().shutdown()
+
 # Settings endpoints
 @app.get("/api/settings", response_model=ModelSettings)
 async def get_settings():
@@ -132,6 +294,8 @@ async def save_settings(settings: ModelSettings):
     try:
         global model_settings
         model_settings = settings.dict()
+        # Intros sent ahead of time used the old settings
+        speculation.invalidate(stages=('intro',))
         
         # Optional: Save to file for persistence
         settings_file = os.path.join(UPLOAD_FOLDER, 'model_settings.json')
@@ -150,6 +314,7 @@ async def upload_cpp_file(
     file: UploadFile = File(...),
     projectId: str = Form(...)
 ):
+    bind_project(projectId)
     try:
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file selected")
@@ -161,21 +326,27 @@ async def upload_cpp_file(
         filename = file.filename
         file_path = os.path.join(UPLOAD_FOLDER, f"{projectId}_{filename}")
         
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        content = await file.read()
+        await _offload("write-upload", _write_file, file_path, content)
         
-        # Initialize session
+        # Initialize session; a new upload makes every speculative result of the project stale
+        speculation.invalidate(projectId)
         sessions[projectId] = {
             'cpp_file': file_path,
-            'original_filename': filename
+            'original_filename': filename,
+            'upload_id': uuid.uuid4().hex
         }
+        # The new session has no snippets; attributions of the previous file's fixes no longer apply
+        attributions.pop(projectId, None)
+        _speculate(projectId)
         
         return UploadResponse(
             filePath=file_path,
             fileName=filename
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -185,6 +356,7 @@ async def upload_misra_report(
     projectId: str = Form(...),
     targetFile: str = Form(...)
 ):
+    bind_project(projectId)
     try:
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file selected")
@@ -193,27 +365,249 @@ async def upload_misra_report(
         filename = file.filename
         excel_path = os.path.join(UPLOAD_FOLDER, f"{projectId}_report_{filename}")
         
-        with open(excel_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        content = await file.read()
+        await _offload("write-upload", _write_file, excel_path, content)
         
         # Extract violations
-        violations = extract_violations_for_file(excel_path, targetFile)
+        with stage_timer("parse-report"):
+            violations = await _offload("parse-report", extract_violations_for_file, excel_path, targetFile, kind=PROCESS)
         
         # Store in session
         if projectId in sessions:
             sessions[projectId]['excel_file'] = excel_path
             sessions[projectId]['violations'] = violations
+        _record_report(projectId, targetFile, violations)
+        _speculate(projectId)
         
         return violations
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _file_version(project_id: str) -> int:
+    """Version of the project's current source file in its line-shift index"""
+    line_index = line_indexes.setdefault(project_id, ProjectLineIndex())
+    return sessions.get(project_id, {}).get('line_version', line_index.current_version)
+
+def _record_report(project_id: str, target_file: str, violations: list):
+    report_history.setdefault(project_id, []).append({
+        'targetFile': target_file,
+        'violations': violations,
+        'version': _file_version(project_id)
+    })
+
+@app.post("/api/upload/misra-report-delta")
+async def upload_misra_report_delta(
+    file: UploadFile = File(...),
+    projectId: str = Form(...),
+    targetFile: str = Form(...)
+):
+    """
+    Upload a re-analysis report and compare it with the previous report for
+    the same file. Only new and persisting violations are returned for fixing.
+    """
+    bind_project(projectId)
+    try:
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="No file selected")
+        
+        # Save Excel file
+        filename = file.filename
+        excel_path = os.path.join(UPLOAD_FOLDER, f"{projectId}_report_{filename}")
+        
+        content = await file.read()
+        await _offload("write-upload", _write_file, excel_path, content)
+        
+        # Extract violations
+        with stage_timer("parse-report"):
+            violations = await _offload("parse-report", extract_violations_for_file, excel_path, targetFile, kind=PROCESS)
+        
+        previous = next(
+            (r for r in reversed(report_history.get(projectId, [])) if r['targetFile'] == targetFile),
+            None
+        )
+        if previous:
+            # Lines of the previous report are mapped onto this report's file through every applied fix round
+            line_index = line_indexes.setdefault(projectId, ProjectLineIndex())
+            version = _file_version(projectId)
+            delta = classify_violations(
+                previous['violations'], violations,
+                lambda line: line_index.remap(line, previous['version'], version)
+            )
+        else:
+            delta = {'new': violations, 'persisting': [], 'resolved': []}
+        # New and persisting entries, in report order; resolved ones only exist in the previous report
+        unresolved = violations
+        logger.info(
+            "Report delta: %d new, %d persisting, %d resolved",
+            len(delta['new']), len(delta['persisting']), len(delta['resolved'])
+        )
+        
+        # Store in session
+        if projectId in sessions:
+            sessions[projectId]['excel_file'] = excel_path
+            sessions[projectId]['violations'] = unresolved
+        _record_report(projectId, targetFile, violations)
+        _speculate(projectId)
+        
+        return {
+            'violations': unresolved,
+            'new': delta['new'],
+            'persisting': delta['persisting'],
+            'resolved': delta['resolved'],
+            'hasPrevious': previous is not None
+        }
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Speculative pipeline: steps whose inputs are known run before they are requested
+def _numbered_path(project_id: str, session: dict, upload_id: Optional[str] = None) -> str:
+    """Numbered file path; speculative files carry the upload id so a stale task cannot overwrite a newer file"""
+    original_name = Path(session['original_filename']).stem
+    numbered_filename = f"numbered_{original_name}.txt"
+    prefix = f"{project_id}_{upload_id}" if upload_id else project_id
+    return os.path.join(UPLOAD_FOLDER, f"{prefix}_{numbered_filename}")
+
+def _violations_key(violations: list) -> str:
+    return hashlib.sha1(json.dumps(violations, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _intro_key(project_id: str) -> tuple:
+    return (sessions[project_id].get('upload_id'), json.dumps(model_settings, sort_keys=True))
+
+def _violation_line(violation: dict) -> Optional[int]:
+    try:
+        return int(violation.get('line'))
+    except (TypeError, ValueError):
+        return None
+
+def _validate_local_snippets(numbered_file: str, snippets: dict, handled: list) -> tuple:
+    """
+    Run the snippet validation checks on local and remembered fixes.
+    
+    Every fix touches its violation's own line, so a violation is rejected
+    when its line lies in a failing region; all snippets of those regions
+    are dropped.
+    
+    Returns:
+        Tuple of (valid snippets, rejected violations)
+    """
+    tasks = build_validation_tasks(
+        format_local_response(snippets, handled), snippets, numbered_file, validation_settings['syntax_check_cmd']
+    )
+    # Called on a stage thread already; waiting there on the process pool would hold the
+    # thread idle and use up the thread pool's pending budget, so the checks run in place
+    issues = [issue for fn, args in tasks for issue in fn(*args)]
+    regions = failing_regions(issues, snippets)
+    if not regions:
+        return snippets, []
+    
+    in_regions = lambda line: line is not None and any(first <= line <= last for first, last in regions)
+    valid = {k: v for k, v in snippets.items() if not in_regions(base_line(k))}
+    rejected = [v for v in handled if in_regions(_violation_line(v))]
+    logger.info("Local fixes for %d violations failed validation in regions %s", len(rejected), regions)
+    return valid, rejected
+
+def _split_violations(numbered_file: Optional[str], violations: list) -> tuple:
+    """
+    Fix mechanical violations locally and reuse remembered fixes.
+    
+    Returns:
+        Tuple of (snippets, locally fixed violations, remembered violations,
+        violations left for the LLM)
+    """
+    local_snippets, local_fixed, remaining = {}, [], violations
+    if local_fixer_settings['enabled'] and numbered_file:
+        with stage_timer("local-fixes"):
+            local_snippets, local_fixed, remaining = apply_local_fixes(numbered_file, violations)
+        logger.info("Fixed %d violations locally", len(local_fixed))
+    
+    # Reuse fixes accepted earlier for the same rule and code pattern
+    remembered = []
+    if numbered_file and remaining:
+        with stage_timer("fix-memory"):
+            memory_snippets, remembered, remaining = apply_remembered_fixes(numbered_file, remaining, taken=local_snippets)
+        local_snippets = {**local_snippets, **memory_snippets}
+        logger.info("Reused %d remembered fixes", len(remembered))
+    
+    # Rewrites that break the code go to the LLM like any other violation
+    if validation_settings['enabled'] and local_snippets:
+        with stage_timer("validation"):
+            local_snippets, rejected = _validate_local_snippets(
+                numbered_file, local_snippets, local_fixed + remembered
+            )
+        if rejected:
+            dropped = {id(v) for v in rejected}
+            local_fixed = [v for v in local_fixed if id(v) not in dropped]
+            remembered = [v for v in remembered if id(v) not in dropped]
+            remaining = remaining + rejected
+    
+    return local_snippets, local_fixed, remembered, remaining
+
+def _speculate_numbering(cancelled, input_file: str, numbered_path: str) -> tuple:
+    return numbered_path, get_executor().run_sync("numbering", add_line_numbers, input_file, numbered_path, kind=PROCESS)
+
+def _speculate_split(cancelled, numbering: Future, violations: list) -> tuple:
+    numbered_file, _ = numbering.result()
+    if cancelled.is_set():
+        raise SpeculationCancelled()
+    return _split_violations(numbered_file, violations)
+
+def _speculate_intro(cancelled, numbering: Future, settings: dict, project_id: str) -> tuple:
+    numbered_file, _ = numbering.result()
+    # Checked again right before the LLM call, the only step worth skipping
+    if cancelled.is_set():
+        raise SpeculationCancelled()
+    chat = _start_chat(settings)
+    response = send_file_intro(chat, load_cpp_file(numbered_file), project_id=project_id, priority=PRIORITY_BULK)
+    if response is None:
+        raise ValueError("Intro response was blocked by safety filters")
+    return chat, response
+
+def _speculate(project_id: str):
+    """
+    Start the steps whose inputs are available: numbering once the source is
+    uploaded, then the local-fix split of the whole report and the file intro
+    once the report is in. Each step endpoint adopts the result only if its
+    inputs still match.
+    """
+    session = sessions.get(project_id)
+    if not session or not session.get('upload_id') or not speculation_settings['enabled']:
+        return
+    upload_id = session['upload_id']
+    
+    if session.get('numbered_file'):
+        # Already numbered (adopted or run directly); chain on the existing file
+        numbering = Future()
+        numbering.set_result((session['numbered_file'], session.get('source_format')))
+    else:
+        numbering = speculation.start(
+            project_id, 'numbering', upload_id,
+            _speculate_numbering, session['cpp_file'], _numbered_path(project_id, session, upload_id)
+        )
+    
+    if 'violations' not in session:
+        return
+    speculation.start(
+        project_id, 'local-fixes', (upload_id, _violations_key(session['violations'])),
+        _speculate_split, numbering, session['violations']
+    )
+    # Skipped once the project's chat was started for this upload
+    if speculation_settings['intro'] and session.get('chat_upload_id') != upload_id:
+        speculation.start(
+            project_id, 'intro', _intro_key(project_id),
+            _speculate_intro, numbering, dict(model_settings), project_id
+        )
+
 @app.post("/api/process/add-line-numbers", response_model=ProcessResponse)
 async def process_add_line_numbers(request: LineNumbersRequest):
     try:
         project_id = request.projectId
+        bind_project(project_id)
         
         if project_id not in sessions:
             raise HTTPException(status_code=404, detail="Project not found")
@@ -221,176 +615,374 @@ async def process_add_line_numbers(request: LineNumbersRequest):
         session = sessions[project_id]
         input_file = session['cpp_file']
         
-        # Create numbered file with .txt extension
-        original_name = Path(session['original_filename']).stem
-        numbered_filename = f"numbered_{original_name}.txt"
-        numbered_path = os.path.join(UPLOAD_FOLDER, f"{project_id}_{numbered_filename}")
-        
-        add_line_numbers(input_file, numbered_path)
+        # Adopt the numbering started at upload, waiting for it if it is still running
+        numbered = await await_result(speculation.take(project_id, 'numbering', session.get('upload_id')))
+        if numbered:
+            numbered_path, source_format = numbered
+        else:
+            # Create numbered file with .txt extension
+            numbered_path = _numbered_path(project_id, session)
+            with stage_timer("numbering"):
+                source_format = await _offload("numbering", add_line_numbers, input_file, numbered_path, kind=PROCESS)
         
         # Update session
         sessions[project_id]['numbered_file'] = numbered_path
+        sessions[project_id]['source_format'] = source_format
         
         return ProcessResponse(numberedFilePath=numbered_path)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/gemini/first-prompt", response_model=GeminiResponse)
-async def gemini_first_prompt(request: FirstPromptRequest):
-    try:
-        project_id = request.projectId
-        
-        if project_id not in sessions:
-            raise HTTPException(status_code=404, detail="Project not found")
-        
-        session = sessions[project_id]
-        numbered_file = session['numbered_file']
-        
+def _report(progress: Optional[Callable], stage: str, fraction: Optional[float] = None):
+    """Report step progress when running as a background job"""
+    if progress:
+        progress(stage, fraction)
+
+def _start_chat(settings: dict):
+    """Start a chat session with the given model settings"""
+    return start_chat(
+        model_name=settings['model_name'],
+        temperature=settings['temperature'],
+        top_p=settings['top_p'],
+        max_tokens=settings['max_tokens'],
+        safety_settings=settings['safety_settings']
+    )
+
+async def run_first_prompt(project_id: str, progress: Optional[Callable] = None) -> GeminiResponse:
+    bind_project(project_id)
+    if project_id not in sessions:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    session = sessions[project_id]
+    numbered_file = session['numbered_file']
+    
+    # Adopt the intro sent at upload time if it was for this file and the current settings
+    with stage_timer("llm"):
+        speculated = await await_result(speculation.take(project_id, 'intro', _intro_key(project_id)))
+    if speculated:
+        chat, response = speculated
+    else:
         # Load numbered file content
-        numbered_content = load_cpp_file(numbered_file)
+        _report(progress, "loading", 0.1)
+        numbered_content = await _offload("load-file", load_cpp_file, numbered_file)
         
         # Start chat session with current model settings
-        chat = start_chat(
-            model_name=model_settings['model_name'],
-            temperature=model_settings['temperature'],
-            top_p=model_settings['top_p'],
-            max_tokens=model_settings['max_tokens'],
-            safety_settings=model_settings['safety_settings']
-        )
+        chat = _start_chat(model_settings)
         
         # Send first prompt
-        response = send_file_intro(chat, numbered_content)
-        
-        # Check if response is None (blocked by safety filters)
-        if response is None:
-            raise HTTPException(
-                status_code=422, 
-                detail="Response was blocked by safety filters. Please try with different content or contact support."
+        _report(progress, "sending", 0.2)
+        with stage_timer("llm"):
+            response = await _offload(
+                "llm", send_file_intro, chat, numbered_content, project_id=project_id, priority=PRIORITY_INTERACTIVE
             )
-        
-        # Store chat session
-        chat_sessions[project_id] = chat
-        
-        return GeminiResponse(response=response)
+    
+    # Check if response is None (blocked by safety filters)
+    if response is None:
+        raise HTTPException(
+            status_code=422, 
+            detail="Response was blocked by safety filters. Please try with different content or contact support."
+        )
+    
+    # Store chat session
+    _report(progress, "saving", 0.9)
+    chat_sessions[project_id] = chat
+    session['chat_upload_id'] = session.get('upload_id')
+    
+    return GeminiResponse(response=response)
+
+@app.post("/api/gemini/first-prompt", response_model=GeminiResponse)
+async def gemini_first_prompt(request: FirstPromptRequest):
+    try:
+        return await run_first_prompt(request.projectId)
         
     except HTTPException:
         raise
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except LLMCallError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-import logging
-import traceback
+async def _run_validation(response_text: str, code_snippets: dict, numbered_file: str) -> list:
+    """Run the snippet validation checks in parallel on the process pool"""
+    tasks = build_validation_tasks(
+        response_text, code_snippets, numbered_file, validation_settings['syntax_check_cmd']
+    )
+    results = await asyncio.gather(*[_offload("validation", fn, *args, kind=PROCESS) for fn, args in tasks])
+    return [issue for result in results for issue in result]
+
+async def validate_and_reask(chat, response_text: str, code_snippets: dict, numbered_file: str, project_id: Optional[str] = None):
+    """
+    Validate extracted snippets and re-ask the model only for the failing regions.
+    
+    Returns:
+        Tuple of (snippets, validation summary, combined response text)
+    """
+    issues = await _run_validation(response_text, code_snippets, numbered_file)
+    responses = [response_text]
+    rounds = 0
+    
+    while issues and rounds < validation_settings['max_reask_rounds']:
+        regions = failing_regions(issues, code_snippets)
+        if not regions:
+            break
+        
+        rounds += 1
+        logger.info("Validation found %d issues, re-asking for regions %s", len(issues), regions)
+        reask = await _offload("llm", send_message_resilient, chat, build_reask_prompt(issues, regions), project_id=project_id)
+        if reask is None or not reask.text:
+            break
+        
+        corrected = extract_snippets_from_response(reask.text)
+        code_snippets = replace_regions(code_snippets, corrected, regions)
+        responses.append(reask.text)
+        issues = await _run_validation(reask.text, code_snippets, numbered_file)
+    
+    validation = {"valid": not issues, "issues": issues, "reaskRounds": rounds}
+    return code_snippets, validation, "\n\n".join(responses)
+
+async def request_fixes(chat, model_name: str, violations_str: str, numbered_file: Optional[str], project_id: Optional[str] = None):
+    """
+    Send a fix prompt to the given model on a fork of the chat session,
+    then extract and validate the snippets.
+    
+    The fork's history is only adopted by the caller, so a failed attempt
+    can be retried on another model from the same starting point.
+    
+    Returns:
+        Tuple of (forked chat, response text, snippets, validation summary)
+    """
+    routed = fork_chat(chat, model_name)
+    
+    # Send to Gemini
+    logger.debug("Sending to Gemini (%s)...", model_name)
+    response = await _offload("llm", send_misra_violations, routed, violations_str, project_id=project_id)
+    logger.debug("Gemini response received: %s", response is not None)
+    
+    # Check if response is None (blocked by safety filters)
+    if response is None:
+        raise HTTPException(
+            status_code=422, 
+            detail="Response was blocked by safety filters. Please try with different content or contact support."
+        )
+    
+    # Extract code snippets
+    logger.debug("Extracting snippets...")
+    code_snippets = extract_snippets_from_response(response)
+    logger.debug("Extracted %d snippets", len(code_snippets))
+    
+    # Validate snippets locally before they reach the diff view
+    validation = {}
+    if validation_settings['enabled'] and numbered_file and code_snippets:
+        code_snippets, validation, response = await validate_and_reask(
+            routed, response, code_snippets, numbered_file, project_id
+        )
+    
+    return routed, response, code_snippets, validation
+
+async def fix_with_llm(chat, violations: list, numbered_file: Optional[str], project_id: Optional[str] = None):
+    """
+    Send violations to Gemini using the routed model, escalating to the
+    strong model when the snippets fail validation.
+    
+    The chat itself is not changed; the caller adopts the routed history
+    once it commits to the result.
+    
+    Returns:
+        Tuple of (routed chat, response text, snippets, validation summary, routing info)
+    """
+    # Format violations for Gemini, deduplicated and grouped by rule and message
+    violations = normalize_violations(violations)
+    violations_str = format_violations_prompt(violations)
+    logger.debug("Formatted %d unique violations, length: %d", len(violations), len(violations_str))
+    
+    # Pick the model for this batch and escalate if its snippets fail validation
+    strong_model = model_settings['model_name']
+    model_name, reason = choose_model(violations, len(violations_str) + history_chars(chat), strong_model)
+    routing = {"model": model_name, "reason": reason, "escalated": False}
+    logger.info("Routing to %s: %s", model_name, reason)
+    
+    try:
+        routed, response, code_snippets, validation = await request_fixes(
+            chat, model_name, violations_str, numbered_file, project_id
+        )
+    except LLMCallError as e:
+        # A failing fast model (e.g. during a health probe) must not fail the request
+        if model_name == strong_model:
+            raise
+        logger.warning("%s failed, falling back to %s: %s", model_name, strong_model, e)
+        model_name = strong_model
+        routed, response, code_snippets, validation = await request_fixes(
+            chat, strong_model, violations_str, numbered_file, project_id
+        )
+        routing.update(model=strong_model, escalated=True)
+    
+    if should_escalate(model_name, strong_model, validation):
+        logger.info("Escalating to %s after failed validation", strong_model)
+        routed, response, code_snippets, validation = await request_fixes(
+            chat, strong_model, violations_str, numbered_file, project_id
+        )
+        routing.update(model=strong_model, escalated=True)
+    
+    return routed, response, code_snippets, validation, routing
+
+async def run_fix_violations(project_id: str, violations: List[Dict[str, Any]], progress: Optional[Callable] = None) -> FixViolationsResponse:
+    bind_project(project_id)
+    logger.info("Fixing %d violations", len(violations))
+    
+    if project_id not in chat_sessions:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    chat = chat_sessions[project_id]
+    
+    numbered_file = sessions.get(project_id, {}).get('numbered_file')
+    
+    # Fix mechanical violations locally and send only the rest to Gemini; the
+    # split computed at upload time is reused when the whole report is sent
+    _report(progress, "local-fixes", 0.1)
+    upload_id = sessions.get(project_id, {}).get('upload_id')
+    split = await await_result(speculation.take(project_id, 'local-fixes', (upload_id, _violations_key(violations))))
+    if split is None:
+        split = await _offload("local-fixes", _split_violations, numbered_file, violations)
+    local_snippets, local_fixed, remembered, remaining = split
+    
+    if remaining:
+        _report(progress, "llm", 0.2)
+        llm_started = time.monotonic()
+        with stage_timer("llm"):
+            routed, response, code_snippets, validation, routing = await fix_with_llm(chat, remaining, numbered_file, project_id)
+        record_llm_time(time.monotonic() - llm_started, len(remaining))
+        if local_snippets:
+            code_snippets = merge_snippet_sets(local_snippets, code_snippets, numbered_file)
+    else:
+        routed = None
+        response = format_local_response(local_snippets, local_fixed + remembered)
+        code_snippets, validation = local_snippets, {}
+        routing = {"model": "local", "reason": "all violations fixed locally", "escalated": False}
+    routing['localFixes'] = len(local_fixed)
+    routing['memoryFixes'] = len(remembered)
+    
+    # Last point at which a job can be cancelled; nothing of the project was changed yet
+    _report(progress, "saving", 0.9)
+    
+    # Keep the routed conversation as the project's chat history
+    if routed is not None:
+        chat.history[:] = routed.history
+    
+    # Map the returned snippets back to each violation of the request
+    violation_fixes = map_snippets_to_violations(code_snippets, violations)
+    attributions[project_id] = AttributionIndex(violations, code_snippets)
+    
+    # Save snippets to session
+    if project_id in sessions:
+        logger.debug("Saving snippets to session...")
+        sessions[project_id]['fixed_snippets'] = code_snippets
+        sessions[project_id]['llm_violations'] = remaining
+        snippet_file = os.path.join(UPLOAD_FOLDER, f"{project_id}_snippets.json")
+        save_snippets_to_json(code_snippets, snippet_file)
+        sessions[project_id]['snippet_file'] = snippet_file
+        logger.debug("Snippets saved to: %s", snippet_file)
+        
+        # Create temporary fixed files for immediate diff view
+        try:
+            session = sessions[project_id]
+            numbered_file = session.get('numbered_file')
+            if numbered_file:
+                with stage_timer("temp-fixed-files"):
+                    temp_fixed_numbered_path, temp_fixed_denumbered_path = await _offload(
+                        "temp-fixed-files", create_temp_fixed_denumbered_file,
+                        numbered_file, code_snippets, project_id, UPLOAD_FOLDER, kind=PROCESS
+                    )
+                session['temp_fixed_numbered'] = temp_fixed_numbered_path
+                session['temp_fixed_denumbered'] = temp_fixed_denumbered_path
+                logger.debug("Created temporary fixed files")
+        except Exception as e:
+            logger.error("Error creating temporary fixed files: %s", e)
+    
+    return FixViolationsResponse(
+        response=response,
+        codeSnippets=[{"code": snippet} for snippet in code_snippets.values()],
+        validation=validation,
+        routing=routing,
+        violationFixes=violation_fixes,
+        attribution=attributions[project_id].to_dict()
+    )
 
 @app.post("/api/gemini/fix-violations", response_model=FixViolationsResponse)
 async def gemini_fix_violations(request: FixViolationsRequest):
     try:
-        project_id = request.projectId
-        violations = request.violations
-        
-        print(f"Processing project_id: {project_id}")  # Debug
-        print(f"Number of violations: {len(violations)}")  # Debug
-        
-        if project_id not in chat_sessions:
-            raise HTTPException(status_code=404, detail="Chat session not found")
-        
-        chat = chat_sessions[project_id]
-        
-        # Format violations for Gemini
-        violations_text = []
-        for v in violations:
-            violations_text.append(
-                f"File: {v['file']}\n"
-                f"Path: {v['path']}\n"
-                f"Line: {v['line']}\n"
-                f"Rule: {v['misra']}\n"
-                f"Message: {v['warning']}\n"
-            )
-        
-        violations_str = "\n".join(violations_text)
-        print(f"Formatted violations length: {len(violations_str)}")  # Debug
-        
-        # Send to Gemini
-        print("Sending to Gemini...")  # Debug
-        response = send_misra_violations(chat, violations_str)
-        print(f"Gemini response received: {response is not None}")  # Debug
-        
-        # Check if response is None (blocked by safety filters)
-        if response is None:
-            raise HTTPException(
-                status_code=422, 
-                detail="Response was blocked by safety filters. Please try with different content or contact support."
-            )
-        
-        # Extract code snippets
-        print("Extracting snippets...")  # Debug
-        code_snippets = extract_snippets_from_response(response)
-        print(f"Extracted {len(code_snippets)} snippets")  # Debug
-        
-        # Save snippets to session
-        if project_id in sessions:
-            print("Saving snippets to session...")  # Debug
-            sessions[project_id]['fixed_snippets'] = code_snippets
-            snippet_file = os.path.join(UPLOAD_FOLDER, f"{project_id}_snippets.json")
-            save_snippets_to_json(code_snippets, snippet_file)
-            sessions[project_id]['snippet_file'] = snippet_file
-            print(f"Snippets saved to: {snippet_file}")  # Debug
-            
-            # Create temporary fixed files for immediate diff view
-            try:
-                session = sessions[project_id]
-                numbered_file = session.get('numbered_file')
-                if numbered_file:
-                    temp_fixed_numbered_path, temp_fixed_denumbered_path = create_temp_fixed_denumbered_file(
-                        numbered_file, code_snippets, project_id, UPLOAD_FOLDER
-                    )
-                    session['temp_fixed_numbered'] = temp_fixed_numbered_path
-                    session['temp_fixed_denumbered'] = temp_fixed_denumbered_path
-                    print(f"Created temporary fixed files for project {project_id}")
-            except Exception as e:
-                print(f"Error creating temporary fixed files: {str(e)}")
-        
-        return FixViolationsResponse(
-            response=response,
-            codeSnippets=[{"code": snippet} for snippet in code_snippets.values()]
-        )
+        return await run_fix_violations(request.projectId, request.violations)
         
     except HTTPException:
         raise
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except LLMCallError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         # Add detailed error logging
-        print(f"Error in gemini_fix_violations: {str(e)}")
-        print(f"Error type: {type(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in gemini_fix_violations (%s): %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
+async def run_apply_fixes(project_id: str, progress: Optional[Callable] = None) -> ApplyFixesResponse:
+    bind_project(project_id)
+    if project_id not in sessions:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    session = sessions[project_id]
+    numbered_file = session['numbered_file']
+    fixed_snippets = session.get('fixed_snippets', {})
+    
+    # Apply fixes
+    _report(progress, "merging", 0.1)
+    fixed_filename = f"fixed_{session['original_filename']}"
+    fixed_numbered_path = os.path.join(UPLOAD_FOLDER, f"{project_id}_fixed_numbered_{session['original_filename']}")
+    
+    with stage_timer("merge"):
+        await _offload("merge", merge_fixed_snippets_into_file, numbered_file, fixed_snippets, fixed_numbered_path, kind=PROCESS)
+    
+    # Remove line numbers for final file
+    _report(progress, "denumbering", 0.6)
+    final_fixed_path = os.path.join(UPLOAD_FOLDER, f"{project_id}_{fixed_filename}")
+    with stage_timer("denumbering"):
+        await _offload(
+            "denumbering", remove_line_numbers, fixed_numbered_path, final_fixed_path, session.get('source_format'), kind=PROCESS
+        )
+    
+    # Update session
+    sessions[project_id]['fixed_file'] = final_fixed_path
+    
+    # Remember the applied LLM fixes (including chat refinements) so other files can reuse them;
+    # only now that the fixed file is written, and once per project and line
+    try:
+        violation_fixes = map_snippets_to_violations(fixed_snippets, session.get('llm_violations', []))
+        recorded = await _offload(
+            "fix-memory", record_accepted_fixes, numbered_file, fixed_snippets, violation_fixes, source=project_id
+        )
+        logger.info("Recorded %d fixes in fix memory", recorded)
+    except Exception as e:
+        logger.error("Error recording fixes in fix memory: %s", e)
+    
+    # Record how the fixes shift lines; applying again to the same file replaces its version
+    line_index = line_indexes.setdefault(project_id, ProjectLineIndex())
+    version = session.setdefault('line_version', line_index.current_version)
+    line_index.set_version(version, LineShiftIndex.from_snippets(fixed_snippets))
+    
+    return ApplyFixesResponse(fixedFilePath=final_fixed_path)
+
 @app.post("/api/process/apply-fixes", response_model=ApplyFixesResponse)
 async def process_apply_fixes(request: ApplyFixesRequest):
     try:
-        project_id = request.projectId
-        
-        if project_id not in sessions:
-            raise HTTPException(status_code=404, detail="Project not found")
-        
-        session = sessions[project_id]
-        numbered_file = session['numbered_file']
-        fixed_snippets = session.get('fixed_snippets', {})
-        
-        # Apply fixes
-        fixed_filename = f"fixed_{session['original_filename']}"
-        fixed_numbered_path = os.path.join(UPLOAD_FOLDER, f"{project_id}_fixed_numbered_{session['original_filename']}")
-        
-        merge_fixed_snippets_into_file(numbered_file, fixed_snippets, fixed_numbered_path)
-        
-        # Remove line numbers for final file
-        final_fixed_path = os.path.join(UPLOAD_FOLDER, f"{project_id}_{fixed_filename}")
-        remove_line_numbers(fixed_numbered_path, final_fixed_path)
-        
-        # Update session
-        sessions[project_id]['fixed_file'] = final_fixed_path
-        
-        return ApplyFixesResponse(fixedFilePath=final_fixed_path)
+        return await run_apply_fixes(request.projectId)
         
+    except HTTPException:
+        raise
+    except SourceEncodingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -415,19 +1007,114 @@ async def download_fixed_file(projectId: str = Query(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _export_artifacts(project_ids: List[str], source: str) -> List[Dict[str, str]]:
+    """
+    Collect the original and fixed file of each project for export.
+    
+    'fixed' prefers the applied fixed file and falls back to the temporary
+    fixed file of unapplied snippets; 'temp-fixed' always uses the latter.
+    """
+    artifacts = []
+    names = set()
+    for project_id in project_ids or list(sessions):
+        session = sessions.get(project_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Project not found: {project_id}")
+        if 'cpp_file' not in session:
+            continue
+        
+        fixed_path = session.get('fixed_file') if source == 'fixed' else None
+        if not fixed_path or not os.path.exists(fixed_path):
+            if not session.get('numbered_file'):
+                continue
+            fixed_path = session.get('temp_fixed_denumbered')
+            if not fixed_path or not os.path.exists(fixed_path):
+                temp_fixed_numbered_path, fixed_path = await _offload(
+                    "temp-fixed-files", create_temp_fixed_denumbered_file,
+                    session['numbered_file'], session.get('fixed_snippets', {}), project_id, UPLOAD_FOLDER, kind=PROCESS
+                )
+                session['temp_fixed_numbered'] = temp_fixed_numbered_path
+                session['temp_fixed_denumbered'] = fixed_path
+        
+        # Keep entry names unique when several projects fix files with the same name
+        name = session['original_filename']
+        if name in names:
+            name = f"{project_id}/{name}"
+        names.add(name)
+        
+        artifacts.append({'name': name, 'original': session['cpp_file'], 'fixed': fixed_path})
+    
+    return artifacts
+
+@app.get("/api/export")
+async def export_fixes(
+    projectIds: List[str] = Query([]),
+    format: str = Query("zip"),
+    source: str = Query("fixed")
+):
+    """
+    Stream the fixed files of several projects as a zip (fixed files plus
+    one .patch per file) or as a single concatenated unified patch.
+    Without projectIds every project is exported.
+    """
+    try:
+        if format not in ("zip", "patch"):
+            raise HTTPException(status_code=400, detail="Format must be 'zip' or 'patch'")
+        if source not in ("fixed", "temp-fixed"):
+            raise HTTPException(status_code=400, detail="Source must be 'fixed' or 'temp-fixed'")
+        
+        artifacts = await _export_artifacts(projectIds, source)
+        if not artifacts:
+            raise HTTPException(status_code=404, detail="No fixed files to export")
+        
+        if format == "zip":
+            return StreamingResponse(
+                stream_zip(artifacts),
+                media_type="application/zip",
+                headers={"Content-Disposition": 'attachment; filename="misra_fixes.zip"'}
+            )
+        
+        return StreamingResponse(
+            stream_patch(artifacts),
+            media_type="text/x-diff",
+            headers={"Content-Disposition": 'attachment; filename="misra_fixes.patch"'}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
         message = request.message
         project_id = request.projectId
+        bind_project(project_id)
         
         if project_id not in chat_sessions:
             raise HTTPException(status_code=404, detail="Chat session not found")
         
         chat_session = chat_sessions[project_id]
         
+        # Re-send the file in its current merged state instead of the original
+        # and summarize stale fix responses before the whole history goes out
+        current_numbered = None
+        if project_id in sessions and sessions[project_id].get('numbered_file'):
+            current_numbered = await _offload("read-file", get_file_content, await _ensure_temp_fixed_file(project_id))
+        with stage_timer("compaction"):
+            compacted, compaction = await _offload("compaction", compact_history, chat_session.history, current_numbered)
+        chat_session.history[:] = compacted
+        if compaction['tokensSaved']:
+            logger.info("Chat history compacted: %d -> %d estimated tokens",
+                        compaction['tokensBefore'], compaction['tokensAfter'])
+        
         # Send message to Gemini
-        response = chat_session.send_message(message)
+        # Interactive turns are served ahead of queued bulk fix requests
+        with stage_timer("llm"):
+            response = await _offload(
+                "llm", send_message_resilient, chat_session, message, project_id=project_id, priority=PRIORITY_INTERACTIVE
+            )
         
         # Check if response is None or blocked
         if response is None or response.text is None:
@@ -438,38 +1125,263 @@ async def chat(request: ChatRequest):
         
         # Extract code snippets from response and save to session
         if project_id in sessions:
-            print("Extracting snippets from chat response...")  # Debug
+            logger.debug("Extracting snippets from chat response...")
             code_snippets = extract_snippets_from_response(response.text)
-            print(f"Extracted {len(code_snippets)} snippets from chat")  # Debug
+            logger.debug("Extracted %d snippets from chat", len(code_snippets))
             
             # Save snippets to session (same as fix-violations endpoint)
             sessions[project_id]['fixed_snippets'] = code_snippets
             snippet_file = os.path.join(UPLOAD_FOLDER, f"{project_id}_snippets.json")
             save_snippets_to_json(code_snippets, snippet_file)
             sessions[project_id]['snippet_file'] = snippet_file
-            print(f"Chat snippets saved to: {snippet_file}")  # Debug
+            logger.debug("Chat snippets saved to: %s", snippet_file)
+            if project_id in attributions:
+                attributions[project_id].update(code_snippets)
             
             # Update temporary fixed file for real-time diff view
             try:
                 session = sessions[project_id]
                 numbered_file = session.get('numbered_file')
                 if numbered_file:
-                    temp_fixed_numbered_path, temp_fixed_denumbered_path = create_temp_fixed_denumbered_file(
-                        numbered_file, code_snippets, project_id, UPLOAD_FOLDER
+                    temp_fixed_numbered_path, temp_fixed_denumbered_path = await _offload(
+                        "temp-fixed-files", create_temp_fixed_denumbered_file,
+                        numbered_file, code_snippets, project_id, UPLOAD_FOLDER, kind=PROCESS
                     )
                     session['temp_fixed_numbered'] = temp_fixed_numbered_path
                     session['temp_fixed_denumbered'] = temp_fixed_denumbered_path
-                    print(f"Updated temporary fixed files for project {project_id}")
+                    logger.debug("Updated temporary fixed files")
             except Exception as e:
-                print(f"Error updating temporary fixed files: {str(e)}")
+                logger.error("Error updating temporary fixed files: %s", e)
+        
+        return ChatResponse(response=response.text, historyCompaction=compaction)
         
-        return ChatResponse(response=response.text)
+    except HTTPException:
+        raise
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except LLMCallError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Per-violation review of the current fixes
+def _get_attribution(project_id: str) -> AttributionIndex:
+    if project_id not in sessions or project_id not in attributions:
+        raise HTTPException(status_code=404, detail="No fixes to review for this project")
+    return attributions[project_id]
+
+async def _store_snippets(project_id: str, snippets: dict):
+    """Save a project's current snippets and refresh its temporary fixed files"""
+    session = sessions[project_id]
+    session['fixed_snippets'] = snippets
+    snippet_file = os.path.join(UPLOAD_FOLDER, f"{project_id}_snippets.json")
+    save_snippets_to_json(snippets, snippet_file)
+    session['snippet_file'] = snippet_file
+    
+    numbered_file = session.get('numbered_file')
+    if numbered_file:
+        with stage_timer("temp-fixed-files"):
+            temp_fixed_numbered_path, temp_fixed_denumbered_path = await _offload(
+                "temp-fixed-files", create_temp_fixed_denumbered_file,
+                numbered_file, snippets, project_id, UPLOAD_FOLDER, kind=PROCESS
+            )
+        session['temp_fixed_numbered'] = temp_fixed_numbered_path
+        session['temp_fixed_denumbered'] = temp_fixed_denumbered_path
+
+@app.get("/api/violations/{project_id}/attribution", response_model=AttributionResponse)
+async def get_attribution(project_id: str):
+    """Get the snippet regions of the current fixes and the violations each one addresses"""
+    return AttributionResponse(attribution=_get_attribution(project_id).to_dict())
+
+@app.post("/api/violations/accept", response_model=AttributionResponse)
+async def accept_violations(request: ViolationReviewRequest):
+    """Mark fixes as accepted; their lines are then protected from other rejects and re-fixes"""
+    try:
+        bind_project(request.projectId)
+        attribution = _get_attribution(request.projectId)
+        attribution.set_status(request.violationIds, ACCEPTED)
+        return AttributionResponse(attribution=attribution.to_dict())
+        
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/violations/reject", response_model=AttributionResponse)
+async def reject_violations(request: ViolationReviewRequest):
+    """Revert the lines fixing the given violations to the original code"""
+    try:
+        project_id = request.projectId
+        bind_project(project_id)
+        attribution = _get_attribution(project_id)
+        
+        regions = attribution.regions_for(request.violationIds)
+        affected = attribution.affected(regions, request.violationIds)
+        snippets = remove_regions(sessions[project_id].get('fixed_snippets', {}), regions)
+        await _store_snippets(project_id, snippets)
+        
+        attribution.set_status(request.violationIds, REJECTED)
+        attribution.update(snippets)
+        logger.info("Rejected %d violations, reverted regions %s", len(request.violationIds), regions)
+        return AttributionResponse(attribution=attribution.to_dict(), affected=affected)
+        
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except AttributionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def run_refix_violations(project_id: str, violation_ids: List[str], feedback: Optional[str] = None) -> AttributionResponse:
+    """
+    Ask for new fixes of the given violations only. The prompt names just the
+    lines attributed to them, and only those lines of the answer are merged
+    back into the current snippets.
+    """
+    bind_project(project_id)
+    if project_id not in chat_sessions:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    attribution = _get_attribution(project_id)
+    chat = chat_sessions[project_id]
+    numbered_file = sessions[project_id].get('numbered_file')
+    
+    regions = attribution.regions_for(violation_ids)
+    affected = attribution.affected(regions, violation_ids)
+    violations = attribution.violations_for(violation_ids)
+    prompt = build_refix_prompt(format_violations_prompt(violations), regions, feedback)
+    
+    # Rejected fixes go to the strong model, on a fork adopted only on success
+    routed = fork_chat(chat, model_settings['model_name'])
+    with stage_timer("llm"):
+        response = await _offload(
+            "llm", send_message_resilient, routed, prompt, project_id=project_id, priority=PRIORITY_INTERACTIVE
+        )
+    if response is None or response.text is None:
+        raise HTTPException(
+            status_code=422,
+            detail="Response was blocked by safety filters. Please try rephrasing your feedback."
+        )
+    
+    response_text = response.text
+    corrected = extract_snippets_from_response(response_text)
+    validation = {}
+    if validation_settings['enabled'] and numbered_file and corrected:
+        corrected, validation, response_text = await validate_and_reask(
+            routed, response_text, corrected, numbered_file, project_id
+        )
+    
+    in_regions = {k: v for k, v in corrected.items() if any(first <= base_line(k) <= last for first, last in regions)}
+    if len(in_regions) < len(corrected):
+        logger.warning("Dropped %d re-fix lines outside the requested regions", len(corrected) - len(in_regions))
+    chat.history[:] = routed.history
+    
+    snippets = replace_regions(sessions[project_id].get('fixed_snippets', {}), in_regions, regions)
+    await _store_snippets(project_id, snippets)
+    attribution.update(snippets)
+    attribution.set_status(violation_ids, REFIXED)
+    
+    return AttributionResponse(
+        attribution=attribution.to_dict(),
+        affected=affected,
+        response=response_text,
+        validation=validation
+    )
+
+@app.post("/api/violations/refix", response_model=AttributionResponse)
+async def refix_violations(request: ViolationReviewRequest):
+    """Re-prompt only the lines of the given violations and merge the new fix"""
+    try:
+        return await run_refix_violations(request.projectId, request.violationIds, request.feedback)
         
     except HTTPException:
         raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except AttributionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except LLMCallError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Background job endpoints for long-running steps
+def _job_step(request: JobRequest) -> Callable:
+    """Return a job function running the requested step on a worker thread"""
+    if request.kind == 'first-prompt':
+        step = lambda progress: run_first_prompt(request.projectId, progress)
+    elif request.kind == 'fix-violations':
+        step = lambda progress: run_fix_violations(request.projectId, request.violations, progress)
+    elif request.kind == 'apply-fixes':
+        step = lambda progress: run_apply_fixes(request.projectId, progress)
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {request.kind}")
+    
+    return lambda ctx: asyncio.run(step(ctx.progress)).dict()
+
+@app.post("/api/jobs", response_model=JobResponse)
+async def submit_job(request: JobRequest):
+    """Queue a first-prompt, fix-violations or apply-fixes step as a background job"""
+    if request.projectId not in sessions:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    job = job_queue.submit(request.kind, request.projectId, _job_step(request))
+    return JobResponse(**job)
+
+@app.get("/api/jobs", response_model=List[JobResponse])
+async def list_jobs(projectId: Optional[str] = Query(None)):
+    """List jobs, newest first"""
+    return [JobResponse(**job) for job in job_queue.list(projectId)]
+
+@app.get("/api/jobs/queue")
+async def get_job_queue_stats():
+    """Get queue depth and wait times"""
+    return job_queue.stats()
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Poll a job's state and progress"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job)
+
+@app.post("/api/jobs/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """Cancel a queued job or stop a running one at its next stage"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job)
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream job state changes as server-sent events until the job finishes"""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def stream():
+        version = None
+        while True:
+            job = await asyncio.to_thread(job_queue.wait_for_change, job_id, version)
+            if job is None:
+                break
+            if job['version'] == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = job['version']
+            yield f"data: {json.dumps(job, default=str)}\n\n"
+            if job['state'] in TERMINAL_STATES:
+                break
+    
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
 @app.get("/api/session-state")
 async def get_session_state():
     # Return empty state for now
@@ -494,7 +1406,7 @@ async def get_numbered_file(project_id: str):
         if not numbered_file or not os.path.exists(numbered_file):
             raise HTTPException(status_code=404, detail="Numbered file not found")
         
-        content = get_file_content(numbered_file)
+        content = await _offload("read-file", get_file_content, numbered_file)
         if content is None:
             raise HTTPException(status_code=500, detail="Failed to read numbered file")
         
@@ -503,6 +1415,33 @@ async def get_numbered_file(project_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _ensure_temp_fixed_file(project_id: str) -> str:
+    """Return the temporary fixed numbered file for a project, creating it if needed"""
+    session = sessions[project_id]
+    
+    # Get existing temp fixed file path if it exists
+    temp_fixed_numbered_path = session.get('temp_fixed_numbered')
+    
+    if not temp_fixed_numbered_path or not os.path.exists(temp_fixed_numbered_path):
+        # If temp file doesn't exist, create it
+        fixed_snippets = session.get('fixed_snippets', {})
+        numbered_file = session.get('numbered_file')
+        
+        if not numbered_file:
+            raise HTTPException(status_code=404, detail="Numbered file not found")
+        
+        with stage_timer("temp-fixed-files"):
+            temp_fixed_numbered_path, temp_fixed_denumbered_path = await _offload(
+                "temp-fixed-files", create_temp_fixed_denumbered_file,
+                numbered_file, fixed_snippets, project_id, UPLOAD_FOLDER, kind=PROCESS
+            )
+        
+        # Store paths in session
+        session['temp_fixed_numbered'] = temp_fixed_numbered_path
+        session['temp_fixed_denumbered'] = temp_fixed_denumbered_path
+    
+    return temp_fixed_numbered_path
+
 @app.get("/api/files/temp-fixed/{project_id}")
 async def get_temp_fixed_file(project_id: str):
     """Get temporary fixed file content"""
@@ -510,29 +1449,10 @@ async def get_temp_fixed_file(project_id: str):
         if project_id not in sessions:
             raise HTTPException(status_code=404, detail="Project not found")
         
-        session = sessions[project_id]
-        
-        # Get existing temp fixed file path if it exists
-        temp_fixed_numbered_path = session.get('temp_fixed_numbered')
-        
-        if not temp_fixed_numbered_path or not os.path.exists(temp_fixed_numbered_path):
-            # If temp file doesn't exist, create it
-            fixed_snippets = session.get('fixed_snippets', {})
-            numbered_file = session.get('numbered_file')
-            
-            if not numbered_file:
-                raise HTTPException(status_code=404, detail="Numbered file not found")
-            
-            temp_fixed_numbered_path, temp_fixed_denumbered_path = create_temp_fixed_denumbered_file(
-                numbered_file, fixed_snippets, project_id, UPLOAD_FOLDER
-            )
-            
-            # Store paths in session
-            session['temp_fixed_numbered'] = temp_fixed_numbered_path
-            session['temp_fixed_denumbered'] = temp_fixed_denumbered_path
+        temp_fixed_numbered_path = await _ensure_temp_fixed_file(project_id)
         
         # Return the fixed numbered content (with line numbers for diff view)
-        content = get_file_content(temp_fixed_numbered_path)
+        content = await _offload("read-file", get_file_content, temp_fixed_numbered_path)
         if content is None:
             raise HTTPException(status_code=500, detail="Failed to read temporary fixed file")
         
@@ -541,6 +1461,54 @@ async def get_temp_fixed_file(project_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Paginated line-range endpoints for virtual scrolling of large files
+@app.get("/api/files/numbered/{project_id}/lines", response_model=LineRangeResponse)
+async def get_numbered_file_lines(
+    project_id: str,
+    start: int = Query(1, ge=1),
+    count: int = Query(200, ge=1, le=5000)
+):
+    """Get a range of lines from the numbered file"""
+    try:
+        if project_id not in sessions:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        numbered_file = sessions[project_id].get('numbered_file')
+        
+        if not numbered_file or not os.path.exists(numbered_file):
+            raise HTTPException(status_code=404, detail="Numbered file not found")
+        
+        lines, total_lines = await _offload("read-lines", read_line_range, numbered_file, start, count)
+        
+        return LineRangeResponse(start=start, count=len(lines), totalLines=total_lines, lines=lines)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/files/temp-fixed/{project_id}/lines", response_model=LineRangeResponse)
+async def get_temp_fixed_file_lines(
+    project_id: str,
+    start: int = Query(1, ge=1),
+    count: int = Query(200, ge=1, le=5000)
+):
+    """Get a range of lines from the temporary fixed file"""
+    try:
+        if project_id not in sessions:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        temp_fixed_numbered_path = await _ensure_temp_fixed_file(project_id)
+        
+        lines, total_lines = await _offload("read-lines", read_line_range, temp_fixed_numbered_path, start, count)
+        
+        return LineRangeResponse(start=start, count=len(lines), totalLines=total_lines, lines=lines)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/diff/{project_id}", response_model=DiffResponse)
 async def get_diff(project_id: str):
     """Get diff between original and fixed files"""
@@ -557,12 +1525,13 @@ async def get_diff(project_id: str):
             raise HTTPException(status_code=404, detail="Required files not found")
         
         # Create temporary fixed denumbered file for comparison with original
-        temp_fixed_numbered_path, temp_fixed_denumbered_path = create_temp_fixed_denumbered_file(
-            numbered_file, fixed_snippets, project_id, UPLOAD_FOLDER
+        temp_fixed_numbered_path, temp_fixed_denumbered_path = await _offload(
+            "temp-fixed-files", create_temp_fixed_denumbered_file,
+            numbered_file, fixed_snippets, project_id, UPLOAD_FOLDER, kind=PROCESS
         )
         
         # Create diff data comparing original with fixed denumbered file
-        diff_data = create_diff_data(original_file, temp_fixed_denumbered_path, fixed_snippets)
+        diff_data = await _offload("diff", create_diff_data, original_file, temp_fixed_denumbered_path, fixed_snippets, kind=PROCESS)
         
         # Store temp paths in session for potential cleanup
         session['temp_fixed_numbered'] = temp_fixed_numbered_path
@@ -570,9 +1539,78 @@ async def get_diff(project_id: str):
         
         return DiffResponse(**diff_data)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/llm/stats")
+async def get_llm_stats():
+    """Get LLM retry, hedge and latency counters and shared quota usage"""
+    stats = get_resilience_stats()
+    limiter = get_rate_limiter()
+    stats["rateLimiter"] = limiter.stats() if limiter else None
+    return stats
+
+@app.get("/api/executors/stats")
+async def get_executor_stats():
+    """Get thread and process pool occupancy and per-stage queue and run times"""
+    return get_executor().stats()
+
+@app.get("/api/speculation/stats")
+async def get_speculation_stats():
+    """Get how many speculative steps were adopted, joined in flight, missed or cancelled"""
+    return speculation.stats()
+
+@app.get("/api/fix-memory/stats")
+async def get_fix_memory_statistics():
+    """Get fix-memory hit rate and estimated LLM time saved"""
+    return get_fix_memory_stats()
+
+# Profiling endpoints
+@app.get("/api/profiling/settings", response_model=ProfilingSettings)
+async def get_profiling_settings():
+    """Get profiling settings"""
+    return ProfilingSettings(**profiling_settings)
+
+@app.post("/api/profiling/settings", response_model=SettingsResponse)
+async def save_profiling_settings(settings: ProfilingSettings):
+    """Enable header-triggered profiling, or profile every request"""
+    if settings.mode not in ("sampling", "cprofile"):
+        raise HTTPException(status_code=400, detail="Profile mode must be 'sampling' or 'cprofile'")
+    
+    profiling_settings.update(settings.dict())
+    return SettingsResponse(
+        success=True,
+        message="Profiling settings saved successfully"
+    )
+
+@app.get("/api/profiling/profiles")
+async def get_profiles():
+    """List stored request profiles, newest first"""
+    return list_profiles()
+
+@app.get("/api/profiling/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    """
+    Download a profile: collapsed stacks (.folded) for flamegraph.pl or
+    speedscope, or pstats (.prof) for snakeviz and flameprof
+    """
+    profile = get_profile(profile_id)
+    if not profile or not os.path.exists(profile['file']):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    return FileResponse(
+        path=profile['file'],
+        filename=os.path.basename(profile['file']),
+        media_type='application/octet-stream'
+    )
+
+@app.get("/api/profiling/slow-requests")
+async def get_slow_request_log():
+    """Get recent slow requests with their per-stage timings"""
+    return get_slow_requests()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -1,22 +1,24 @@
 # denumbering.py
 import re
 
-# def remove_line_numbers(input_file, output_file):
-#     """Remove line numbers from a numbered C++ file"""
-#     with open(input_file, 'r', encoding='utf-8') as infile, open(output_file, 'w', encoding='utf-8') as outfile:
-#         for line in infile:
-#             # Match line numbers like 123:, 123a:, 45b:, etc.
-#             new_line = re.sub(r'^\d+[a-zA-Z]*:\s?', '', line)
-#             outfile.write(new_line)
+from source_buffer import mapped_file, encode_from_utf8
 
-def remove_line_numbers(input_file, output_file):
-    """Remove line numbers from a numbered C++ file"""
-    with open(input_file, 'r', encoding='utf-8') as infile, open(output_file, 'w', encoding='utf-8') as outfile:
-        for line in infile:
-            # Remove line numbers like 123:, 123a:, 45b:, etc.
-            new_line = re.sub(r'^\d+[a-zA-Z]*:\s?', '', line)
-            # Preserve empty lines that were just line numbers
-            if new_line.strip() == '':
-                outfile.write('\n')
-            else:
-                outfile.write(new_line)
\ No newline at end of file
+# Line numbers like 123:, 123a:, 45b:, etc. at the start of every line
+LINE_NUMBER_PREFIX_RE = re.compile(rb"^\d+[a-zA-Z]*:[ \t]?", re.MULTILINE)
+
+def remove_line_numbers(input_file, output_file, source_format=None):
+    """
+    Remove line numbers from a numbered C++ file.
+
+    The prefixes are stripped in a single pass over the memory-mapped file, so
+    line contents and line endings are kept byte for byte. If the source
+    format returned by add_line_numbers is given, the output is converted back
+    to the original encoding (and BOM).
+    """
+    with mapped_file(input_file) as buf:
+        denumbered = LINE_NUMBER_PREFIX_RE.sub(b"", buf)
+
+    # Encoded before opening, so an unencodable fix leaves no truncated output behind
+    encoded = encode_from_utf8(denumbered, source_format)
+    with open(output_file, 'wb') as outfile:
+        outfile.write(encoded)
\ No newline at end of file
@@ -6,6 +6,11 @@ import re
 from typing import Tuple, Optional, List
 from denumbering import remove_line_numbers
 from replace import merge_fixed_snippets_into_file
+from source_buffer import mapped_file, decode_source
+from line_shift import LineShiftIndex, inserted_ranks
+from structured_logging import get_logger
+
+logger = get_logger("diff_utils")
 
 def create_temp_fixed_denumbered_file(
     numbered_file_path: str, 
@@ -52,7 +57,8 @@ def create_temp_fixed_denumbered_file(
 
 def get_file_content(file_path: str) -> Optional[str]:
     """
-    Read and return file content as string.
+    Read and return file content as string, decoded with the file's detected
+    encoding and with line endings normalized to '\n'.
     
     Args:
         file_path: Path to the file
@@ -61,10 +67,10 @@ def get_file_content(file_path: str) -> Optional[str]:
         File content as string or None if error
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        with mapped_file(file_path) as buf:
+            return decode_source(buf).replace('\r\n', '\n').replace('\r', '\n')
     except Exception as e:
-        print(f"Error reading file {file_path}: {str(e)}")
+        logger.error("Error reading file %s: %s", file_path, e)
         return None
 
 def create_diff_data(original_file_path: str, fixed_file_path: str, fixed_snippets: dict = None) -> dict:
@@ -95,7 +101,7 @@ def create_diff_data(original_file_path: str, fixed_file_path: str, fixed_snippe
                 "removed_lines": mappings_data['removed_lines']
             }
         except Exception as e:
-            print(f"Error extracting highlight lines: {str(e)}")
+            logger.error("Error extracting highlight lines: %s", e)
             highlight_data = {"line_mappings": {}, "changed_lines": [], "changed_lines_fixed": [], "added_lines": [], "removed_lines": []}
     
     return {
@@ -125,20 +131,20 @@ def get_line_mappings_and_changes(json_data, original_content, fixed_content):
     added_lines = []    # lines that were newly added
     removed_lines = []  # lines that were removed
     
-    inserted_count = 0
+    # Fixed-file positions come from a line-shift index over the inserted keys (O(log n) per line)
+    shift_index = LineShiftIndex.from_snippets(json_data, size=len(original_lines))
+    ranks = inserted_ranks(json_data)
     sorted_keys = sorted(json_data.keys(), key=lambda k: (int(re.match(r'\d+', k).group()), k))
 
     for key in sorted_keys:
         base_line = int(re.match(r'\d+', key).group())
         
-        if re.search(r'[a-z]$', key):
+        if key in ranks:
             # This is a newly inserted line
-            inserted_count += 1
-            fixed_line_num = base_line + inserted_count
-            added_lines.append(fixed_line_num)
+            added_lines.append(shift_index.inserted_position(base_line, ranks[key]))
         else:
             # This is a modified or replaced line
-            fixed_line_num = base_line + inserted_count
+            fixed_line_num = shift_index.to_current(base_line)
             line_mappings[base_line] = fixed_line_num
             
             # Compare actual content to detect changes
@@ -173,6 +179,6 @@ def cleanup_temp_files(*file_paths: str) -> None:
         try:
             if os.path.exists(file_path):
                 os.remove(file_path)
-                print(f"Cleaned up temp file: {file_path}")
+                logger.debug("Cleaned up temp file: %s", file_path)
         except Exception as e:
-            print(f"Error cleaning up file {file_path}: {str(e)}")
\ No newline at end of file
+            logger.error("Error cleaning up file %s: %s", file_path, e)
\ No newline at end of file
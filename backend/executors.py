@@ -0,0 +1,231 @@
+# executors.py - Thread and process pools that run blocking stages off the event loop
+
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from profiling import profile_worker
+from structured_logging import bind_log_context, configure_worker_logging, log_context
+
+executor_settings = {
+    # LLM calls, SQLite and file writes; these mostly wait, so there can be many
+    "thread_workers": int(os.environ.get("MISRA_THREAD_WORKERS", "16")),
+    # Excel parsing, numbering, merging, diffs and snippet validation
+    "process_workers": int(os.environ.get("MISRA_PROCESS_WORKERS", str(os.cpu_count() or 2))),
+    # Platform default unless set; 'spawn' re-imports the server's main module in every worker
+    "start_method": os.environ.get("MISRA_PROCESS_START_METHOD") or None,
+    # Queued plus running tasks per pool; further submissions wait for a slot...
+    "max_pending": int(os.environ.get("MISRA_EXECUTOR_MAX_PENDING", "64")),
+    # ...for up to this many seconds before they are refused
+    "submit_timeout": float(os.environ.get("MISRA_EXECUTOR_SUBMIT_TIMEOUT", "30")),
+}
+
+THREAD = "thread"
+PROCESS = "process"
+
+class ExecutorBusy(Exception):
+    """Raised when a pool stays full for longer than the submit timeout"""
+
+def _timed(stage: str, submitted: float, fn: Callable, args: tuple, kwargs: dict, context: Optional[tuple] = None):
+    """Run a stage in the worker, returning its result with queue and run times"""
+    started = time.time()
+    if context is not None:
+        # Process workers are reused across requests, so always rebind the log IDs
+        bind_log_context(context)
+    with profile_worker(stage):
+        result = fn(*args, **kwargs)
+    return result, started - submitted, time.time() - started
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+class StageExecutor:
+    """
+    Runs blocking pipeline stages on a shared thread pool or process pool.
+
+    Work for the process pool must be a module-level function taking and
+    returning picklable values (paths, strings, dicts), so it can run in
+    another process. Each pool admits at most `max_pending` queued and running
+    tasks; callers beyond that wait for a slot and get ExecutorBusy after
+    `submit_timeout` seconds. Queue time (including that wait) and run time
+    are recorded per stage.
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self._pools: Dict[str, Any] = {}
+        self._slots = {kind: threading.BoundedSemaphore(settings["max_pending"]) for kind in (THREAD, PROCESS)}
+        self._pending = {THREAD: 0, PROCESS: 0}
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+
+    def _pool(self, kind: str):
+        with self._lock:
+            pool = self._pools.get(kind)
+            if pool is None:
+                if kind == PROCESS:
+                    pool = ProcessPoolExecutor(
+                        max_workers=self.settings["process_workers"],
+                        mp_context=multiprocessing.get_context(self.settings["start_method"]),
+                        initializer=configure_worker_logging
+                    )
+                else:
+                    pool = ThreadPoolExecutor(max_workers=self.settings["thread_workers"], thread_name_prefix="stage")
+                self._pools[kind] = pool
+            return pool
+
+    def _stage(self, stage: str, kind: str) -> Dict[str, Any]:
+        entry = self._stages.get(stage)
+        if entry is None:
+            entry = self._stages[stage] = {
+                "kind": kind, "count": 0, "failed": 0, "rejected": 0,
+                "queueSeconds": deque(maxlen=200), "runSeconds": deque(maxlen=200),
+            }
+        return entry
+
+    def _reject(self, stage: str, kind: str):
+        with self._lock:
+            self._stage(stage, kind)["rejected"] += 1
+        raise ExecutorBusy(f"Server busy: too many pending {kind} tasks, retry later")
+
+    def _submit(self, stage: str, fn: Callable, args: tuple, kwargs: dict, kind: str, submitted: float) -> Future:
+        """Submit with a slot already held; the slot is released when the task ends"""
+        slot = self._slots[kind]
+        try:
+            if kind == THREAD:
+                # Log records, stage timings and the request's profiler carry over to the worker thread
+                context = contextvars.copy_context()
+                future = self._pool(kind).submit(context.run, _timed, stage, submitted, fn, args, kwargs)
+            else:
+                future = self._pool(kind).submit(_timed, stage, submitted, fn, args, kwargs, log_context())
+        except Exception:
+            slot.release()
+            raise
+
+        with self._lock:
+            self._pending[kind] += 1
+
+        def done(_):
+            with self._lock:
+                self._pending[kind] -= 1
+            slot.release()
+
+        future.add_done_callback(done)
+        return future
+
+    def _finish(self, stage: str, kind: str, future: Future):
+        """Record the outcome of a finished task and return its result"""
+        try:
+            result, queued, ran = future.result()
+        except Exception as e:
+            with self._lock:
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died (e.g. out of memory); start a fresh pool on the next submit
+                    self._pools.pop(PROCESS, None)
+                entry = self._stage(stage, kind)
+                entry["count"] += 1
+                entry["failed"] += 1
+            raise
+
+        with self._lock:
+            entry = self._stage(stage, kind)
+            entry["count"] += 1
+            entry["queueSeconds"].append(queued)
+            entry["runSeconds"].append(ran)
+        return result
+
+    async def run(self, stage: str, fn: Callable, *args, kind: str = THREAD, **kwargs):
+        """
+        Run a stage from an event loop without blocking it.
+
+        Args:
+            stage: Stage name used for the metrics (e.g. 'merge')
+            fn: Blocking function to run, called with the other arguments
+            kind: THREAD or PROCESS
+
+        Raises:
+            ExecutorBusy: If no slot frees up within the submit timeout
+        """
+        submitted = time.time()
+        slot = self._slots[kind]
+        deadline = time.monotonic() + self.settings["submit_timeout"]
+        delay = 0.005
+        while not slot.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                self._reject(stage, kind)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+        future = self._submit(stage, fn, args, kwargs, kind, submitted)
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            pass
+        return self._finish(stage, kind, future)
+
+    def run_sync(self, stage: str, fn: Callable, *args, kind: str = PROCESS, **kwargs):
+        """Run a stage from a worker thread (e.g. a job or a speculative task), blocking until done"""
+        submitted = time.time()
+        if not self._slots[kind].acquire(timeout=self.settings["submit_timeout"]):
+            self._reject(stage, kind)
+        future = self._submit(stage, fn, args, kwargs, kind, submitted)
+        try:
+            future.result()
+        except Exception:
+            pass
+        return self._finish(stage, kind, future)
+
+    def stats(self) -> dict:
+        """Pool occupancy and per-stage queue and run times in milliseconds"""
+        ms = lambda value: round(value * 1000, 1) if value is not None else None
+        with self._lock:
+            pools = {
+                kind: {
+                    "workers": self.settings[f"{kind}_workers"],
+                    "pending": self._pending[kind],
+                    "maxPending": self.settings["max_pending"],
+                }
+                for kind in (THREAD, PROCESS)
+            }
+            stages = {
+                stage: {
+                    "kind": entry["kind"],
+                    "count": entry["count"],
+                    "failed": entry["failed"],
+                    "rejected": entry["rejected"],
+                    "queueMsP50": ms(_percentile(entry["queueSeconds"], 0.5)),
+                    "queueMsP95": ms(_percentile(entry["queueSeconds"], 0.95)),
+                    "queueMsMax": ms(max(entry["queueSeconds"], default=None)),
+                    "runMsP50": ms(_percentile(entry["runSeconds"], 0.5)),
+                    "runMsP95": ms(_percentile(entry["runSeconds"], 0.95)),
+                }
+                for stage, entry in self._stages.items()
+            }
+        return {"pools": pools, "stages": stages}
+
+    def shutdown(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> StageExecutor:
+    """Return the shared stage executor, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = StageExecutor(executor_settings)
+        return _executor
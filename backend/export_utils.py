@@ -0,0 +1,139 @@
+# export_utils.py - Stream fixed files and unified patches as a zip or a single patch
+
+import difflib
+import time
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from source_buffer import mapped_file, load_as_utf8, encode_from_utf8, build_line_offsets
+
+CHUNK_SIZE = 256 * 1024
+
+class _StreamWriter:
+    """
+    Write-only, non-seekable file object for zipfile.
+
+    zipfile falls back to data descriptors when it cannot seek, so entries
+    are written in one pass and the bytes can be handed to the client as
+    soon as they are produced.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        """Yield everything written since the last drain, if anything"""
+        if self._chunks:
+            data = b"".join(self._chunks)
+            self._chunks.clear()
+            yield data
+
+def _read_bytes(file_path: str, source_format: Optional[dict] = None) -> Tuple[bytes, dict]:
+    """
+    Read a file converted to `source_format` (default: its own).
+
+    Returns:
+        Tuple of (the file's bytes in that format, the file's detected source format)
+    """
+    with mapped_file(file_path) as buf:
+        utf8, detected = load_as_utf8(buf)
+        return encode_from_utf8(bytes(utf8), source_format or detected), detected
+
+def _read_lines(file_path: str, source_format: Optional[dict] = None) -> Tuple[List[bytes], dict]:
+    """
+    Read a file as lines of bytes in `source_format` (default: its own),
+    split at b'\\n' the way git splits them.
+
+    Returns:
+        Tuple of (lines with their endings, the file's detected source format)
+    """
+    data, detected = _read_bytes(file_path, source_format)
+    offsets = build_line_offsets(data)
+    return [data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)], detected
+
+def unified_patch(original_path: str, fixed_path: str, name: str, context: int = 3) -> Iterator[bytes]:
+    """
+    Yield a unified diff of one file in `git apply` / `patch -p1` format.
+
+    The diff is taken on bytes in the original's encoding and BOM, with the
+    fixed file converted to them first (temporary fixed files are UTF-8), so
+    the hunks match the original file byte for byte.
+
+    Args:
+        original_path: Path to the original source file
+        fixed_path: Path to the fixed (denumbered) file
+        name: File name used in the a/ and b/ headers
+
+    Returns:
+        Iterator over the patch lines (nothing if the files are identical)
+    """
+    original, source_format = _read_lines(original_path)
+    fixed, _ = _read_lines(fixed_path, source_format)
+
+    headers = (f"a/{name}".encode("utf-8"), f"b/{name}".encode("utf-8"))
+    for line in difflib.diff_bytes(difflib.unified_diff, original, fixed, *headers, n=context):
+        if line.endswith(b"\n"):
+            yield line
+        else:
+            yield line + b"\n\\ No newline at end of file\n"
+
+def stream_patch(artifacts: List[Dict[str, str]]) -> Iterator[bytes]:
+    """
+    Stream one concatenated patch for all artifacts.
+
+    Args:
+        artifacts: Dicts with 'name', 'original' and 'fixed' paths
+    """
+    for artifact in artifacts:
+        patch = b"".join(unified_patch(artifact['original'], artifact['fixed'], artifact['name']))
+        if patch:
+            yield patch
+
+def stream_zip(artifacts: List[Dict[str, str]], include_patches: bool = True) -> Iterator[bytes]:
+    """
+    Stream a zip with every fixed file under fixed/ and, optionally, one
+    .patch per changed file under patches/. Fixed files are stored in the
+    original's encoding and BOM, like the patches (temporary fixed files
+    are UTF-8); each is read whole, then compressed chunk by chunk.
+
+    Args:
+        artifacts: Dicts with 'name', 'original' and 'fixed' paths
+        include_patches: Add a unified patch per file
+    """
+    stream = _StreamWriter()
+    date_time = time.localtime()[:6]
+
+    with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for artifact in artifacts:
+            info = zipfile.ZipInfo(f"fixed/{artifact['name']}", date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            _, source_format = _read_bytes(artifact['original'])
+            fixed, _ = _read_bytes(artifact['fixed'], source_format)
+            with archive.open(info, mode="w", force_zip64=True) as entry:
+                for start in range(0, len(fixed), CHUNK_SIZE):
+                    entry.write(fixed[start:start + CHUNK_SIZE])
+                    yield from stream.drain()
+            yield from stream.drain()
+
+            if include_patches:
+                patch = b"".join(unified_patch(artifact['original'], artifact['fixed'], artifact['name']))
+                if patch:
+                    info = zipfile.ZipInfo(f"patches/{artifact['name']}.patch", date_time=date_time)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    archive.writestr(info, patch)
+                    yield from stream.drain()
+
+    # Central directory
+    yield from stream.drain()
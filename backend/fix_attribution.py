@@ -0,0 +1,169 @@
+# fix_attribution.py - Attribute snippet regions to the violations they fix, for targeted re-fixes
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from snippet_validation import base_line, snippet_regions
+
+PENDING = "pending"
+ACCEPTED = "accepted"
+REJECTED = "rejected"
+REFIXED = "refixed"
+
+class AttributionConflict(Exception):
+    """Raised when a change would also revert lines of an accepted violation"""
+
+def _line_number(line) -> Optional[int]:
+    try:
+        return int(line)
+    except (TypeError, ValueError):
+        return None
+
+def violation_id(violation: dict) -> str:
+    """Stable id of a violation, from its location, rule and message"""
+    identity = [violation.get('file'), violation.get('path'), _line_number(violation.get('line')),
+                violation.get('misra'), violation.get('warning')]
+    return hashlib.sha1(json.dumps(identity, default=str).encode("utf-8")).hexdigest()[:12]
+
+class AttributionIndex:
+    """
+    Which snippet regions of a project's current fixes address which violations.
+
+    A violation is attributed to the region containing its line or, when the
+    fix landed next to it, the nearest region within `window` lines. Several
+    violations can share a region. The regions are recomputed whenever the
+    snippets change, while each violation keeps its review status.
+    """
+
+    def __init__(self, violations: List[dict], snippets: dict, window: int = 3):
+        self.window = window
+        self.violations: Dict[str, Dict[str, Any]] = {}
+        for violation in violations:
+            vid = violation_id(violation)
+            if vid not in self.violations:
+                self.violations[vid] = {'violation': violation, 'status': PENDING, 'region': None}
+        self.regions: List[Dict[str, Any]] = []
+        self.update(snippets)
+
+    def update(self, snippets: dict):
+        """Re-attribute every violation to the regions of the current snippets"""
+        regions = snippet_regions(snippets)
+        keys = {region: [] for region in regions}
+        for key in snippets:
+            line = base_line(key)
+            keys[next(r for r in regions if r[0] <= line <= r[1])].append(key)
+
+        attributed = {region: [] for region in regions}
+        for vid, entry in self.violations.items():
+            line = _line_number(entry['violation'].get('line'))
+            entry['region'] = None
+            if line is None or not regions:
+                continue
+            distance, region = min((max(r[0] - line, line - r[1], 0), r) for r in regions)
+            if distance <= self.window:
+                entry['region'] = region
+                attributed[region].append(vid)
+
+        self.regions = [
+            {'first': r[0], 'last': r[1], 'keys': keys[r], 'violations': attributed[r]}
+            for r in regions
+        ]
+
+    def _require(self, ids: Iterable[str]) -> List[str]:
+        ids = list(dict.fromkeys(ids))
+        unknown = [vid for vid in ids if vid not in self.violations]
+        if unknown:
+            raise KeyError(f"Unknown violation ids: {', '.join(unknown)}")
+        return ids
+
+    def set_status(self, ids: Iterable[str], status: str):
+        for vid in self._require(ids):
+            self.violations[vid]['status'] = status
+
+    def regions_for(self, ids: Iterable[str]) -> List[Tuple[int, int]]:
+        """
+        Regions to re-do for the given violations: each attributed region,
+        widened to include the violation's own line, or just that line when
+        no fix is attributed to it. Overlapping regions are merged.
+
+        Raises:
+            AttributionConflict: If a region is shared with an accepted violation outside `ids`
+        """
+        ids = self._require(ids)
+        selected = set(ids)
+        spans = []
+        for vid in ids:
+            entry = self.violations[vid]
+            line = _line_number(entry['violation'].get('line'))
+            region = entry['region']
+            if region:
+                shared = [other for other, e in self.violations.items()
+                          if other not in selected and e['region'] == region and e['status'] == ACCEPTED]
+                if shared:
+                    raise AttributionConflict(
+                        f"Lines {region[0]}-{region[1]} also fix accepted violations: {', '.join(shared)}"
+                    )
+                first, last = region
+                spans.append((min(first, line), max(last, line)) if line is not None else region)
+            elif line is not None:
+                spans.append((line, line))
+
+        merged = []
+        for first, last in sorted(spans):
+            if merged and first <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        return [tuple(span) for span in merged]
+
+    def affected(self, regions: List[Tuple[int, int]], ids: Iterable[str]) -> List[str]:
+        """Violations outside `ids` whose fix lies in one of the regions"""
+        selected = set(ids)
+        return [vid for vid, entry in self.violations.items()
+                if vid not in selected and entry['region']
+                and any(first <= entry['region'][0] and entry['region'][1] <= last for first, last in regions)]
+
+    def violations_for(self, ids: Iterable[str]) -> List[dict]:
+        return [self.violations[vid]['violation'] for vid in self._require(ids)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'violations': [
+                {
+                    'id': vid,
+                    'line': _line_number(entry['violation'].get('line')),
+                    'misra': entry['violation'].get('misra'),
+                    'warning': entry['violation'].get('warning'),
+                    'status': entry['status'],
+                    'region': list(entry['region']) if entry['region'] else None,
+                }
+                for vid, entry in self.violations.items()
+            ],
+            'regions': self.regions,
+        }
+
+def remove_regions(snippets: dict, regions: List[Tuple[int, int]]) -> dict:
+    """Drop the snippet lines of the given regions, reverting them to the original code"""
+    return {k: v for k, v in snippets.items()
+            if not any(first <= base_line(k) <= last for first, last in regions)}
+
+def build_refix_prompt(violations_text: str, regions: List[Tuple[int, int]], feedback: Optional[str] = None) -> str:
+    """
+    Build a prompt asking for new fixes of only the given regions.
+
+    Args:
+        violations_text: Violations to re-fix, formatted for the prompt
+        regions: (first_line, last_line) regions to re-do
+        feedback: Optional reviewer note on why the previous fix was rejected
+    """
+    ranges = ", ".join(f"{first}-{last}" if first != last else f"{first}" for first, last in regions)
+    note = f"Reviewer feedback on the previous fix: {feedback.strip()}\n\n" if feedback and feedback.strip() else ""
+    return (
+        "The previous fix for the following violations was rejected and must be redone:\n\n"
+        f"{violations_text}\n\n"
+        f"{note}"
+        f"Please provide a new MISRA C++ compliant fix ONLY for original lines {ranges}, based on the original code of those lines. "
+        "Keep the original line number prefix on every line, use `100a:` style numbering for inserted lines, "
+        "output `123:` for a line that becomes empty, and give all lines in a single cpp``` Snippet ``` block."
+    )
@@ -0,0 +1,355 @@
+# fix_memory.py - Local memory of accepted fixes, reused across files before calling the LLM
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+from misra_rules import normalize_rule
+from replace import load_numbered_lines, line_sort_key
+from snippet_validation import base_line
+
+fix_memory_settings = {
+    "enabled": os.environ.get("MISRA_FIX_MEMORY", "1") == "1",
+    "db_path": os.environ.get("MISRA_FIX_MEMORY_DB", os.path.join("uploads", "fix_memory.db")),
+    # Reuse fixes whose lines only differ in identifier names
+    "near_matches": os.environ.get("MISRA_FIX_MEMORY_NEAR", "1") == "1",
+}
+
+TOKEN_RE = re.compile(
+    r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[A-Za-z_]\w*|\d[\w.]*|::|->|\+\+|--|<<=?|>>=?|[<>=!&|+\-*/%^]=|&&|\|\||\S'
+)
+IDENTIFIER_RE = re.compile(r"^[A-Za-z_]\w*$")
+INDENT_RE = re.compile(r"^\s*")
+
+# Words that are part of the pattern itself and never become placeholders
+CPP_KEYWORDS = {
+    "alignas", "alignof", "auto", "bool", "break", "case", "catch", "char", "class", "const",
+    "constexpr", "const_cast", "continue", "decltype", "default", "delete", "do", "double",
+    "dynamic_cast", "else", "enum", "explicit", "extern", "false", "float", "for", "friend",
+    "goto", "if", "inline", "int", "long", "mutable", "namespace", "new", "noexcept", "nullptr",
+    "operator", "private", "protected", "public", "register", "reinterpret_cast", "return",
+    "short", "signed", "sizeof", "static", "static_assert", "static_cast", "struct", "switch",
+    "template", "this", "throw", "true", "try", "typedef", "typeid", "typename", "union",
+    "unsigned", "using", "virtual", "void", "volatile", "while", "size_t", "NULL",
+    "int8_t", "int16_t", "int32_t", "int64_t", "uint8_t", "uint16_t", "uint32_t", "uint64_t",
+}
+
+memory_stats = {
+    "lookups": 0,
+    "exact_hits": 0,
+    "near_hits": 0,
+    "recorded": 0,
+    # Observed LLM time per violation, used to estimate the time saved by hits
+    "llm_seconds": 0.0,
+    "llm_violations": 0,
+}
+_stats_lock = threading.Lock()
+
+def _bump(name: str, amount=1):
+    with _stats_lock:
+        memory_stats[name] += amount
+
+def tokenize(code: str) -> List[str]:
+    return TOKEN_RE.findall(code)
+
+def _is_placeholder_candidate(token: str) -> bool:
+    return bool(IDENTIFIER_RE.match(token)) and token not in CPP_KEYWORDS
+
+def identifier_names(tokens: List[str]) -> List[str]:
+    """Identifiers of a token list in order of first appearance"""
+    names = []
+    for token in tokens:
+        if _is_placeholder_candidate(token) and token not in names:
+            names.append(token)
+    return names
+
+def _digest(rule_id: str, tokens: List[str]) -> str:
+    return hashlib.sha1(f"{rule_id}\0{' '.join(tokens)}".encode("utf-8")).hexdigest()
+
+def line_hashes(rule_id: str, code: str) -> Tuple[str, str]:
+    """
+    Hash a line for lookup.
+
+    Returns:
+        Tuple of (exact hash over the normalized tokens, near hash with
+        identifiers replaced by positional placeholders)
+    """
+    tokens = tokenize(code)
+    placeholders = {name: f"${i}" for i, name in enumerate(identifier_names(tokens))}
+    templated = [placeholders.get(token, token) for token in tokens]
+    return _digest(rule_id, tokens), _digest(rule_id, templated)
+
+def _rename(code: str, renames: Dict[str, str]) -> str:
+    """Rename identifiers in a line, leaving string and char literals alone"""
+    if not renames:
+        return code
+    pattern = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|\b[A-Za-z_]\w*\b')
+    return pattern.sub(lambda m: renames.get(m.group(), m.group()), code)
+
+def _reindent(code: str, old_indent: str, new_indent: str) -> str:
+    if code.startswith(old_indent):
+        return new_indent + code[len(old_indent):]
+    return code
+
+class FixMemory:
+    """
+    SQLite store of accepted fixes.
+
+    Each entry is a (rule, original line, fixed lines) triple indexed by the
+    rule and a hash of the normalized line tokens, plus a second hash with
+    identifiers replaced by placeholders for near matches.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS fixes (
+                    rule TEXT, exact_hash TEXT, near_hash TEXT,
+                    original TEXT, fixed TEXT, accepted INTEGER, reused INTEGER, updated REAL,
+                    PRIMARY KEY (rule, exact_hash, fixed)
+                );
+                CREATE INDEX IF NOT EXISTS fixes_exact ON fixes (rule, exact_hash);
+                CREATE INDEX IF NOT EXISTS fixes_near ON fixes (rule, near_hash);
+                CREATE TABLE IF NOT EXISTS accepted_by (
+                    source TEXT, line TEXT, rule TEXT, exact_hash TEXT, fixed TEXT,
+                    PRIMARY KEY (source, line, rule, exact_hash, fixed)
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def record(self, rule, original: str, fixed: List[Tuple[str, str]],
+               source: Optional[str] = None, line: Optional[str] = None) -> bool:
+        """
+        Record an accepted fix.
+
+        Args:
+            rule: Rule text from the report
+            original: Original code of the violation line
+            fixed: (key suffix, code) pairs replacing it; '' is the line
+                itself and 'a', 'b', ... are lines inserted after it
+            source: Where the fix was accepted (e.g. the project); with
+                `line`, the same fix is counted once per source and line
+
+        Returns:
+            True if the fix was counted, False if it was already recorded
+            for this source and line
+        """
+        rule_id = normalize_rule(rule)
+        exact_hash, near_hash = line_hashes(rule_id, original)
+        fixed_json = json.dumps(fixed)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if source is not None:
+                    inserted = conn.execute(
+                        "INSERT OR IGNORE INTO accepted_by (source, line, rule, exact_hash, fixed) VALUES (?, ?, ?, ?, ?)",
+                        (source, line, rule_id, exact_hash, fixed_json)
+                    ).rowcount
+                    if not inserted:
+                        conn.execute("ROLLBACK")
+                        return False
+                conn.execute(
+                    "INSERT INTO fixes (rule, exact_hash, near_hash, original, fixed, accepted, reused, updated) "
+                    "VALUES (?, ?, ?, ?, ?, 1, 0, ?) "
+                    "ON CONFLICT (rule, exact_hash, fixed) DO UPDATE SET accepted = accepted + 1, updated = excluded.updated",
+                    (rule_id, exact_hash, near_hash, original, fixed_json, time.time())
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def lookup(self, rule, code: str) -> Optional[Tuple[List[Tuple[str, str]], str]]:
+        """
+        Find a known fix for a line.
+
+        Returns:
+            Tuple of (fixed lines adapted to this line, 'exact' or 'near'),
+            or None when no fix is known
+        """
+        rule_id = normalize_rule(rule)
+        exact_hash, near_hash = line_hashes(rule_id, code)
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT rowid, original, fixed FROM fixes WHERE rule = ? AND exact_hash = ? "
+                "ORDER BY accepted DESC, updated DESC LIMIT 1",
+                (rule_id, exact_hash)
+            ).fetchone()
+            kind = "exact"
+            if row is None and fix_memory_settings["near_matches"]:
+                row = conn.execute(
+                    "SELECT rowid, original, fixed FROM fixes WHERE rule = ? AND near_hash = ? "
+                    "ORDER BY accepted DESC, updated DESC LIMIT 1",
+                    (rule_id, near_hash)
+                ).fetchone()
+                kind = "near"
+            if row is None:
+                return None
+            rowid, original, fixed = row
+
+            # Map the stored line's identifiers onto this line's and keep this line's indentation
+            renames = dict(zip(identifier_names(tokenize(original)), identifier_names(tokenize(code))))
+            renames = {old: new for old, new in renames.items() if old != new}
+            old_indent = INDENT_RE.match(original).group()
+            new_indent = INDENT_RE.match(code).group()
+            adapted = [
+                (suffix, _reindent(_rename(line, renames), old_indent, new_indent))
+                for suffix, line in json.loads(fixed)
+            ]
+
+            conn.execute("UPDATE fixes SET reused = reused + 1 WHERE rowid = ?", (rowid,))
+        return adapted, kind
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM fixes").fetchone()[0]
+
+_memory = None
+
+def get_fix_memory() -> Optional[FixMemory]:
+    """Return the process-wide fix memory, or None when it is disabled"""
+    global _memory
+    if not fix_memory_settings["enabled"]:
+        return None
+    if _memory is None:
+        _memory = FixMemory(fix_memory_settings["db_path"])
+    return _memory
+
+def _violation_line(violation: dict) -> Optional[int]:
+    try:
+        return int(violation.get('line'))
+    except (TypeError, ValueError):
+        return None
+
+def apply_remembered_fixes(numbered_file: str, violations: List[dict],
+                           taken: Optional[dict] = None) -> Tuple[Dict[str, str], List[dict], List[dict]]:
+    """
+    Apply remembered fixes to the violations they match.
+
+    Args:
+        numbered_file: Path to the numbered file
+        violations: Violations to fix
+        taken: Snippets already made for this batch (e.g. local fixes); a
+            remembered fix writing any of their keys is not used
+
+    Returns:
+        Tuple of (snippets in {lineno: code} format, handled violations,
+        violations that must still be sent to the LLM)
+    """
+    memory = get_fix_memory()
+    if memory is None:
+        return {}, [], violations
+
+    lines = load_numbered_lines(numbered_file)
+    taken = taken or {}
+    snippets = {}
+    handled = []
+    remaining = []
+
+    for violation in violations:
+        line = _violation_line(violation)
+        key = str(line)
+        _bump("lookups")
+
+        match = None
+        # Lines already changed by another fix in this batch are left to the LLM
+        if key in lines and key not in snippets:
+            match = memory.lookup(violation.get('misra'), lines[key])
+
+        if match and not (len(match[0]) == 1 and match[0][0][1].strip() == lines[key].strip()):
+            fixed, kind = match
+            edits = {f"{key}{suffix}": code for suffix, code in fixed}
+            # Keys written by another fix in this batch would overwrite or be overwritten by it
+            if not any(k in taken or k in snippets for k in edits):
+                snippets.update(edits)
+                handled.append(violation)
+                _bump(f"{kind}_hits")
+                continue
+        remaining.append(violation)
+
+    return snippets, handled, remaining
+
+def record_accepted_fixes(numbered_file: str, snippets: dict, violation_fixes: List[dict],
+                          source: Optional[str] = None) -> int:
+    """
+    Remember the fixes of an applied batch.
+
+    Only fixes confined to the violation line (plus lines inserted right
+    after it) are recorded, since only those can be replayed on another
+    file. A snippet region covering several violations is split between
+    them only if every line it touches is itself a violation line.
+
+    Args:
+        numbered_file: Path to the numbered file the snippets refer to
+        snippets: Applied snippets
+        violation_fixes: Mapping from map_snippets_to_violations
+        source: Project the fixes were applied in; applying the same fix
+            to the same line again does not count it twice
+
+    Returns:
+        Number of fixes recorded
+    """
+    memory = get_fix_memory()
+    if memory is None:
+        return 0
+
+    lines = load_numbered_lines(numbered_file)
+    violation_lines = {entry.get('line') for entry in violation_fixes}
+    recorded = 0
+    for entry in violation_fixes:
+        line = entry.get('line')
+        region_keys = entry.get('snippetLines') or []
+        if line is None or str(line) not in region_keys or str(line) not in lines:
+            continue
+        if any(base_line(k) not in violation_lines for k in region_keys):
+            continue
+        keys = [k for k in region_keys if base_line(k) == line]
+
+        fixed = [(k[len(str(line)):], snippets[k]) for k in sorted(keys, key=line_sort_key)]
+        if len(fixed) == 1 and fixed[0][1].strip() == lines[str(line)].strip():
+            continue
+
+        if memory.record(entry.get('misra'), lines[str(line)], fixed, source=source, line=str(line)):
+            recorded += 1
+
+    _bump("recorded", recorded)
+    return recorded
+
+def record_llm_time(seconds: float, violation_count: int):
+    _bump("llm_seconds", seconds)
+    _bump("llm_violations", violation_count)
+
+def get_fix_memory_stats() -> dict:
+    """Lookup hit rate and the estimated LLM time saved by remembered fixes"""
+    memory = get_fix_memory()
+    with _stats_lock:
+        stats = dict(memory_stats)
+
+    hits = stats["exact_hits"] + stats["near_hits"]
+    seconds_per_violation = stats["llm_seconds"] / stats["llm_violations"] if stats["llm_violations"] else 0.0
+    return {
+        "enabled": memory is not None,
+        "entries": memory.count() if memory else 0,
+        "lookups": stats["lookups"],
+        "exactHits": stats["exact_hits"],
+        "nearHits": stats["near_hits"],
+        "hitRate": hits / stats["lookups"] if stats["lookups"] else 0.0,
+        "recorded": stats["recorded"],
+        "llmSecondsPerViolation": seconds_per_violation,
+        "estimatedSecondsSaved": hits * seconds_per_violation,
+    }
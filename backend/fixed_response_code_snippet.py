@@ -2,6 +2,10 @@
 import re
 import json
 
+from structured_logging import get_logger
+
+logger = get_logger("fixed_response_code_snippet")
+
 def extract_snippets_from_response(response_text):
     """
     Parses Gemini-style C++ response text and extracts line-numbered code,
@@ -11,6 +15,7 @@ def extract_snippets_from_response(response_text):
     code_blocks = re.findall(r"```(?:cpp|c\+\+)?\s*\n(.*?)```", response_text, re.DOTALL)
     
     all_lines = {}
+    skipped = 0
 
     for block in code_blocks:
         lines = block.strip().splitlines()
@@ -21,8 +26,11 @@ def extract_snippets_from_response(response_text):
                 code = match.group(2).rstrip()  # Do NOT strip backslashes
                 all_lines[lineno] = code
             else:
-                print(f"⚠️ Skipping: {line}")
+                skipped += 1
+                logger.debug("Skipping: %s", line)
     
+    if skipped:
+        logger.warning("Skipped %d snippet lines without a line-number prefix", skipped)
     return all_lines
 
 
@@ -0,0 +1,118 @@
+# history_compaction.py - Keep chat history small so per-turn latency stays flat in long sessions
+
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+from vertexai.generative_models import Content, Part
+
+from misra_chat_client import FILE_INTRO_PROMPT
+
+compaction_settings = {
+    "enabled": os.environ.get("MISRA_HISTORY_COMPACTION", "1") == "1",
+    # The last exchanges are kept verbatim so follow-up questions still see them
+    "keep_recent_turns": 2,
+    # Oldest exchanges are dropped beyond this estimate (~4 chars per token)
+    "max_history_tokens": int(os.environ.get("MISRA_MAX_HISTORY_TOKENS", "200000")),
+    # Prose kept from a summarized fix response or an old prompt
+    "summary_chars": 300,
+}
+
+CODE_BLOCK_RE = re.compile(r"```(?:cpp|c\+\+)?\s*\n(.*?)```", re.DOTALL)
+NUMBERED_LINE_RE = re.compile(r"^(\d+[a-zA-Z]*):(.*)$", re.MULTILINE)
+
+def _text(content) -> str:
+    return "".join(getattr(part, "text", "") or "" for part in content.parts)
+
+def _content(role: str, text: str) -> Content:
+    return Content(role=role, parts=[Part.from_text(text)])
+
+def _estimate(history: list) -> int:
+    return sum(len(_text(content)) for content in history) // 4
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _numbered_lines(text: str) -> Dict[str, str]:
+    return {key: code.strip() for key, code in NUMBERED_LINE_RE.findall(text)}
+
+def _summarize_fix_response(text: str, limit: int, current_lines: Optional[Dict[str, str]]) -> Optional[str]:
+    """
+    Replace the code blocks of a fix response with the line keys they changed,
+    but only if every changed line is in the current file state; fixes that
+    were replaced by a later batch or chat turn stay verbatim.
+    """
+    blocks = CODE_BLOCK_RE.findall(text)
+    if not blocks or current_lines is None:
+        return None
+
+    changed = _numbered_lines("\n".join(blocks))
+    if any(current_lines.get(key) != code for key, code in changed.items()):
+        return None
+
+    keys = list(changed)
+    prose = _shorten(CODE_BLOCK_RE.sub(" ", text), limit)
+    summary = f"[Earlier fix response: {len(keys)} line(s) changed"
+    if keys:
+        summary += f" ({', '.join(keys[:20])}{', ...' if len(keys) > 20 else ''})"
+    summary += "; already merged into the current file state above.]"
+    return f"{summary}\n{prose}" if prose else summary
+
+def compact_history(history: list, current_numbered: Optional[str] = None) -> Tuple[list, Dict[str, int]]:
+    """
+    Compact a chat history before the next turn.
+
+    The file sent with the first prompt is replaced by its current merged
+    state (still keyed by the original `N:` / `100a:` prefixes, so line
+    references in later prompts and responses stay valid). Fix responses
+    older than the last `keep_recent_turns` exchanges are summarized to the
+    line keys they touched when those lines appear unchanged in the current
+    state (otherwise they are kept verbatim), old prompts are shortened, and
+    the oldest exchanges are dropped while the estimate exceeds `max_history_tokens`.
+
+    Args:
+        history: Chat history (alternating user and model Content)
+        current_numbered: Current numbered file content; None keeps the intro
+            and every fix response as is
+
+    Returns:
+        Tuple of (compacted history, stats with tokensBefore, tokensAfter and tokensSaved)
+    """
+    tokens_before = _estimate(history)
+    compacted = list(history)
+
+    if compaction_settings["enabled"] and compacted:
+        limit = compaction_settings["summary_chars"]
+
+        # The intro and its acknowledgement always stay first
+        head = 0
+        if compacted[0].role == "user" and _text(compacted[0]).startswith(FILE_INTRO_PROMPT):
+            head = min(2, len(compacted))
+            if current_numbered is not None:
+                compacted[0] = _content(
+                    "user",
+                    FILE_INTRO_PROMPT + "\n\n(Current state of the file, including the fixes applied so far.)\n\n" + current_numbered
+                )
+
+        current_lines = _numbered_lines(current_numbered) if current_numbered is not None else None
+        recent_start = max(head, len(compacted) - 2 * compaction_settings["keep_recent_turns"])
+        for i in range(head, recent_start):
+            text = _text(compacted[i])
+            if compacted[i].role == "model":
+                summary = _summarize_fix_response(text, limit, current_lines)
+                if summary is not None and len(summary) < len(text):
+                    compacted[i] = _content("model", summary)
+            elif len(text) > limit:
+                compacted[i] = _content("user", _shorten(text, limit))
+
+        # Drop whole exchanges so roles keep alternating
+        while _estimate(compacted) > compaction_settings["max_history_tokens"] and len(compacted) - head > 2:
+            del compacted[head:head + 2]
+
+    tokens_after = _estimate(compacted)
+    return compacted, {
+        "tokensBefore": tokens_before,
+        "tokensAfter": tokens_after,
+        "tokensSaved": tokens_before - tokens_after,
+    }
@@ -0,0 +1,256 @@
+# job_queue.py - Background job queue with persisted state, progress and cancellation
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from structured_logging import get_logger, new_correlation_id, bind_project
+
+logger = get_logger("job_queue")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+TERMINAL_STATES = {DONE, FAILED, CANCELLED}
+
+class JobCancelled(Exception):
+    """Raised inside a running job when cancellation was requested"""
+
+class JobContext:
+    """Handed to a running job to report progress and observe cancellation"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self.job_id = job_id
+
+    def check_cancelled(self):
+        if self._queue.get(self.job_id)['cancelRequested']:
+            raise JobCancelled()
+
+    def progress(self, stage: str, fraction: Optional[float] = None):
+        """Record the current stage; raises JobCancelled if the job was cancelled"""
+        changes = {'stage': stage}
+        if fraction is not None:
+            changes['progress'] = round(min(max(fraction, 0.0), 1.0), 3)
+        self._queue._update(self.job_id, **changes)
+        self.check_cancelled()
+
+class JobQueue:
+    """
+    Runs jobs on worker threads, scheduling round-robin across projects so
+    one project's large batch cannot starve the others. A project runs one
+    job at a time, since its steps share the project's session and chat
+    history. Every state change is persisted as JSON under storage_dir, and
+    finished jobs are dropped `ttl` seconds after they end.
+    """
+
+    def __init__(self, storage_dir: str, workers: int = 2, ttl: float = 86400):
+        self.storage_dir = storage_dir
+        self.ttl = ttl
+        os.makedirs(storage_dir, exist_ok=True)
+
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._funcs: Dict[str, Callable] = {}
+        # project id -> queued job ids, rotated for fair scheduling
+        self._pending: "OrderedDict[str, deque]" = OrderedDict()
+        # Projects with a running job; their queued jobs wait
+        self._running: set = set()
+        self._cond = threading.Condition(threading.RLock())
+        self._recent_waits = deque(maxlen=100)
+
+        self._load()
+
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True).start()
+
+    # === Persistence ===
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{job_id}.json")
+
+    def _persist(self, job: dict):
+        tmp_path = self._path(job['id']) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, indent=2, default=str)
+        os.replace(tmp_path, self._path(job['id']))
+
+    def _load(self):
+        """Load persisted jobs; jobs interrupted by a restart are marked failed"""
+        for name in os.listdir(self.storage_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.storage_dir, name), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error("Error loading job %s: %s", name, e)
+                continue
+
+            if job['state'] not in TERMINAL_STATES:
+                job.update(state=FAILED, error="Interrupted by server restart", finishedAt=time.time())
+                self._persist(job)
+            self._jobs[job['id']] = job
+        self._prune()
+
+    def _prune(self):
+        """Forget finished jobs older than the TTL (caller holds the lock)"""
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job['state'] in TERMINAL_STATES and (job.get('finishedAt') or 0) < cutoff:
+                del self._jobs[job_id]
+                try:
+                    os.remove(self._path(job_id))
+                except OSError as e:
+                    logger.warning("Error removing job %s: %s", job_id, e)
+
+    # === State changes ===
+    def _update(self, job_id: str, **changes) -> dict:
+        with self._cond:
+            job = self._jobs[job_id]
+            job.update(changes)
+            job['version'] += 1
+            self._persist(job)
+            self._cond.notify_all()
+            return dict(job)
+
+    def submit(self, kind: str, project_id: str, func: Callable[[JobContext], Any]) -> dict:
+        """
+        Queue a job.
+
+        Args:
+            kind: Job type (e.g. 'fix-violations')
+            project_id: Project the job belongs to
+            func: Callable run on a worker thread with a JobContext; its
+                return value must be JSON-serializable
+
+        Returns:
+            The job record
+        """
+        job = {
+            'id': str(uuid.uuid4()),
+            'kind': kind,
+            'projectId': project_id,
+            'state': QUEUED,
+            'stage': None,
+            'progress': 0.0,
+            'result': None,
+            'error': None,
+            'cancelRequested': False,
+            'createdAt': time.time(),
+            'startedAt': None,
+            'finishedAt': None,
+            'version': 0,
+        }
+        with self._cond:
+            self._prune()
+            self._jobs[job['id']] = job
+            self._funcs[job['id']] = func
+            self._pending.setdefault(project_id, deque()).append(job['id'])
+            self._persist(job)
+            self._cond.notify_all()
+        return dict(job)
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job immediately, or ask a running job to stop"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['state'] == QUEUED:
+                pending = self._pending.get(job['projectId'])
+                if pending and job_id in pending:
+                    pending.remove(job_id)
+                self._funcs.pop(job_id, None)
+                return self._update(job_id, state=CANCELLED, cancelRequested=True, finishedAt=time.time())
+            if job['state'] == RUNNING:
+                return self._update(job_id, cancelRequested=True)
+            return dict(job)
+
+    # === Queries ===
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, project_id: Optional[str] = None) -> List[dict]:
+        with self._cond:
+            jobs = [dict(j) for j in self._jobs.values() if project_id is None or j['projectId'] == project_id]
+        return sorted(jobs, key=lambda j: j['createdAt'], reverse=True)
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float = 15.0) -> Optional[dict]:
+        """Block until the job's version differs from `version` or the timeout passes"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id]['version'] != version,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> dict:
+        """Queue depth per project and observed queue wait times"""
+        now = time.time()
+        with self._cond:
+            queued = [j for j in self._jobs.values() if j['state'] == QUEUED]
+            running = sum(1 for j in self._jobs.values() if j['state'] == RUNNING)
+            waits = list(self._recent_waits)
+            depth = {project: len(ids) for project, ids in self._pending.items() if ids}
+
+        return {
+            'queued': len(queued),
+            'running': running,
+            'depthByProject': depth,
+            'oldestQueuedWait': max((now - j['createdAt'] for j in queued), default=0.0),
+            'averageWait': sum(waits) / len(waits) if waits else 0.0,
+        }
+
+    # === Workers ===
+    def _next_job_id(self) -> Optional[str]:
+        """Take the next job round-robin across idle projects (caller holds the lock)"""
+        for project_id in list(self._pending):
+            ids = self._pending[project_id]
+            if not ids:
+                del self._pending[project_id]
+                continue
+            if project_id in self._running:
+                continue
+            self._pending.move_to_end(project_id)
+            return ids.popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job_id = self._next_job_id()
+                while job_id is None:
+                    self._cond.wait()
+                    job_id = self._next_job_id()
+                func = self._funcs.pop(job_id)
+                self._recent_waits.append(time.time() - self._jobs[job_id]['createdAt'])
+                project_id = self._jobs[job_id]['projectId']
+                self._running.add(project_id)
+
+            # Log records of the job carry its id and project
+            new_correlation_id(job_id)
+            bind_project(project_id)
+
+            try:
+                self._update(job_id, state=RUNNING, startedAt=time.time())
+                result = func(JobContext(self, job_id))
+                self._update(job_id, state=DONE, progress=1.0, result=result, finishedAt=time.time())
+            except JobCancelled:
+                self._update(job_id, state=CANCELLED, finishedAt=time.time())
+            except Exception as e:
+                error = getattr(e, 'detail', None) or str(e)
+                logger.error("Job %s failed: %s", job_id, error)
+                self._update(job_id, state=FAILED, error=error, finishedAt=time.time())
+            finally:
+                with self._cond:
+                    self._running.discard(project_id)
+                    self._cond.notify_all()
@@ -0,0 +1,91 @@
+# line_index.py - Line-offset index for serving line ranges of large files
+
+import os
+import threading
+from array import array
+from typing import Dict, List, Tuple
+
+from source_buffer import mapped_file, build_line_offsets
+
+# file path -> ((mtime_ns, size), offsets)
+_index_cache: Dict[str, Tuple[Tuple[int, int], array]] = {}
+_cache_lock = threading.Lock()
+
+def build_line_index(file_path: str) -> array:
+    """
+    Build the byte offset of the start of every line in a file.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        Array of offsets with one entry per line plus a final entry holding
+        the file size, so line i (0-based) spans offsets[i]:offsets[i + 1]
+    """
+    with mapped_file(file_path) as buf:
+        return build_line_offsets(buf)
+
+def get_line_index(file_path: str) -> array:
+    """
+    Return the cached line index for a file, rebuilding it if the file changed.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        Array of line start offsets (see build_line_index)
+    """
+    stat = os.stat(file_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _index_cache.get(file_path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+    offsets = build_line_index(file_path)
+
+    with _cache_lock:
+        _index_cache[file_path] = (key, offsets)
+
+    return offsets
+
+def count_lines(file_path: str) -> int:
+    """Return the number of lines in a file using its line index."""
+    return len(get_line_index(file_path)) - 1
+
+def read_line_range(file_path: str, start: int, count: int) -> Tuple[List[str], int]:
+    """
+    Read a range of lines by seeking to its offset instead of reading the whole file.
+
+    Args:
+        file_path: Path to the file
+        start: First line to return (1-based)
+        count: Maximum number of lines to return
+
+    Returns:
+        Tuple of (lines without line terminators, total number of lines in the file)
+    """
+    offsets = get_line_index(file_path)
+    total_lines = len(offsets) - 1
+
+    first = max(start, 1) - 1
+    last = min(first + max(count, 0), total_lines)
+    if first >= last:
+        return [], total_lines
+
+    base = offsets[first]
+    with open(file_path, 'rb') as f:
+        f.seek(base)
+        chunk = f.read(offsets[last] - base)
+
+    lines = []
+    for i in range(first, last):
+        raw = chunk[offsets[i] - base:offsets[i + 1] - base]
+        if raw.endswith(b'\n'):
+            raw = raw[:-1]
+        if raw.endswith(b'\r'):
+            raw = raw[:-1]
+        lines.append(raw.decode('utf-8', errors='replace'))
+
+    return lines, total_lines
@@ -0,0 +1,191 @@
+# line_shift.py - Fenwick-tree line-shift index for remapping lines across fix iterations
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+class FenwickTree:
+    """Binary indexed tree over positions 1..size with prefix sums and lower-bound search"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    @classmethod
+    def from_values(cls, values: List[int]) -> "FenwickTree":
+        """Build from values[0..size-1] (positions 1..size) in O(n)"""
+        fenwick = cls(len(values))
+        tree = fenwick.tree
+        for i, value in enumerate(values, 1):
+            tree[i] += value
+            parent = i + (i & -i)
+            if parent <= fenwick.size:
+                tree[parent] += tree[i]
+        return fenwick
+
+    def add(self, position: int, delta: int):
+        while position <= self.size:
+            self.tree[position] += delta
+            position += position & -position
+
+    def prefix_sum(self, position: int) -> int:
+        """Sum of positions 1..position"""
+        position = min(position, self.size)
+        total = 0
+        while position > 0:
+            total += self.tree[position]
+            position -= position & -position
+        return total
+
+    def lower_bound(self, target: int) -> int:
+        """Smallest position whose prefix sum is >= target (size + 1 if none); values must be non-negative"""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] < target:
+                position = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return position + 1
+
+KEY_RE = re.compile(r"^(\d+)([a-zA-Z]*)$")
+
+class LineShiftIndex:
+    """
+    Line mapping for one fix iteration, from the file the fixes were made
+    for to the file apply-fixes produced.
+
+    Every original line owns a slot in the new file: the line itself (unless
+    deleted) followed by the lines inserted after it. The slot widths are
+    kept in a Fenwick tree, so both directions are O(log n).
+    """
+
+    def __init__(self, insertions: Dict[int, int], deletions=(), size: Optional[int] = None):
+        """
+        Args:
+            insertions: Original line -> number of lines inserted after it
+            deletions: Original lines that no longer exist
+            size: Number of original lines covered (at least every edited line)
+        """
+        edited = list(insertions) + list(deletions)
+        self.size = max([size or 0] + edited)
+        self.deletions = set(deletions)
+        widths = [1] * self.size
+        for line, count in insertions.items():
+            widths[line - 1] += count
+        for line in self.deletions:
+            widths[line - 1] -= 1
+        self.fenwick = FenwickTree.from_values(widths)
+        # Lines after the covered range all move by the same amount
+        self.tail_shift = self.fenwick.prefix_sum(self.size) - self.size
+
+    @classmethod
+    def from_snippets(cls, snippets: dict, size: Optional[int] = None) -> "LineShiftIndex":
+        """
+        Build from fixed snippets: '100a' inserts a line after line 100.
+        Lines emptied by a fix are kept as empty lines by apply-fixes, so
+        they are not deletions.
+        """
+        insertions = {}
+        for key in snippets:
+            match = KEY_RE.match(key)
+            if match and match.group(2):
+                line = int(match.group(1))
+                insertions[line] = insertions.get(line, 0) + 1
+        return cls(insertions, size=size)
+
+    def to_current(self, line: int) -> Optional[int]:
+        """Map an original line to its line in the fixed file (None if deleted)"""
+        if line > self.size:
+            return line + self.tail_shift
+        if line < 1 or line in self.deletions:
+            return None
+        return self.fenwick.prefix_sum(line - 1) + 1
+
+    def inserted_position(self, line: int, rank: int) -> int:
+        """Line in the fixed file of the rank-th (1-based) line inserted after `line`"""
+        if line > self.size:
+            return line + self.tail_shift + rank
+        return self.fenwick.prefix_sum(line - 1) + (0 if line in self.deletions else 1) + rank
+
+    def to_original(self, line: int) -> Tuple[Optional[int], bool]:
+        """
+        Map a line of the fixed file back to the original file.
+
+        Returns:
+            Tuple of (original line, inserted). For an inserted line this is
+            the original line it was inserted after, with inserted=True.
+        """
+        total = self.size + self.tail_shift
+        if line > total:
+            return line - self.tail_shift, False
+        if line < 1:
+            return None, False
+
+        original = self.fenwick.lower_bound(line)
+        offset = line - self.fenwick.prefix_sum(original - 1)
+        if offset == 1 and original not in self.deletions:
+            return original, False
+        return original, True
+
+class ProjectLineIndex:
+    """
+    Line-shift indexes for the successive fix iterations of a project.
+
+    Version 0 is the first uploaded file; version k is the file produced by
+    the k-th apply-fixes. Re-applying fixes to the same file replaces its
+    version instead of adding one.
+    """
+
+    def __init__(self):
+        self.versions: List[LineShiftIndex] = []
+
+    @property
+    def current_version(self) -> int:
+        return len(self.versions)
+
+    def set_version(self, version: int, index: LineShiftIndex):
+        """Set the mapping from `version` to `version + 1`"""
+        if version < len(self.versions):
+            self.versions[version] = index
+            del self.versions[version + 1:]
+        else:
+            self.versions.append(index)
+
+    def to_current(self, line: Optional[int], from_version: int) -> Optional[int]:
+        """Map a line of an earlier version to the latest version"""
+        for index in self.versions[from_version:]:
+            if line is None:
+                return None
+            line = index.to_current(line)
+        return line
+
+    def to_version(self, line: Optional[int], to_version: int) -> Optional[int]:
+        """Map a line of the latest version back to an earlier version (None for inserted lines)"""
+        for index in reversed(self.versions[to_version:]):
+            if line is None:
+                return None
+            line, inserted = index.to_original(line)
+            if inserted:
+                return None
+        return line
+
+    def remap(self, line: Optional[int], from_version: int, to_version: int) -> Optional[int]:
+        """Map a line between any two versions through the latest one"""
+        if from_version == to_version:
+            return line
+        return self.to_version(self.to_current(line, from_version), to_version)
+
+def inserted_ranks(snippets: dict) -> Dict[str, int]:
+    """Rank (1-based) of each inserted key among the keys inserted after the same line"""
+    by_line = {}
+    for key in snippets:
+        match = KEY_RE.match(key)
+        if match and match.group(2):
+            by_line.setdefault(int(match.group(1)), []).append(match.group(2))
+
+    ranks = {}
+    for line, suffixes in by_line.items():
+        for rank, suffix in enumerate(sorted(suffixes), 1):
+            ranks[f"{line}{suffix}"] = rank
+    return ranks
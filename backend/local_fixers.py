@@ -0,0 +1,333 @@
+# local_fixers.py - Deterministic local fixes for mechanical MISRA rules
+
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from misra_rules import normalize_rule
+from replace import load_numbered_lines, line_sort_key
+from structured_logging import get_logger
+
+logger = get_logger("local_fixers")
+
+# Registered fixers: (rule ids, message pattern, fixer function)
+_fixers: List[Tuple[set, Optional[re.Pattern], Callable]] = []
+
+def register_fixer(rules: List[str], message: Optional[str] = None):
+    """
+    Register a local fixer for the given rule ids.
+
+    A fixer is called as fixer(lines, key, violation), where lines maps line
+    keys to the current numbered-line content. It returns a dict of
+    {lineno: code} snippet lines, or None when it cannot fix the violation
+    safely. The optional message pattern must also match the report's
+    warning text, which guards against rule-number clashes between standards.
+    """
+    def decorator(fn):
+        _fixers.append((set(rules), re.compile(message, re.IGNORECASE) if message else None, fn))
+        return fn
+    return decorator
+
+def find_fixer(violation: dict) -> Optional[Callable]:
+    rule_id = normalize_rule(violation.get('misra'))
+    warning = str(violation.get('warning') or '')
+    for rules, message, fn in _fixers:
+        if rule_id in rules and (message is None or message.search(warning)):
+            return fn
+    return None
+
+# === Helpers ===
+INDENT_RE = re.compile(r"^(\s*)(.*?)(\s*)$")
+
+def mask_code(code: str) -> Optional[str]:
+    """
+    Blank out string and char literals, keeping character positions.
+
+    Returns None if the line contains a comment, since rewrites that append
+    code could otherwise end up inside it.
+    """
+    out = []
+    i = 0
+    while i < len(code):
+        if code.startswith("//", i) or code.startswith("/*", i) or code.startswith("*/", i):
+            return None
+        ch = code[i]
+        if ch in "\"'":
+            j = i + 1
+            while j < len(code) and code[j] != ch:
+                j += 2 if code[j] == "\\" else 1
+            j = min(j, len(code))
+            out.append(ch + " " * (j - i - 1) + (ch if j < len(code) else ""))
+            i = j + 1
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+def match_paren(code: str, start: int) -> int:
+    """Return the index of the parenthesis closing the one at start, or -1"""
+    depth = 0
+    for i in range(start, len(code)):
+        if code[i] == "(":
+            depth += 1
+        elif code[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+def line_key(violation: dict) -> Optional[str]:
+    try:
+        return str(int(violation.get('line')))
+    except (TypeError, ValueError):
+        return None
+
+# === Unsigned literal suffix ===
+UNSUFFIXED_LITERAL_RE = re.compile(r"(?<![\w.])(0[xX][0-9a-fA-F]+|0[0-7]+|[1-9]\d*|0)([lL]{0,2})(?![\w.])")
+
+@register_fixer(["2-13-3", "7-2"], message=r"suffix")
+def fix_unsigned_suffix(lines: dict, key: str, violation: dict) -> Optional[dict]:
+    """Add a `U` suffix when the line has exactly one candidate literal"""
+    code = lines[key]
+    masked = mask_code(code)
+    if masked is None:
+        return None
+
+    hex_or_octal_only = normalize_rule(violation.get('misra')) == "2-13-3"
+    candidates = [
+        m for m in UNSUFFIXED_LITERAL_RE.finditer(masked)
+        if not hex_or_octal_only or (m.group(1).startswith("0") and m.group(1) != "0")
+    ]
+    if len(candidates) != 1:
+        return None
+
+    m = candidates[0]
+    return {key: code[:m.end(1)] + "U" + code[m.end(1):]}
+
+# === Compound statement bodies ===
+CONTROL_RE = re.compile(r"^(\s*)((?:\}\s*)?(?:else\s+)?(?:if|while|for))\s*\(")
+ELSE_RE = re.compile(r"^(\s*)((?:\}\s*)?else)\b(?!\s+if\b)\s*(.*)$")
+SIMPLE_STATEMENT_RE = re.compile(r"^(?!(?:if|else|for|while|do|switch|case|default)\b)[^{};]+;$")
+
+def _uses_allman_braces(lines: dict) -> bool:
+    standalone = sum(1 for code in lines.values() if code.strip() == "{")
+    trailing = sum(1 for code in lines.values() if code.rstrip().endswith("{") and code.strip() != "{")
+    return standalone > trailing
+
+def _split_control(code: str) -> Optional[Tuple[str, str]]:
+    """Split a control statement into its header and the code after it"""
+    masked = mask_code(code)
+    if masked is None:
+        return None
+
+    match = CONTROL_RE.match(masked)
+    if match:
+        end = match_paren(masked, match.end() - 1)
+        if end == -1:
+            return None
+        return code[:end + 1], code[end + 1:].strip()
+
+    match = ELSE_RE.match(masked)
+    if match:
+        return code[:match.end(2)], code[match.end(2):].strip()
+
+    return None
+
+@register_fixer(["6-3-1", "6-4-1", "15-6"], message=r"compound|brace")
+def fix_compound_body(lines: dict, key: str, violation: dict) -> Optional[dict]:
+    """Wrap a single-statement if/else/loop body in braces"""
+    split = _split_control(lines[key])
+    if split is None:
+        return None
+    header, body = split
+
+    # Body on the same line: `if (x) y = 1;` -> `if (x) { y = 1; }`
+    if body:
+        if not SIMPLE_STATEMENT_RE.match(body) or mask_code(body) is None:
+            return None
+        return {key: f"{header} {{ {body} }}"}
+
+    # Body on the next line
+    next_key = str(int(key) + 1)
+    if next_key not in lines:
+        return None
+    next_code = lines[next_key]
+    masked = mask_code(next_code)
+    if masked is None or not SIMPLE_STATEMENT_RE.match(masked.strip()):
+        return None
+
+    indent = INDENT_RE.match(header).group(1)
+    if _uses_allman_braces(lines):
+        return {f"{key}a": f"{indent}{{", f"{next_key}a": f"{indent}}}"}
+    return {key: f"{header} {{", f"{next_key}a": f"{indent}}}"}
+
+# === C-style casts ===
+CAST_TYPE = (
+    r"(?:(?:unsigned|signed)\s+)?(?:char|short|int|long(?:\s+long)?|float|double|bool"
+    r"|u?int(?:8|16|32|64)_t|[us]int(?:8|16|32|64)|float(?:32|64)|boolean|size_t)"
+)
+CAST_OPERAND = r"[A-Za-z_]\w*(?:(?:\.|->)[A-Za-z_]\w*|\[[^\[\]]*\])*|\d[\w.]*|\([^()]*\)"
+C_CAST_RE = re.compile(rf"(?<![\w\])])\(\s*({CAST_TYPE})\s*\)\s*({CAST_OPERAND})")
+# Postfix operators bind tighter than a cast: `(int)f(x)` casts the call's result
+POSTFIX_RE = re.compile(r"\s*(?:\(|\[|::|\+\+|--|\.|->)")
+NUMBER_RE = re.compile(r"\d[\w.]*")
+# Identifiers, but not literal suffixes such as the U of 1U
+IDENTIFIER_RE = re.compile(r"(?<![\w.])[A-Za-z_]\w*")
+NOT_A_DECLARATION = {
+    "return", "case", "else", "do", "goto", "throw", "delete", "new", "sizeof", "typedef", "using", "operator",
+}
+
+def _declared_arithmetic(lines: dict, name: str) -> bool:
+    """
+    True if every declaration of `name` in the file has an arithmetic type
+    and is neither a pointer nor an array. Anything that merely looks like a
+    declaration (`a * name`) counts against it, as does finding none.
+    """
+    declaration = re.compile(rf"([A-Za-z_][\w:]*)([\s*&]+){name}\s*([=;,)\[{{])")
+    found = False
+    for code in lines.values():
+        for m in declaration.finditer(code):
+            if m.group(1) in NOT_A_DECLARATION:
+                continue
+            if "*" in m.group(2) or m.group(3) == "[" or not re.fullmatch(rf"(?:std::)?{CAST_TYPE}", m.group(1)):
+                return False
+            found = True
+    return found
+
+def _arithmetic_operand(lines: dict, operand: str) -> bool:
+    """
+    True if the operand is a number, a variable declared with an arithmetic
+    type, or a parenthesized expression of those. Member access, subscripts
+    and calls are left to the LLM since their types are unknown here.
+    """
+    if NUMBER_RE.fullmatch(operand):
+        return True
+    if operand.startswith("("):
+        inner = operand[1:-1]
+        if re.search(r"\.(?!\d)|->|\[|\(|::", inner):
+            return False
+        return all(_declared_arithmetic(lines, name) for name in IDENTIFIER_RE.findall(inner))
+    return IDENTIFIER_RE.fullmatch(operand) is not None and _declared_arithmetic(lines, operand)
+
+# 5-2-2 (casts from a virtual base) needs dynamic_cast, so it is not fixed here
+@register_fixer(["5-2-4"], message=r"cast")
+def fix_c_style_cast(lines: dict, key: str, violation: dict) -> Optional[dict]:
+    """Replace a single C-style cast between arithmetic types with static_cast"""
+    code = lines[key]
+    masked = mask_code(code)
+    if masked is None:
+        return None
+
+    casts = list(C_CAST_RE.finditer(masked))
+    if len(casts) != 1:
+        return None
+
+    m = casts[0]
+    if POSTFIX_RE.match(masked, m.end()):
+        return None
+
+    # `(uint32)ptr` cannot become a static_cast; only rewrite known arithmetic operands
+    operand = code[m.start(2):m.end(2)]
+    if not _arithmetic_operand(lines, operand):
+        return None
+
+    if operand.startswith("(") and operand.endswith(")"):
+        operand = operand[1:-1].strip()
+    cast_type = re.sub(r"\s+", " ", m.group(1))
+    return {key: f"{code[:m.start()]}static_cast<{cast_type}>({operand}){code[m.end():]}"}
+
+# === const qualification ===
+DECLARATION_RE = re.compile(
+    r"^(\s*)((?:static\s+)?)((?:(?:unsigned|signed)\s+)?[A-Za-z_]\w*(?:::[A-Za-z_]\w*)*(?:\s+(?:int|long|char))?)\s+([A-Za-z_]\w*)\s*(=\s*[^;]+|\{[^;]*\});\s*$"
+)
+QUOTED_NAME_RE = re.compile(r"['\"`]([A-Za-z_]\w*)['\"`]")
+NOT_A_TYPE = {
+    "return", "delete", "throw", "goto", "case", "else", "const", "constexpr", "volatile",
+    "typedef", "using", "extern", "static_assert",
+}
+
+@register_fixer(["7-1-1"], message=r"const")
+def fix_const_qualification(lines: dict, key: str, violation: dict) -> Optional[dict]:
+    """Add const to a single initialised non-pointer variable declaration"""
+    code = lines[key]
+    masked = mask_code(code)
+    if masked is None:
+        return None
+
+    match = DECLARATION_RE.match(masked)
+    if not match or match.group(3).split()[0] in NOT_A_TYPE:
+        return None
+
+    # Several declarators (`int a = 1, b = 2;`) are left to the LLM
+    initializer = match.group(5)
+    depth = 0
+    for ch in initializer:
+        depth += ch in "({["
+        depth -= ch in ")}]"
+        if ch == "," and depth == 0:
+            return None
+
+    # If the report names the variable, it must be the one declared here
+    named = QUOTED_NAME_RE.findall(str(violation.get('warning') or ''))
+    if named and match.group(4) not in named:
+        return None
+
+    return {key: code[:match.start(3)] + "const " + code[match.start(3):]}
+
+# === Engine ===
+def apply_local_fixes(numbered_file: str, violations: List[dict]) -> Tuple[Dict[str, str], List[dict], List[dict]]:
+    """
+    Apply registered local fixers to the violations they can handle.
+
+    Args:
+        numbered_file: Path to the numbered file
+        violations: Violations to fix
+
+    Returns:
+        Tuple of (snippets in {lineno: code} format, handled violations,
+        violations that must still be sent to the LLM)
+    """
+    lines = load_numbered_lines(numbered_file)
+    snippets = {}
+    handled = []
+    remaining = []
+
+    for violation in violations:
+        fixer = find_fixer(violation)
+        key = line_key(violation)
+        edits = None
+        if fixer and key in lines:
+            try:
+                edits = fixer(lines, key, violation)
+            except Exception as e:
+                logger.warning("Local fixer %s failed on line %s: %s", fixer.__name__, key, e)
+
+        if edits:
+            lines.update(edits)
+            snippets.update(edits)
+            handled.append(violation)
+        else:
+            remaining.append(violation)
+
+    return snippets, handled, remaining
+
+def merge_snippet_sets(local_snippets: dict, llm_snippets: dict, numbered_file: str) -> dict:
+    """
+    Combine local and LLM snippets. LLM lines win, except where the LLM only
+    echoed a line unchanged as context and a local fix exists for it.
+    """
+    original_lines = load_numbered_lines(numbered_file)
+    merged = dict(local_snippets)
+    for key, code in llm_snippets.items():
+        if key in local_snippets and code.strip() == original_lines.get(key, "").strip():
+            continue
+        merged[key] = code
+    return merged
+
+def format_local_response(snippets: dict, handled: List[dict]) -> str:
+    """Describe local fixes in the same shape as an LLM fix response"""
+    rules = sorted({normalize_rule(v.get('misra')) for v in handled})
+    block = "\n".join(f"{key}:{snippets[key]}" for key in sorted(snippets, key=line_sort_key))
+    return (
+        f"Applied {len(handled)} local fixes for rules {', '.join(rules)}.\n\n"
+        f"```cpp\n{block}\n```"
+    )
@@ -1,7 +1,20 @@
 # misra_chat_client.py
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
 import vertexai
+from google.api_core import exceptions as api_exceptions
+from rate_limiter import get_rate_limiter, RateLimitTimeout, PRIORITY_BULK
+from structured_logging import get_logger
 from vertexai.generative_models import GenerativeModel, ChatSession, GenerationConfig, SafetySetting, HarmCategory, HarmBlockThreshold
 
+logger = get_logger("misra_chat_client")
+
 # === Step 0: Init Vertex AI ===
 def init_vertex_ai():
     vertexai.init(
@@ -15,13 +28,13 @@ def load_cpp_file(file_path: str) -> str:
         return f.read()
 
 # === Step 2: Start Gemini Chat ===
-def start_chat(
+def build_model(
     model_name="gemini-2.5-pro",
     temperature=0.5,
     top_p=0.95,
     max_tokens=65535,
     safety_settings=False
-) -> ChatSession:
+) -> GenerativeModel:
     # Setup generation config with provided settings
     generation_config = GenerationConfig(
         temperature=temperature,
@@ -54,47 +67,341 @@ def start_chat(
         generation_config=generation_config,
         safety_settings=safety_config,
     )
-    print("************************")
-    print(model_name)
+    logger.debug("Built model %s", model_name)
+
+    return model
+
+def start_chat(
+    model_name="gemini-2.5-pro",
+    temperature=0.5,
+    top_p=0.95,
+    max_tokens=65535,
+    safety_settings=False
+) -> ChatSession:
+    settings = dict(
+        model_name=model_name,
+        temperature=temperature,
+        top_p=top_p,
+        max_tokens=max_tokens,
+        safety_settings=safety_settings,
+    )
+    chat = build_model(**settings).start_chat()
+    _chat_settings[chat] = settings
+    return chat
+
+# === Resilience: retries, backoff, deadlines and hedging ===
+resilience_settings = {
+    "max_retries": int(os.environ.get("MISRA_LLM_MAX_RETRIES", "3")),
+    "base_delay": 1.0,
+    "max_delay": 30.0,
+    # Total time budget for one call including retries, and for a single attempt
+    "deadline": float(os.environ.get("MISRA_LLM_DEADLINE", "600")),
+    "attempt_timeout": float(os.environ.get("MISRA_LLM_ATTEMPT_TIMEOUT", "300")),
+    # Fire a duplicate request after the observed p95 latency (never earlier than hedge_min_delay)
+    "hedge": os.environ.get("MISRA_LLM_HEDGE", "0") == "1",
+    "hedge_model_name": os.environ.get("MISRA_LLM_HEDGE_MODEL"),
+    "hedge_min_delay": 5.0,
+    # No new hedges while this many timed-out requests are still running in the LLM pool
+    "max_abandoned": int(os.environ.get("MISRA_LLM_MAX_ABANDONED", "4")),
+}
+
+resilience_stats = {
+    "calls": 0,
+    "attempts": 0,
+    "retries": 0,
+    "hedges": 0,
+    "hedge_wins": 0,
+    "failures": 0,
+    "deadline_exceeded": 0,
+    # Requests that timed out or lost to a hedge but are still running
+    "abandoned": 0,
+}
+
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServerError,
+    api_exceptions.Aborted,
+    ConnectionError,
+    TimeoutError,
+)
+
+_latencies = deque(maxlen=200)
+_stats_lock = threading.Lock()
+# model name -> recently observed latency and failure rate (exponentially weighted)
+_model_health = {}
+MODEL_HEALTH_ALPHA = 0.2
+_llm_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+_chat_settings = weakref.WeakKeyDictionary()
+
+class LLMCallError(Exception):
+    """Raised when an LLM call fails after all retries"""
+
+class LLMDeadlineExceeded(LLMCallError):
+    """Raised when an LLM call does not finish within its deadline"""
+
+def _bump(counter: str, amount: int = 1):
+    with _stats_lock:
+        resilience_stats[counter] += amount
+
+def _percentile(samples, pct: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def _record_model_result(model_name: str, latency: float, ok: bool):
+    if not model_name:
+        return
+    with _stats_lock:
+        health = _model_health.setdefault(model_name, {"latency": None, "failure_rate": 0.0, "samples": 0})
+        health["samples"] += 1
+        health["failure_rate"] += MODEL_HEALTH_ALPHA * ((0.0 if ok else 1.0) - health["failure_rate"])
+        if ok:
+            previous = health["latency"]
+            health["latency"] = latency if previous is None else previous + MODEL_HEALTH_ALPHA * (latency - previous)
+
+def get_model_health(model_name: str) -> dict:
+    """Return the recently observed latency and failure rate of a model"""
+    with _stats_lock:
+        return dict(_model_health.get(model_name, {"latency": None, "failure_rate": 0.0, "samples": 0}))
+
+def get_chat_model_name(chat: ChatSession) -> str:
+    """Return the model name a chat session was started with"""
+    settings = _chat_settings.get(chat)
+    return settings["model_name"] if settings else None
+
+def history_chars(chat: ChatSession) -> int:
+    """Return the number of text characters in a chat history"""
+    return sum(
+        len(getattr(part, "text", "") or "")
+        for content in chat.history
+        for part in content.parts
+    )
+
+def get_resilience_stats() -> dict:
+    """Return retry/hedge counters, observed latency percentiles and per-model health"""
+    with _stats_lock:
+        stats = dict(resilience_stats)
+        samples = list(_latencies)
+        stats["models"] = {name: dict(health) for name, health in _model_health.items()}
+    stats["latency_p50"] = _percentile(samples, 0.50)
+    stats["latency_p95"] = _percentile(samples, 0.95)
+    stats["latency_samples"] = len(samples)
+    return stats
+
+def _hedge_delay() -> float:
+    with _stats_lock:
+        samples = list(_latencies)
+    p95 = _percentile(samples, 0.95) if len(samples) >= 20 else None
+    return max(resilience_settings["hedge_min_delay"], p95 or 0.0)
+
+def fork_chat(chat: ChatSession, model_name: str = None) -> ChatSession:
+    """
+    Create a new chat session with a copy of the history of an existing one,
+    optionally on a different model with the same generation settings.
+    """
+    settings = _chat_settings.get(chat)
+    if model_name and settings:
+        model = build_model(**{**settings, "model_name": model_name})
+    else:
+        model = chat._model
+        model_name = settings["model_name"] if settings else None
+
+    fork = ChatSession(model=model, history=list(chat.history))
+    if settings:
+        _chat_settings[fork] = {**settings, "model_name": model_name or settings["model_name"]}
+    return fork
+
+def _estimate_tokens(chat: ChatSession, message: str) -> int:
+    """Rough token estimate for a turn: the whole history is re-sent with every message"""
+    return (history_chars(chat) + len(message)) // 4
+
+def _record_token_usage(resp, estimated_tokens: int):
+    limiter = get_rate_limiter()
+    usage = getattr(resp, "usage_metadata", None)
+    actual_tokens = getattr(usage, "total_token_count", None)
+    if limiter and actual_tokens:
+        limiter.record_usage(estimated_tokens, actual_tokens)
+
+def _quota_available_now(project_id: str, priority: int, estimated_tokens: int) -> bool:
+    """Take quota for a hedge request only if it is available without waiting"""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return True
+    try:
+        limiter.acquire(project_id, priority, estimated_tokens, max_wait=0)
+        return True
+    except RateLimitTimeout:
+        return False
+
+def _abandon(futures):
+    """
+    Give up on requests of an attempt: queued ones are cancelled, but a
+    request already sent cannot be stopped, so it keeps its LLM pool thread
+    (and the quota it took) until it returns. Those are counted in
+    `abandoned` and hold off further hedges.
+    """
+    for future in futures:
+        if future.cancel():
+            continue
+        _bump("abandoned")
+        future.add_done_callback(lambda _: _bump("abandoned", -1))
+
+def _attempt(chat: ChatSession, message: str, timeout: float, hedge: bool, hedge_model_name: str, project_id: str, priority: int, estimated_tokens: int):
+    """Run one attempt on a forked session, hedging it if it is slower than usual"""
+    start = time.monotonic()
+    primary = fork_chat(chat)
+    futures = {_llm_pool.submit(primary.send_message, message): (primary, False)}
+    _bump("attempts")
+
+    if hedge:
+        done, _ = wait(futures, timeout=min(_hedge_delay(), timeout))
+        with _stats_lock:
+            hedge = resilience_stats["abandoned"] < resilience_settings["max_abandoned"]
+        if not done and hedge and _quota_available_now(project_id, priority, estimated_tokens):
+            hedge_chat = fork_chat(chat, hedge_model_name)
+            futures[_llm_pool.submit(hedge_chat.send_message, message)] = (hedge_chat, True)
+            _bump("hedges")
+            _bump("attempts")
+
+    error = None
+    pending = set(futures)
+    while pending:
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            fork, is_hedge = futures[future]
+            if future.exception() is None:
+                if is_hedge:
+                    _bump("hedge_wins")
+                latency = time.monotonic() - start
+                with _stats_lock:
+                    _latencies.append(latency)
+                _record_model_result(get_chat_model_name(fork), latency, True)
+                _abandon(pending)
+                return fork, future.result()
+            error = future.exception()
+            _record_model_result(get_chat_model_name(fork), 0.0, False)
+
+    if error is not None and not pending:
+        raise error
+    for future in pending:
+        _record_model_result(get_chat_model_name(futures[future][0]), 0.0, False)
+    _abandon(pending)
+    raise TimeoutError(f"LLM call did not complete within {timeout:.1f}s")
+
+def send_message_resilient(
+    chat: ChatSession,
+    message: str,
+    deadline: float = None,
+    hedge: bool = None,
+    hedge_model_name: str = None,
+    project_id: str = None,
+    priority: int = PRIORITY_BULK
+):
+    """
+    Send a message with classified retries, exponential backoff with jitter,
+    a per-call deadline and optional hedging.
 
-    return model.start_chat()
+    Each attempt runs on a fork of the session so abandoned or losing attempts
+    never touch the history; the winning fork's history is adopted by `chat`.
+    A timed-out or losing request cannot be stopped and runs on in the LLM
+    pool until it returns (see `_abandon`). Every attempt first waits for shared Vertex quota for its project and
+    priority (see rate_limiter).
+    """
+    deadline_at = time.monotonic() + (deadline or resilience_settings["deadline"])
+    hedge = resilience_settings["hedge"] if hedge is None else hedge
+    hedge_model_name = hedge_model_name or resilience_settings["hedge_model_name"]
+    _bump("calls")
+
+    retries = 0
+    while True:
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            _bump("deadline_exceeded")
+            _bump("failures")
+            raise LLMDeadlineExceeded("LLM call exceeded its deadline")
+
+        estimated_tokens = _estimate_tokens(chat, message)
+        limiter = get_rate_limiter()
+        if limiter:
+            try:
+                limiter.acquire(project_id, priority, estimated_tokens, max_wait=remaining)
+            except RateLimitTimeout as e:
+                _bump("failures")
+                raise LLMCallError(str(e)) from e
+            remaining = deadline_at - time.monotonic()
+
+        try:
+            fork, resp = _attempt(
+                chat, message, max(0.0, min(resilience_settings["attempt_timeout"], remaining)),
+                hedge, hedge_model_name, project_id, priority, estimated_tokens
+            )
+            chat.history[:] = fork.history
+            _record_token_usage(resp, estimated_tokens)
+            return resp
+        except RETRYABLE_ERRORS as e:
+            retries += 1
+            if retries > resilience_settings["max_retries"]:
+                _bump("failures")
+                raise LLMCallError(f"LLM call failed after {retries - 1} retries: {str(e)}") from e
+
+            # Exponential backoff with full jitter, bounded by the deadline
+            backoff = min(resilience_settings["max_delay"], resilience_settings["base_delay"] * 2 ** (retries - 1))
+            delay = min(random.uniform(0, backoff), max(0.0, deadline_at - time.monotonic()))
+            logger.warning("LLM call failed (%s: %s), retry %d in %.1fs", type(e).__name__, e, retries, delay)
+            _bump("retries")
+            time.sleep(delay)
+        except Exception:
+            _bump("failures")
+            raise
 
 # === Step 3: Send first prompt with file ===
-def send_file_intro(chat: ChatSession, numbered_cpp: str):
-    intro_prompt = (
+FILE_INTRO_PROMPT = (
         "You are an expert C++ developer specializing in MISRA C++ compliance for AUTOSAR embedded systems. "
         "I am providing you with the complete content of a C++ source file. Each line of the file is prefixed with "
         "its original line number followed by a colon. Please acknowledge that you have received and processed this entire file. "
         "Do not start fixing anything yet. Just confirm its reception and readiness for the next input, by saying: "
         "'FILE RECEIVED. READY FOR VIOLATIONS.'"
-    )
+)
+
+def send_file_intro(chat: ChatSession, numbered_cpp: str, project_id: str = None, priority: int = PRIORITY_BULK):
+    """
+    Send the numbered file; returns the acknowledgement, or None if the
+    response was blocked. LLMCallError (retries or deadline exhausted) is
+    raised to the caller.
+    """
+    intro_prompt = FILE_INTRO_PROMPT
 
     try:
         # Send system + file content
         #chat.send_message(intro_prompt)
         combined_message = intro_prompt + "\n\n" + numbered_cpp
-        resp = chat.send_message(combined_message)
-        print("\n=== Gemini ===", flush=True)
+        resp = send_message_resilient(chat, combined_message, project_id=project_id, priority=priority)
         
         # Handle blocked responses
         if resp is None:
-            print("Response was blocked by safety filters")
+            logger.warning("File intro response was blocked by safety filters")
             return None
         
         # Check if response has text
         if hasattr(resp, 'text') and resp.text:
-            print(resp.text)
+            logger.debug("File intro response: %s", resp.text)
             return resp.text
         else:
-            print("Response was empty or blocked")
+            logger.warning("File intro response was empty or blocked")
             return None
             
+    except LLMCallError:
+        raise
     except Exception as e:
-        print(f"Error in send_file_intro: {str(e)}")
+        logger.error("Error in send_file_intro: %s", e)
         return None
 
 # === Step 4: Send list of violations to fix ===
-def send_misra_violations(chat: ChatSession, violations_text: str) -> str:
+def send_misra_violations(chat: ChatSession, violations_text: str, project_id: str = None, priority: int = PRIORITY_BULK) -> str:
     second_prompt = (
         """
             Thank you for confirming. The C++ file content you received previously is the current state of the file, which may have already undergone some fixes.
@@ -139,7 +446,6 @@ def send_misra_violations(chat: ChatSession, violations_text: str) -> str:
         + violations_text
     )
 
-    resp = chat.send_message(second_prompt)
-    print("\n=== Gemini Fixes ===")
-    print(resp.text)
+    resp = send_message_resilient(chat, second_prompt, project_id=project_id, priority=priority)
+    logger.debug("Gemini fixes response: %s", resp.text)
     return resp.text
@@ -0,0 +1,10 @@
+# misra_rules.py - Rule identifiers shared by routing, local fixes, fix memory and report deltas
+
+import re
+
+RULE_ID_RE = re.compile(r"\d+(?:[-.]\d+)+")
+
+def normalize_rule(rule) -> str:
+    """Extract the rule number from a report's rule text ('MISRA C++ Rule 6-4-1' -> '6-4-1')"""
+    match = RULE_ID_RE.search(str(rule or ""))
+    return match.group().replace(".", "-") if match else str(rule or "").strip()
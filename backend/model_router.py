@@ -0,0 +1,83 @@
+# model_router.py - Per-request choice between a fast and a strong Gemini model
+
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from misra_chat_client import get_model_health
+from misra_rules import normalize_rule
+
+routing_settings = {
+    "enabled": os.environ.get("MISRA_ROUTING", "1") == "1",
+    "fast_model_name": os.environ.get("MISRA_FAST_MODEL", "gemini-2.5-flash"),
+    # Batches above these limits always go to the strong model
+    "max_fast_violations": 15,
+    "max_fast_prompt_chars": 400_000,
+    # Stop routing to the fast model while it is failing or slower than the strong one
+    "max_fast_failure_rate": 0.25,
+    # ...but send every Nth held-back batch to it anyway, so its health can recover
+    "probe_every": int(os.environ.get("MISRA_FAST_MODEL_PROBE_EVERY", "10")),
+    # Rule families that need whole-function reasoning (MISRA C++:2008 numbering)
+    "hard_rule_prefixes": ["0-1-", "6-5-", "6-6-", "7-5-", "10-", "14-", "15-"],
+}
+
+_held_back = 0
+_probe_lock = threading.Lock()
+
+def is_hard_rule(rule) -> bool:
+    rule_id = normalize_rule(rule)
+    return any(rule_id.startswith(prefix) for prefix in routing_settings["hard_rule_prefixes"])
+
+def choose_model(violations: List[dict], prompt_chars: int, strong_model: str) -> Tuple[str, str]:
+    """
+    Pick the model for a fix request.
+
+    Args:
+        violations: Violations in the batch
+        prompt_chars: Size of the history plus the new prompt in characters
+        strong_model: The configured (strong) model name
+
+    Returns:
+        Tuple of (model name, reason)
+    """
+    fast_model = routing_settings["fast_model_name"]
+
+    if not routing_settings["enabled"] or not fast_model or fast_model == strong_model:
+        return strong_model, "routing disabled"
+    if len(violations) > routing_settings["max_fast_violations"]:
+        return strong_model, f"{len(violations)} violations"
+    if prompt_chars > routing_settings["max_fast_prompt_chars"]:
+        return strong_model, f"prompt of {prompt_chars} characters"
+
+    hard_rules = sorted({normalize_rule(v.get("misra")) for v in violations if is_hard_rule(v.get("misra"))})
+    if hard_rules:
+        return strong_model, f"complex rules {', '.join(hard_rules)}"
+
+    fast_health = get_model_health(fast_model)
+    strong_health = get_model_health(strong_model)
+    unhealthy = None
+    if fast_health["failure_rate"] > routing_settings["max_fast_failure_rate"]:
+        unhealthy = f"{fast_model} failure rate {fast_health['failure_rate']:.2f}"
+    elif fast_health["latency"] and strong_health["latency"] and fast_health["latency"] > strong_health["latency"]:
+        unhealthy = f"{fast_model} currently slower than {strong_model}"
+    if unhealthy:
+        # Health only changes with new samples, so without probes the fast model would stay locked out
+        if _probe_due():
+            return fast_model, f"health probe ({unhealthy})"
+        return strong_model, unhealthy
+
+    return fast_model, "simple batch"
+
+def _probe_due() -> bool:
+    """Count a batch held back from the fast model; True for every `probe_every`-th one"""
+    global _held_back
+    with _probe_lock:
+        _held_back += 1
+        if _held_back < routing_settings["probe_every"]:
+            return False
+        _held_back = 0
+        return True
+
+def should_escalate(model_name: str, strong_model: str, validation: Optional[dict]) -> bool:
+    """Escalate to the strong model when fast-model snippets still fail validation"""
+    return model_name != strong_model and bool(validation) and not validation.get("valid", True)
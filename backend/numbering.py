@@ -1,6 +1,25 @@
 # numbering.py
+from source_buffer import mapped_file, load_as_utf8, build_line_offsets
+
 def add_line_numbers(input_file, output_file):
-    """Add line numbers to a C++ file"""
-    with open(input_file, 'r') as infile, open(output_file, 'w') as outfile:
-        for i, line in enumerate(infile, start=1):
-            outfile.write(f"{i}: {line}")
\ No newline at end of file
+    """
+    Add line numbers to a C++ file.
+
+    Lines are copied byte for byte (line endings included) from a memory-mapped
+    buffer; only non-UTF-8 sources are transcoded, once, so the numbered file
+    is always UTF-8. Returns the detected source format (encoding, BOM and
+    newline) needed to restore the original encoding when denumbering.
+    """
+    with mapped_file(input_file) as buf, open(output_file, 'wb') as outfile:
+        source, source_format = load_as_utf8(buf)
+        offsets = build_line_offsets(source)
+        view = memoryview(source) if isinstance(source, bytes) else source
+
+        for i in range(len(offsets) - 1):
+            outfile.write(b"%d: " % (i + 1))
+            outfile.write(view[offsets[i]:offsets[i + 1]])
+
+        if isinstance(source, bytes):
+            view.release()
+
+    return source_format
\ No newline at end of file
@@ -0,0 +1,268 @@
+# profiling.py - Opt-in request profiling, per-stage timings and a slow-request log
+
+import contextvars
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+PROFILE_MODES = ("sampling", "cprofile")
+
+profiling_settings = {
+    # Allow profiling single requests with the X-Profile header
+    "enabled": os.environ.get("MISRA_PROFILING", "1") == "1",
+    # Admin toggle: profile every request
+    "profile_all": False,
+    "mode": "sampling",
+    "sample_interval": 0.005,
+    # Requests slower than this (seconds) go to the slow-request log
+    "slow_threshold": float(os.environ.get("MISRA_SLOW_REQUEST_SECONDS", "5")),
+    "profile_dir": os.path.join("uploads", "profiles"),
+    "max_profiles": 50,
+}
+
+# Stage timings of the current request; None outside a tracked request
+_stage_timings: contextvars.ContextVar[Optional[List[dict]]] = contextvars.ContextVar("stage_timings", default=None)
+# Profiler of the current request; stage threads see it through the context copied by the executors
+_active_profiler: contextvars.ContextVar[Optional[object]] = contextvars.ContextVar("active_profiler", default=None)
+
+_profiles: "deque[dict]" = deque()
+_slow_requests: "deque[dict]" = deque(maxlen=100)
+_lock = threading.Lock()
+# cProfile and the sampler both watch the whole event loop thread and the shared stage threads, so only one request is profiled at a time
+_profile_slot = threading.Lock()
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a stage of the current request (no-op outside a tracked request)"""
+    timings = _stage_timings.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.append({"stage": stage, "seconds": round(time.perf_counter() - start, 4)})
+
+@contextmanager
+def track_request():
+    """Collect stage timings for the duration of a request"""
+    timings = []
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+def requested_mode(header_value: Optional[str]) -> Optional[str]:
+    """Profile mode for a request from its X-Profile header and the admin toggle"""
+    if not profiling_settings["enabled"]:
+        return None
+    if header_value:
+        value = header_value.strip().lower()
+        if value in PROFILE_MODES:
+            return value
+        if value in ("1", "true", "yes"):
+            return profiling_settings["mode"]
+        return None
+    return profiling_settings["mode"] if profiling_settings["profile_all"] else None
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the request thread and of the stage threads
+    working for it on a background thread, and aggregates the samples as
+    collapsed stacks (the input format of flamegraph.pl and speedscope).
+    Stacks of stage threads are rooted at a `[stage]` frame.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        # thread id -> root label (None for the request thread)
+        self._threads: Dict[int, Optional[str]] = {thread_id: None}
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = list(self._threads.items())
+            for thread_id, root in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    if root:
+                        stack.append(root)
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    @contextmanager
+    def worker(self, stage: str):
+        """Sample the calling thread while it runs a stage for the request"""
+        thread_id = threading.get_ident()
+        with self._threads_lock:
+            self._threads[thread_id] = f"[{stage}]"
+        try:
+            yield
+        finally:
+            with self._threads_lock:
+                self._threads.pop(thread_id, None)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, path: str):
+        self._stop.set()
+        self._thread.join()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class CProfileProfiler:
+    """
+    Deterministic profile of the event loop thread and of the stage threads
+    working for the request, merged and saved in pstats format.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self._workers: List[cProfile.Profile] = []
+        self._workers_lock = threading.Lock()
+
+    @contextmanager
+    def worker(self, stage: str):
+        """Profile the calling thread while it runs a stage for the request"""
+        if sys.version_info >= (3, 12):
+            # cProfile is built on sys.monitoring there: the request's profile already covers every thread
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._workers_lock:
+                self._workers.append(profile)
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self, path: str):
+        self.profile.disable()
+        stats = pstats.Stats(self.profile)
+        with self._workers_lock:
+            for profile in self._workers:
+                stats.add(profile)
+        stats.dump_stats(path)
+
+@contextmanager
+def profile_worker(stage: str):
+    """
+    Include the calling thread in the profile of the request it works for,
+    if that request is being profiled. Stages on the process pool run in
+    other processes and are not profiled.
+    """
+    profiler = _active_profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.worker(stage):
+        yield
+
+def start_profiler(mode: str):
+    """
+    Start profiling the calling thread and, through the request's context,
+    the stage threads it hands work to.
+
+    Returns:
+        The running profiler, or None if another request is being profiled
+    """
+    if not _profile_slot.acquire(blocking=False):
+        return None
+    try:
+        if mode == "cprofile":
+            profiler = CProfileProfiler()
+        else:
+            profiler = SamplingProfiler(threading.get_ident(), profiling_settings["sample_interval"])
+        profiler.start()
+        profiler.context_token = _active_profiler.set(profiler)
+        return profiler
+    except Exception:
+        _profile_slot.release()
+        raise
+
+def stop_profiler(profiler, mode: str, method: str, path: str, seconds: float) -> Optional[str]:
+    """
+    Stop a profiler and store its output.
+
+    Returns:
+        The profile id
+    """
+    try:
+        os.makedirs(profiling_settings["profile_dir"], exist_ok=True)
+        profile_id = str(uuid.uuid4())
+        extension = "prof" if mode == "cprofile" else "folded"
+        file_path = os.path.join(profiling_settings["profile_dir"], f"{profile_id}.{extension}")
+        profiler.stop(file_path)
+    finally:
+        _active_profiler.reset(profiler.context_token)
+        _profile_slot.release()
+
+    with _lock:
+        _profiles.append({
+            "id": profile_id,
+            "mode": mode,
+            "method": method,
+            "path": path,
+            "seconds": round(seconds, 4),
+            "createdAt": time.time(),
+            "file": file_path,
+        })
+        while len(_profiles) > profiling_settings["max_profiles"]:
+            old = _profiles.popleft()
+            try:
+                os.remove(old["file"])
+            except OSError:
+                pass
+    return profile_id
+
+def record_request(method: str, path: str, seconds: float, stages: List[dict], status: int, profile_id: Optional[str] = None):
+    """Add a request to the slow-request log if it exceeded the threshold"""
+    if seconds < profiling_settings["slow_threshold"]:
+        return
+    with _lock:
+        _slow_requests.append({
+            "method": method,
+            "path": path,
+            "status": status,
+            "seconds": round(seconds, 4),
+            "stages": stages,
+            "profileId": profile_id,
+            "at": time.time(),
+        })
+
+def list_profiles() -> List[dict]:
+    with _lock:
+        return [{k: v for k, v in p.items() if k != "file"} for p in reversed(_profiles)]
+
+def get_profile(profile_id: str) -> Optional[Dict[str, str]]:
+    with _lock:
+        return next((dict(p) for p in _profiles if p["id"] == profile_id), None)
+
+def get_slow_requests() -> List[dict]:
+    with _lock:
+        return list(reversed(_slow_requests))
@@ -0,0 +1,220 @@
+# rate_limiter.py - Shared Vertex quota limiter with fair queuing across projects
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+limiter_settings = {
+    "enabled": os.environ.get("MISRA_RATE_LIMIT", "1") == "1",
+    "requests_per_minute": float(os.environ.get("MISRA_RPM", "60")),
+    "tokens_per_minute": float(os.environ.get("MISRA_TPM", "1000000")),
+    # SQLite file shared by every worker process on this host
+    "db_path": os.environ.get("MISRA_LIMITER_DB", os.path.join("uploads", "rate_limiter.db")),
+    # Waiters that stop polling for this long (e.g. a killed worker) are dropped
+    "stale_after": 30.0,
+    "poll_interval": 0.1,
+}
+
+class RateLimitTimeout(Exception):
+    """Raised when quota could not be acquired within the allowed wait"""
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, stored in SQLite so all
+    worker processes share them.
+
+    Callers wait in a shared queue ordered by priority (interactive chat turns
+    before bulk fixes) and then by weighted-fair-queuing virtual finish time,
+    so a project with a large batch cannot starve the others. Only the head
+    of the queue may take quota. A project's virtual clock only advances when
+    quota is granted, so waiters that time out or give up are not charged.
+    """
+
+    def __init__(self, db_path: str, requests_per_minute: float, tokens_per_minute: float):
+        self.db_path = db_path
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL);
+                CREATE TABLE IF NOT EXISTS waiters (
+                    ticket INTEGER PRIMARY KEY AUTOINCREMENT,
+                    project TEXT, priority INTEGER, vtime REAL, tokens REAL, heartbeat REAL
+                );
+                CREATE TABLE IF NOT EXISTS clocks (project TEXT PRIMARY KEY, vtime REAL);
+                CREATE TABLE IF NOT EXISTS weights (project TEXT PRIMARY KEY, weight REAL);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _refill(self, conn: sqlite3.Connection, now: float) -> dict:
+        """Refill both buckets for the elapsed time and return their levels"""
+        levels = {}
+        for name, per_minute in (("requests", self.requests_per_minute), ("tokens", self.tokens_per_minute)):
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = per_minute if row is None else min(per_minute, row[0] + (now - row[1]) * per_minute / 60.0)
+            conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (name, tokens, now))
+            levels[name] = tokens
+        return levels
+
+    def set_weight(self, project: str, weight: float):
+        """Set a project's share for fair queuing (default 1.0)"""
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO weights (project, weight) VALUES (?, ?)", (project, weight))
+
+    def _enqueue(self, project: str, priority: int, tokens: float) -> int:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT weight FROM weights WHERE project = ?", (project,)).fetchone()
+            weight = row[0] if row else 1.0
+            last_finish = conn.execute("SELECT vtime FROM clocks WHERE project = ?", (project,)).fetchone()
+            # Waiters of the project still queued have not been charged yet but come first
+            last_queued = conn.execute("SELECT MAX(vtime) FROM waiters WHERE project = ?", (project,)).fetchone()
+            virtual_now = conn.execute("SELECT vtime FROM clocks WHERE project = '__global__'").fetchone()
+
+            start = max(
+                last_finish[0] if last_finish else 0.0,
+                last_queued[0] if last_queued and last_queued[0] is not None else 0.0,
+                virtual_now[0] if virtual_now else 0.0,
+            )
+            finish = start + max(tokens, 1.0) / weight
+
+            cursor = conn.execute(
+                "INSERT INTO waiters (project, priority, vtime, tokens, heartbeat) VALUES (?, ?, ?, ?, ?)",
+                (project, priority, finish, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return cursor.lastrowid
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _try_take(self, ticket: int, tokens: float) -> Optional[float]:
+        """
+        Take quota if this ticket is at the head of the queue.
+
+        Returns:
+            None if quota was taken, otherwise the suggested wait in seconds
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - limiter_settings["stale_after"],))
+            conn.execute("UPDATE waiters SET heartbeat = ? WHERE ticket = ?", (now, ticket))
+            head = conn.execute("SELECT ticket, vtime, project FROM waiters ORDER BY priority, vtime, ticket LIMIT 1").fetchone()
+            levels = self._refill(conn, now)
+
+            if head is None or head[0] != ticket:
+                conn.execute("COMMIT")
+                return limiter_settings["poll_interval"]
+
+            # A single request larger than the whole per-minute budget only needs a full bucket
+            needed_tokens = min(tokens, self.tokens_per_minute)
+            if levels["requests"] < 1 or levels["tokens"] < needed_tokens:
+                conn.execute("COMMIT")
+                request_wait = max(0.0, 1 - levels["requests"]) * 60.0 / self.requests_per_minute
+                token_wait = max(0.0, needed_tokens - levels["tokens"]) * 60.0 / self.tokens_per_minute
+                return max(request_wait, token_wait, limiter_settings["poll_interval"])
+
+            conn.execute("UPDATE buckets SET tokens = tokens - 1 WHERE name = 'requests'")
+            conn.execute("UPDATE buckets SET tokens = tokens - ? WHERE name = 'tokens'", (tokens,))
+            conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+            conn.execute("INSERT OR REPLACE INTO clocks (project, vtime) VALUES ('__global__', ?)", (head[1],))
+            # Charge the project only now that it got the quota
+            conn.execute(
+                "INSERT INTO clocks (project, vtime) VALUES (?, ?) "
+                "ON CONFLICT (project) DO UPDATE SET vtime = MAX(vtime, excluded.vtime)",
+                (head[2], head[1])
+            )
+            conn.execute("COMMIT")
+            return None
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _leave(self, ticket: int):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+
+    def acquire(self, project: Optional[str], priority: int = PRIORITY_BULK, tokens: float = 0.0, max_wait: float = 300.0):
+        """
+        Wait for one request and `tokens` tokens of quota.
+
+        Args:
+            project: Project the call belongs to (None shares a default queue)
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BULK
+            tokens: Estimated tokens the call will consume
+            max_wait: Maximum time to wait in seconds (0 = only try once)
+
+        Raises:
+            RateLimitTimeout: if the quota was not granted in time
+        """
+        deadline = time.monotonic() + max_wait
+        ticket = self._enqueue(project or "default", priority, tokens)
+        try:
+            while True:
+                wait = self._try_take(ticket, tokens)
+                if wait is None:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitTimeout(f"Vertex quota not available within {max_wait:.0f}s")
+                # Wake up well within stale_after so the heartbeat keeps our place in the queue
+                time.sleep(min(wait, remaining, limiter_settings["stale_after"] / 3))
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    def record_usage(self, estimated_tokens: float, actual_tokens: float):
+        """Correct the token bucket once a response reports its real usage"""
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE buckets SET tokens = tokens - ? WHERE name = 'tokens'", (actual_tokens - estimated_tokens,))
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            buckets = {name: tokens for name, tokens in conn.execute("SELECT name, tokens FROM buckets")}
+            waiting = conn.execute(
+                "SELECT project, priority, COUNT(*) FROM waiters GROUP BY project, priority"
+            ).fetchall()
+        return {
+            "requestsPerMinute": self.requests_per_minute,
+            "tokensPerMinute": self.tokens_per_minute,
+            "available": buckets,
+            "waiting": [{"project": p, "priority": pr, "count": c} for p, pr, c in waiting],
+        }
+
+_limiter = None
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Return the process-wide limiter, or None when rate limiting is disabled"""
+    global _limiter
+    if not limiter_settings["enabled"]:
+        return None
+    if _limiter is None:
+        _limiter = RateLimiter(
+            limiter_settings["db_path"],
+            limiter_settings["requests_per_minute"],
+            limiter_settings["tokens_per_minute"],
+        )
+    return _limiter
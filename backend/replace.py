@@ -2,40 +2,75 @@
 import json
 import re
 
-def merge_fixed_snippets_into_file(original_file: str, fixes_dict: dict, output_file: str):
+from source_buffer import mapped_file, build_line_offsets, detect_newline
+from structured_logging import get_logger
+
+logger = get_logger("replace")
+
+NUMBERED_LINE_PREFIX_RE = re.compile(rb"^(\d+[a-zA-Z]*):", re.MULTILINE)
+
+def line_sort_key(k):
+    """Sort key for line numbers (numbers first, then a-z suffixes)"""
+    num_part = int(re.match(r"(\d+)", k).group(1))
+    suffix = re.sub(r"\d+", "", k)
+    return (num_part, suffix)
+
+def load_numbered_lines(numbered_file: str) -> dict:
     """
-    Replaces or inserts fixed lines (with line numbers) into the original numbered file.
-    Writes the result to output_file.
+    Loads a numbered C++ file into a dictionary of line number -> content.
     """
-    # Load the original numbered C++ file into a dictionary
-    with open(original_file, "r", encoding="utf-8") as f:
-        original_lines = {}
+    with open(numbered_file, "r", encoding="utf-8") as f:
+        numbered_lines = {}
         for line in f:
             match = re.match(r"^(\d+[a-zA-Z]*):(.*)$", line.rstrip('\n'))
 
             if match:
                 lineno = match.group(1).strip()
                 content = match.group(2)
-                original_lines[lineno] = content
+                numbered_lines[lineno] = content
             else:
-                print(f"⚠️ Skipped invalid line: {line.strip()}")
+                logger.warning("Skipped invalid line: %s", line.strip())
+
+    return numbered_lines
+
+def merge_fixed_snippets_into_file(original_file: str, fixes_dict: dict, output_file: str):
+    """
+    Replaces or inserts fixed lines (with line numbers) into the original numbered file.
+    Writes the result to output_file.
+
+    Works on the memory-mapped bytes of the numbered file: unchanged lines are
+    copied byte for byte (including their line endings) and only fixed or
+    inserted lines are encoded, using the file's own newline sequence.
+    """
+    with mapped_file(original_file) as buf:
+        newline = detect_newline(buf).encode()
+        ends_with_newline = buf[-1:] in (b"", b"\n")
 
-    # Merge fixed lines
-    merged_lines = original_lines.copy()
-    for lineno, fixed_code in fixes_dict.items():
-        merged_lines[lineno] = fixed_code
+        # Byte span of every numbered line, found in a single pass
+        spans = {}
+        for match in NUMBERED_LINE_PREFIX_RE.finditer(buf):
+            end = buf.find(b"\n", match.start())
+            spans[match.group(1).decode()] = (match.start(), len(buf) if end == -1 else end + 1)
 
-    # Sort by line number (numbers first, then a-z suffixes)
-    def line_sort_key(k):
-        num_part = int(re.match(r"(\d+)", k).group(1))
-        suffix = re.sub(r"\d+", "", k)
-        return (num_part, suffix)
+        skipped = len(build_line_offsets(buf)) - 1 - len(spans)
+        if skipped:
+            logger.warning("Skipped %d invalid lines in %s", skipped, original_file)
 
-    sorted_keys = sorted(merged_lines.keys(), key=line_sort_key)
+        # Sort by line number (numbers first, then a-z suffixes)
+        sorted_keys = sorted(set(spans) | set(fixes_dict), key=line_sort_key)
 
-    # Write to output
-    with open(output_file, "w", encoding="utf-8") as f:
-        for lineno in sorted_keys:
-            f.write(f"{lineno}:{merged_lines[lineno]}\n")
+        # Write to output
+        with open(output_file, "wb") as f:
+            for i, lineno in enumerate(sorted_keys):
+                last = i == len(sorted_keys) - 1
+                if lineno in fixes_dict:
+                    f.write(f"{lineno}:{fixes_dict[lineno]}".encode("utf-8"))
+                    if not last or ends_with_newline:
+                        f.write(newline)
+                else:
+                    start, end = spans[lineno]
+                    f.write(buf[start:end])
+                    if not last and buf[end - 1:end] != b"\n":
+                        f.write(newline)
 
-    print(f"✅ Merged output written to: {output_file}")
\ No newline at end of file
+    logger.info("Merged output written to: %s", output_file)
\ No newline at end of file
@@ -0,0 +1,76 @@
+# report_delta.py - Compare a re-analysis report with the previous one for the same file
+
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from misra_rules import normalize_rule
+
+# Unmatched entries may still be the same violation if the line moved by up to this much
+LINE_WINDOW = 3
+
+def _line_number(line) -> Optional[int]:
+    try:
+        return int(line)
+    except (TypeError, ValueError):
+        return None
+
+def _message(v: dict) -> str:
+    return " ".join(str(v.get('warning') or '').split())
+
+def classify_violations(
+    previous: List[dict],
+    current: List[dict],
+    remap: Optional[Callable[[int], Optional[int]]] = None
+) -> Dict[str, List[dict]]:
+    """
+    Classify the violations of a new report against the previous report.
+
+    Entries are matched by rule, message and line, with the previous lines
+    remapped to the new file through the fixes applied in between. Entries
+    that do not match exactly are paired with the nearest unmatched entry of
+    the same rule and message within LINE_WINDOW lines.
+
+    Args:
+        previous: Violations of the previous report
+        current: Violations of the new report
+        remap: Maps a line of the previous report's file to the new file
+            (e.g. ProjectLineIndex.remap); None when nothing was applied
+
+    Returns:
+        Dictionary with 'new', 'persisting' and 'resolved' lists; resolved
+        entries are from the previous report, the others from the new one
+    """
+    # (rule, message) -> remapped line -> unmatched previous violations
+    unmatched = defaultdict(lambda: defaultdict(list))
+    for v in previous:
+        line = _line_number(v.get('line'))
+        if remap and line is not None:
+            line = remap(line)
+        unmatched[(normalize_rule(v.get('misra')), _message(v))][line].append(v)
+
+    matched = [False] * len(current)
+    for index, v in enumerate(current):
+        by_line = unmatched[(normalize_rule(v.get('misra')), _message(v))]
+        line = _line_number(v.get('line'))
+        if by_line.get(line):
+            by_line[line].pop()
+            matched[index] = True
+
+    for index, v in enumerate(current):
+        line = _line_number(v.get('line'))
+        if matched[index] or line is None:
+            continue
+        by_line = unmatched[(normalize_rule(v.get('misra')), _message(v))]
+        candidates = [
+            (abs(other - line), other) for other, entries in by_line.items()
+            if entries and other is not None and abs(other - line) <= LINE_WINDOW
+        ]
+        if candidates:
+            by_line[min(candidates)[1]].pop()
+            matched[index] = True
+
+    return {
+        'new': [v for v, m in zip(current, matched) if not m],
+        'persisting': [v for v, m in zip(current, matched) if m],
+        'resolved': [v for by_line in unmatched.values() for entries in by_line.values() for v in entries],
+    }
@@ -0,0 +1,303 @@
+# snippet_validation.py - Local sanity checks for LLM-produced fixed snippets
+
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from replace import load_numbered_lines, line_sort_key
+from structured_logging import get_logger
+
+logger = get_logger("snippet_validation")
+
+CODE_BLOCK_RE = re.compile(r"```(?:cpp|c\+\+)?\s*\n(.*?)```", re.DOTALL)
+NUMBERED_LINE_RE = re.compile(r"^(\d+[a-zA-Z]*):(.*)$")
+VALID_KEY_RE = re.compile(r"^\d+[a-z]*$")
+PREFIX_IN_CODE_RE = re.compile(r"^\s*\d+[a-zA-Z]*:")
+PP_OPEN_RE = re.compile(r"^\s*#\s*if(?:n?def)?\b")
+PP_CLOSE_RE = re.compile(r"^\s*#\s*endif\b")
+COMPILER_DIAG_RE = re.compile(r"^(.*?):(\d+):(?:\d+:)?\s*(?:fatal )?error:\s*(.*)$")
+
+def base_line(key: str) -> int:
+    """Return the original line number a line key refers to ('100a' -> 100)"""
+    return int(re.match(r"\d+", key).group())
+
+def snippet_regions(snippets: dict) -> List[Tuple[int, int]]:
+    """
+    Group snippet keys into contiguous regions of original lines.
+
+    Args:
+        snippets: Dictionary of line key -> fixed code
+
+    Returns:
+        List of (first_line, last_line) tuples in file order
+    """
+    regions = []
+    for line in sorted({base_line(k) for k in snippets}):
+        if regions and line <= regions[-1][1] + 1:
+            regions[-1][1] = line
+        else:
+            regions.append([line, line])
+    return [tuple(r) for r in regions]
+
+def _issue(kind: str, line: Optional[int], message: str) -> dict:
+    return {"kind": kind, "line": line, "message": message}
+
+def check_line_keys(response_text: str, snippets: dict, numbered_file: str) -> List[dict]:
+    """
+    Check the line-number prefixes of a response against the numbered file.
+
+    Detects duplicate keys with conflicting code, code lines that lost their
+    `N:` prefix, keys that do not exist in the file and doubled prefixes.
+
+    Args:
+        response_text: Raw LLM response
+        snippets: Snippets extracted from the response
+        numbered_file: Path to the numbered file the fixes refer to
+
+    Returns:
+        List of issue dictionaries
+    """
+    original_lines = load_numbered_lines(numbered_file)
+    max_line = max((base_line(k) for k in original_lines), default=0)
+    issues = []
+
+    seen = {}
+    for block in CODE_BLOCK_RE.findall(response_text):
+        previous_line = None
+        for line in block.strip().splitlines():
+            match = NUMBERED_LINE_RE.match(line)
+            if not match:
+                if line.strip():
+                    issues.append(_issue(
+                        "missing_prefix", previous_line,
+                        f"Code line without line-number prefix: {line.strip()[:80]}"
+                    ))
+                continue
+
+            key = match.group(1).strip()
+            code = match.group(2).rstrip()
+            previous_line = base_line(key)
+
+            if key in seen and seen[key] != code:
+                issues.append(_issue("duplicate_key", previous_line, f"Line {key} appears more than once with different code"))
+            seen[key] = code
+
+    for key, code in snippets.items():
+        line = base_line(key)
+        if not VALID_KEY_RE.match(key):
+            issues.append(_issue("bad_key", line, f"Invalid line key '{key}'"))
+        if line < 1 or line > max_line:
+            issues.append(_issue("unknown_line", line, f"Line {key} does not exist in the file"))
+        if PREFIX_IN_CODE_RE.match(code):
+            issues.append(_issue("double_prefix", line, f"Line {key} contains a second line-number prefix"))
+
+    return issues
+
+def _strip_literals(code: str, in_comment: bool) -> Tuple[str, bool]:
+    """Remove comments and string/char literals from a line, tracking block comments"""
+    out = []
+    i = 0
+    while i < len(code):
+        if in_comment:
+            end = code.find("*/", i)
+            if end == -1:
+                return "".join(out), True
+            in_comment = False
+            i = end + 2
+            continue
+        ch = code[i]
+        if code.startswith("//", i):
+            break
+        if code.startswith("/*", i):
+            in_comment = True
+            i += 2
+            continue
+        if ch in "\"'":
+            i += 1
+            while i < len(code) and code[i] != ch:
+                i += 2 if code[i] == "\\" else 1
+            i += 1
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out), in_comment
+
+def _balance(lines: List[str]) -> Tuple[int, int]:
+    """Return (brace depth change, preprocessor conditional depth change) of a list of lines"""
+    braces = 0
+    conditionals = 0
+    in_comment = False
+    for line in lines:
+        code, in_comment = _strip_literals(line, in_comment)
+        braces += code.count("{") - code.count("}")
+        if PP_OPEN_RE.match(code):
+            conditionals += 1
+        elif PP_CLOSE_RE.match(code):
+            conditionals -= 1
+    return braces, conditionals
+
+def check_balance(snippets: dict, numbered_file: str) -> List[dict]:
+    """
+    Compare brace and preprocessor balance of each fixed region with the original.
+
+    Args:
+        snippets: Snippets extracted from the response
+        numbered_file: Path to the numbered file the fixes refer to
+
+    Returns:
+        List of issue dictionaries
+    """
+    original_lines = load_numbered_lines(numbered_file)
+    merged_lines = dict(original_lines)
+    merged_lines.update(snippets)
+    issues = []
+
+    for first, last in snippet_regions(snippets):
+        in_region = lambda k: first <= base_line(k) <= last
+        before = [original_lines[k] for k in sorted(filter(in_region, original_lines), key=line_sort_key)]
+        after = [merged_lines[k] for k in sorted(filter(in_region, merged_lines), key=line_sort_key)]
+
+        before_braces, before_pp = _balance(before)
+        after_braces, after_pp = _balance(after)
+        if before_braces != after_braces:
+            issues.append(_issue("brace_balance", first, f"Lines {first}-{last} change the brace balance by {after_braces - before_braces:+d}"))
+        if before_pp != after_pp:
+            issues.append(_issue("preprocessor_balance", first, f"Lines {first}-{last} change the #if/#endif balance by {after_pp - before_pp:+d}"))
+
+    return issues
+
+def _compile_errors(command: List[str], lines: List[str]) -> List[Tuple[int, str]]:
+    """Run a syntax-only compile on the given lines and return (line, message) errors"""
+    fd, path = tempfile.mkstemp(suffix=".cpp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        result = subprocess.run(command + [path], capture_output=True, text=True, timeout=60)
+    finally:
+        os.remove(path)
+
+    errors = []
+    for diag in result.stderr.splitlines():
+        match = COMPILER_DIAG_RE.match(diag)
+        if match and match.group(1) == path:
+            errors.append((int(match.group(2)), match.group(3).strip()))
+    return errors
+
+def check_syntax(snippets: dict, numbered_file: str, syntax_check_cmd: str) -> List[dict]:
+    """
+    Run an optional local compiler syntax check (e.g. `g++ -fsyntax-only -x c++`).
+
+    Only errors that the original file does not already produce are reported,
+    so missing include paths do not count against the fix.
+
+    Args:
+        snippets: Snippets extracted from the response
+        numbered_file: Path to the numbered file the fixes refer to
+        syntax_check_cmd: Compiler command line; the source path is appended
+
+    Returns:
+        List of issue dictionaries
+    """
+    original_lines = load_numbered_lines(numbered_file)
+    merged_lines = dict(original_lines)
+    merged_lines.update(snippets)
+    command = shlex.split(syntax_check_cmd)
+
+    def denumbered(lines: dict) -> Tuple[List[str], List[str]]:
+        keys = sorted(lines, key=line_sort_key)
+        return keys, [re.sub(r"^ ", "", lines[k]) for k in keys]
+
+    _, original_text = denumbered(original_lines)
+    merged_keys, merged_text = denumbered(merged_lines)
+
+    try:
+        known_errors = Counter(msg for _, msg in _compile_errors(command, original_text))
+        new_errors = _compile_errors(command, merged_text)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("Syntax check skipped: %s", e)
+        return []
+
+    issues = []
+    for line, message in new_errors:
+        if known_errors[message] > 0:
+            known_errors[message] -= 1
+            continue
+        key = merged_keys[line - 1] if 0 < line <= len(merged_keys) else None
+        issues.append(_issue("syntax", base_line(key) if key else None, f"Compiler error at line {key}: {message}"))
+
+    return issues
+
+def build_validation_tasks(response_text: str, snippets: dict, numbered_file: str, syntax_check_cmd: Optional[str] = None) -> list:
+    """
+    Build the independent validation checks as (function, args) pairs.
+
+    The functions are module-level so they can be submitted to a process pool.
+    """
+    tasks = [
+        (check_line_keys, (response_text, snippets, numbered_file)),
+        (check_balance, (snippets, numbered_file)),
+    ]
+    if syntax_check_cmd:
+        tasks.append((check_syntax, (snippets, numbered_file, syntax_check_cmd)))
+    return tasks
+
+def failing_regions(issues: List[dict], snippets: dict) -> List[Tuple[int, int]]:
+    """
+    Return the snippet regions touched by at least one issue.
+
+    Issues that cannot be placed in a region (e.g. an unknown line) get a
+    single-line region of their own.
+    """
+    regions = snippet_regions(snippets)
+    failing = set()
+    for issue in issues:
+        line = issue["line"]
+        if line is None:
+            continue
+        region = next((r for r in regions if r[0] <= line <= r[1]), (line, line))
+        failing.add(region)
+    return sorted(failing)
+
+def build_reask_prompt(issues: List[dict], regions: List[Tuple[int, int]]) -> str:
+    """
+    Build a targeted follow-up prompt asking only for the failing regions to be re-done.
+
+    Args:
+        issues: Issues found by the validation checks
+        regions: Failing (first_line, last_line) regions
+
+    Returns:
+        Prompt text
+    """
+    problems = "\n".join(f"* {issue['message']}" for issue in issues)
+    ranges = ", ".join(f"{first}-{last}" if first != last else f"{first}" for first, last in regions)
+    return (
+        "Some of the fixed snippets in your previous answer failed local validation:\n"
+        f"{problems}\n\n"
+        f"Please re-provide the complete fixed code ONLY for original lines {ranges}. "
+        "Keep the original line number prefix on every line, use `100a:` style numbering for inserted lines, "
+        "keep braces and #if/#endif directives balanced, and give all lines in a single cpp``` Snippet ``` block."
+    )
+
+def replace_regions(snippets: dict, corrected: dict, regions: List[Tuple[int, int]]) -> dict:
+    """
+    Replace the snippet lines of the failing regions with corrected ones.
+    Corrected lines outside the regions are ignored, so a re-ask answer
+    cannot change code that already passed validation.
+
+    Args:
+        snippets: Original snippets
+        corrected: Snippets extracted from the re-ask response
+        regions: Regions that were re-requested
+
+    Returns:
+        New snippets dictionary
+    """
+    in_regions = lambda k: any(first <= base_line(k) <= last for first, last in regions)
+    merged = {k: v for k, v in snippets.items() if not in_regions(k)}
+    merged.update({k: v for k, v in corrected.items() if in_regions(k)})
+    return merged
@@ -0,0 +1,130 @@
+# source_buffer.py - Memory-mapped source buffers with encoding and line-ending detection
+
+import codecs
+import mmap
+from array import array
+from contextlib import contextmanager
+from typing import Iterator, Tuple, Union
+
+Buffer = Union[bytes, mmap.mmap]
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+BOM_BY_ENCODING = {encoding: mark for mark, encoding in BOMS}
+
+class SourceEncodingError(ValueError):
+    """Raised when fixed code contains characters the source encoding cannot represent"""
+
+@contextmanager
+def mapped_file(file_path: str) -> Iterator[Buffer]:
+    """Memory-map a file read-only (empty files yield b'', which cannot be mapped)"""
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b''
+            return
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+def build_line_offsets(buf: Buffer, start: int = 0) -> array:
+    """
+    Build the offset of the start of every line in a buffer.
+
+    Returns:
+        Array with one entry per line plus a final entry holding the buffer
+        size, so line i (0-based) spans offsets[i]:offsets[i + 1]
+    """
+    offsets = array('Q', [start])
+    size = len(buf)
+    if size <= start:
+        return offsets
+
+    pos = buf.find(b'\n', start)
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = buf.find(b'\n', pos + 1)
+
+    # Last line without a trailing newline
+    if offsets[-1] != size:
+        offsets.append(size)
+
+    return offsets
+
+def detect_newline(buf: Buffer) -> str:
+    """Return the line ending of the first line ('\\r\\n', '\\n' or '\\r')"""
+    pos = buf.find(b'\n')
+    if pos == -1:
+        return '\r' if buf.find(b'\r') != -1 else '\n'
+    return '\r\n' if pos > 0 and buf[pos - 1:pos] == b'\r' else '\n'
+
+def detect_encoding(buf: Buffer) -> Tuple[str, bool]:
+    """
+    Detect the encoding of a source buffer.
+
+    Returns:
+        Tuple of (encoding, has_bom). Files without a BOM are UTF-8 if they
+        decode as UTF-8, otherwise cp1252 (or latin-1 as a lossless fallback)
+    """
+    for mark, encoding in BOMS:
+        if buf[:len(mark)] == mark:
+            return encoding, True
+
+    for encoding in ('utf-8', 'cp1252'):
+        try:
+            codecs.decode(buf, encoding)
+            return encoding, False
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1', False
+
+def load_as_utf8(buf: Buffer) -> Tuple[Buffer, dict]:
+    """
+    Return the buffer as UTF-8 without BOM, plus its detected source format.
+
+    Plain UTF-8 buffers are returned as-is (no copy); other encodings are
+    decoded and re-encoded once.
+
+    Returns:
+        Tuple of (UTF-8 buffer, {'encoding', 'bom', 'newline'})
+    """
+    encoding, bom = detect_encoding(buf)
+    if encoding != 'utf-8' or bom:
+        skip = len(BOM_BY_ENCODING[encoding]) if bom else 0
+        buf = codecs.decode(buf[skip:], encoding).encode('utf-8')
+
+    return buf, {'encoding': encoding, 'bom': bom, 'newline': detect_newline(buf)}
+
+def encode_from_utf8(data: bytes, source_format: dict = None) -> bytes:
+    """
+    Convert UTF-8 bytes back to the source encoding, restoring any BOM.
+
+    Raises:
+        SourceEncodingError: If a line contains characters the source
+            encoding cannot represent (e.g. a fix added a non-cp1252 character)
+    """
+    if not source_format or (source_format['encoding'] == 'utf-8' and not source_format['bom']):
+        return data
+
+    encoding = source_format['encoding']
+    text = data.decode('utf-8')
+    try:
+        encoded = text.encode(encoding)
+    except UnicodeEncodeError as e:
+        line = text.count('\n', 0, e.start) + 1
+        raise SourceEncodingError(
+            f"Line {line} contains {text[e.start:e.end]!r}, which cannot be written back as {encoding}"
+        ) from None
+    if source_format['bom']:
+        encoded = BOM_BY_ENCODING[encoding] + encoded
+    return encoded
+
+def decode_source(buf: Buffer) -> str:
+    """Decode a source buffer to text with the detected encoding"""
+    utf8, _ = load_as_utf8(buf)
+    return codecs.decode(utf8, 'utf-8')
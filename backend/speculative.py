@@ -0,0 +1,151 @@
+# speculative.py - Run predictable pipeline steps ahead of the step endpoints
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+from structured_logging import get_logger, bind_project
+
+logger = get_logger("speculative")
+
+speculation_settings = {
+    "enabled": os.environ.get("MISRA_SPECULATION", "1") == "1",
+    "workers": int(os.environ.get("MISRA_SPECULATION_WORKERS", "2")),
+    # The speculative intro is a billed LLM call; it can be turned off on its own
+    "intro": os.environ.get("MISRA_SPECULATE_INTRO", "1") == "1",
+}
+
+class SpeculationCancelled(Exception):
+    """Raised inside a speculative step whose inputs changed"""
+
+class SpeculativePipeline:
+    """
+    Runs pipeline steps in the background as soon as their inputs exist.
+
+    Each (project, stage) holds at most one task, tagged with a key built from
+    its inputs. A step endpoint takes the task only if the key still matches
+    what it would compute itself, so a stale result is never used. Starting a
+    stage with a new key, or invalidating it, cancels the old task: queued
+    tasks never run, and running ones see their cancel event set and have
+    their result discarded.
+
+    Tasks run on a FIFO pool, so a task may wait on the result of a task
+    submitted before it (e.g. the intro on the numbering) without deadlock.
+    """
+
+    def __init__(self, workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        # (project id, stage) -> (inputs key, future, cancel event)
+        self._tasks: Dict[tuple, tuple] = {}
+        self._stats = {"started": 0, "hits": 0, "joined": 0, "misses": 0, "cancelled": 0, "failed": 0}
+
+    def _run(self, project_id: str, stage: str, cancelled: threading.Event, fn: Callable, args: tuple):
+        bind_project(project_id)
+        if cancelled.is_set():
+            raise SpeculationCancelled()
+        try:
+            return fn(cancelled, *args)
+        except SpeculationCancelled:
+            raise
+        except Exception as e:
+            logger.warning("Speculative %s failed: %s", stage, e)
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+
+    def _cancel(self, entry: tuple):
+        _, future, cancelled = entry
+        if not future.done():
+            self._stats["cancelled"] += 1
+        cancelled.set()
+        future.cancel()
+
+    def start(self, project_id: str, stage: str, key: Hashable, fn: Callable, *args) -> Optional[Future]:
+        """
+        Start a stage unless a task with the same key already exists.
+
+        Args:
+            project_id: Project the step belongs to
+            stage: Stage name (e.g. 'numbering')
+            key: Fingerprint of the step's inputs
+            fn: Called as fn(cancel_event, *args) on a pool thread
+
+        Returns:
+            The task's future, or None when speculation is disabled
+        """
+        if not speculation_settings["enabled"]:
+            return None
+
+        with self._lock:
+            entry = self._tasks.get((project_id, stage))
+            if entry and entry[0] == key and not entry[1].cancelled():
+                return entry[1]
+            if entry:
+                self._cancel(entry)
+
+            cancelled = threading.Event()
+            future = self._executor.submit(self._run, project_id, stage, cancelled, fn, args)
+            self._tasks[(project_id, stage)] = (key, future, cancelled)
+            self._stats["started"] += 1
+
+        logger.debug("Speculating %s", stage)
+        return future
+
+    def peek(self, project_id: str, stage: str, key: Hashable) -> Optional[Future]:
+        """Return the future of a matching task without taking it (for chaining stages)"""
+        with self._lock:
+            entry = self._tasks.get((project_id, stage))
+            return entry[1] if entry and entry[0] == key else None
+
+    def take(self, project_id: str, stage: str, key: Hashable) -> Optional[Future]:
+        """
+        Hand a matching task over to the step endpoint; it is removed, so
+        its result is used at most once.
+
+        Returns:
+            The task's future (done or in flight), or None if there is no
+            task for these inputs
+        """
+        with self._lock:
+            entry = self._tasks.get((project_id, stage))
+            if not entry or entry[0] != key or entry[1].cancelled():
+                self._stats["misses"] += 1
+                return None
+            del self._tasks[(project_id, stage)]
+            self._stats["hits" if entry[1].done() else "joined"] += 1
+            return entry[1]
+
+    def invalidate(self, project_id: Optional[str] = None, stages: Optional[Iterable[str]] = None):
+        """Cancel the tasks of a project (all projects if None), optionally only some stages"""
+        stages = set(stages) if stages is not None else None
+        with self._lock:
+            for task_key in list(self._tasks):
+                if (project_id is None or task_key[0] == project_id) and (stages is None or task_key[1] in stages):
+                    self._cancel(self._tasks.pop(task_key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["inFlight"] = sum(1 for _, future, _ in self._tasks.values() if not future.done())
+            stats["ready"] = sum(1 for _, future, _ in self._tasks.values() if future.done())
+        return {**stats, "enabled": speculation_settings["enabled"]}
+
+async def await_result(future: Optional[Future]) -> Optional[Any]:
+    """
+    Wait for a taken task from any event loop.
+
+    Returns:
+        The task's result, or None if there was no task or it failed (the
+        caller then runs the step itself)
+    """
+    if future is None:
+        return None
+    # A taken task is no longer reachable by invalidate(), so it runs to completion
+    try:
+        return await asyncio.wrap_future(future)
+    except Exception:
+        # Failures were logged by the pool thread
+        return None
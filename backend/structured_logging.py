@@ -0,0 +1,220 @@
+# structured_logging.py - Non-blocking structured logging with correlation IDs, truncation and sampling
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from typing import Optional
+
+log_settings = {
+    "level": os.environ.get("MISRA_LOG_LEVEL", "INFO").upper(),
+    # 'json' for one JSON object per line, 'text' for human-readable lines
+    "format": os.environ.get("MISRA_LOG_FORMAT", "json"),
+    # Longer messages and arguments (e.g. whole Gemini responses) are cut to this size
+    "max_chars": int(os.environ.get("MISRA_LOG_MAX_CHARS", "2000")),
+    # Identical warnings beyond `sample_burst` per `sample_window` seconds are counted, not written
+    "sample_burst": 5,
+    "sample_window": 60.0,
+}
+
+correlation_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("correlation_id", default=None)
+project_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("project_id", default=None)
+
+def new_correlation_id(value: Optional[str] = None) -> str:
+    """Set the correlation ID of the current request or job (a new one unless given)"""
+    correlation_id = (value or "")[:64] or uuid.uuid4().hex[:16]
+    correlation_id_var.set(correlation_id)
+    return correlation_id
+
+def bind_project(project_id: Optional[str]):
+    """Tag every log record of the current request or job with the project ID"""
+    project_id_var.set(project_id)
+
+def truncate(value, limit: Optional[int] = None):
+    """Shorten long strings, noting how much was cut"""
+    limit = limit or log_settings["max_chars"]
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... [{len(value) - limit} more chars]"
+    return value
+
+class ContextFilter(logging.Filter):
+    """Attach the correlation and project IDs of the calling context"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id_var.get()
+        record.project_id = project_id_var.get()
+        return True
+
+class TruncateFilter(logging.Filter):
+    """Cap payload size before the record is formatted"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.args, tuple) and record.args:
+            record.args = tuple(truncate(arg) for arg in record.args)
+        elif not record.args:
+            # A template is only cut without arguments, or its placeholders could be lost
+            record.msg = truncate(record.msg)
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Let the first `burst` records with the same logger and message template
+    through per window and count the rest; the next record written for that
+    template reports how many were suppressed. Errors are never sampled.
+    """
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._lock = threading.Lock()
+        # (logger, template) -> [window start, seen in window, suppressed]
+        self._counts = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None or now - entry[0] > self.window:
+                suppressed = entry[2] if entry else 0
+                self._counts[key] = [now, 1, 0]
+            elif entry[1] < self.burst:
+                entry[1] += 1
+                suppressed = 0
+            else:
+                entry[2] += 1
+                return False
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that keeps the traceback separate from the message"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, as_json: bool):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for attr, field in (("project_id", "project"), ("correlation_id", "correlation"), ("suppressed", "suppressed")):
+            value = getattr(record, attr, None)
+            if value:
+                entry[field] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        if self.as_json:
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        context = " ".join(f"{field}={entry[field]}" for field in ("project", "correlation", "suppressed") if field in entry)
+        line = f"{entry['time']} {entry['level']:<7} {entry['logger']}: {entry['message']}"
+        line = f"{line} [{context}]" if context else line
+        return f"{line}\n{entry['exception']}" if "exception" in entry else line
+
+_listener = None
+_configured = False
+_configure_lock = threading.Lock()
+
+def _add_filters(handler: logging.Handler):
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(log_settings["sample_burst"], log_settings["sample_window"]))
+    handler.addFilter(TruncateFilter())
+
+def _install(handler: logging.Handler):
+    root = logging.getLogger("misra")
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.setLevel(log_settings["level"])
+    root.addHandler(handler)
+    root.propagate = False
+
+def configure_logging():
+    """
+    Route the 'misra' loggers through a queue so callers never block on
+    stream writes; a single listener thread formats and writes the records.
+    Safe to call more than once.
+    """
+    global _listener, _configured
+    with _configure_lock:
+        if _configured:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(StructuredFormatter(log_settings["format"] == "json"))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = StructuredQueueHandler(log_queue)
+        _add_filters(queue_handler)
+        _install(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        _listener.start()
+        atexit.register(_stop_listener)
+        _configured = True
+
+def _stop_listener():
+    """Write out the queued records and stop the listener thread"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+def configure_worker_logging():
+    """
+    Initializer for process-pool workers. A forked worker inherits the
+    parent's queue handler but not its listener thread, so records would
+    pile up unread; workers instead write straight to stderr, which is
+    fine off the event loop.
+    """
+    global _listener, _configured
+    with _configure_lock:
+        _listener = None
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(StructuredFormatter(log_settings["format"] == "json"))
+        _add_filters(stream_handler)
+        _install(stream_handler)
+        _configured = True
+
+def log_context() -> tuple:
+    """Correlation and project IDs of the current context, to hand to another process"""
+    return correlation_id_var.get(), project_id_var.get()
+
+def bind_log_context(context: tuple):
+    """Adopt the IDs captured by log_context() in a process-pool worker"""
+    correlation_id, project_id = context
+    correlation_id_var.set(correlation_id)
+    project_id_var.set(project_id)
+
+def get_logger(name: str) -> logging.Logger:
+    """Return the logger for a backend module (e.g. get_logger('replace'))"""
+    configure_logging()
+    return logging.getLogger(f"misra.{name}")
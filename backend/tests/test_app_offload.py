@@ -0,0 +1,68 @@
+# test_app_offload.py - File reads, temp-fixed files and history compaction run on the stage pools
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+app = pytest.importorskip("app")
+
+from fastapi.testclient import TestClient
+
+from executors import get_executor
+
+class FakeResponse:
+    text = "Done.\n```cpp\n2:    return 1;\n```"
+
+class FakeChat:
+    def __init__(self):
+        self.history = []
+
+def stage_count(stage):
+    return get_executor().stats()["stages"].get(stage, {}).get("count", 0)
+
+@pytest.fixture
+def project(monkeypatch, tmp_path):
+    numbered = tmp_path / "p_numbered_main.txt"
+    numbered.write_text("1: int main() {\n2:     return 0;\n3: }\n")
+    monkeypatch.setattr(app, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(app.sessions, "p", {
+        "numbered_file": str(numbered),
+        "original_filename": "main.cpp",
+        "fixed_snippets": {"2": "    return 1;"},
+    })
+    return "p"
+
+@pytest.fixture
+def client():
+    return TestClient(app.app)
+
+def test_numbered_file_is_read_on_stage_pool(client, project):
+    before = stage_count("read-file")
+
+    response = client.get(f"/api/files/numbered/{project}")
+
+    assert response.status_code == 200
+    assert "2:     return 0;" in response.json()
+    assert stage_count("read-file") == before + 1
+
+def test_temp_fixed_file_is_built_and_read_on_stage_pools(client, project):
+    built, read = stage_count("temp-fixed-files"), stage_count("read-file")
+
+    response = client.get(f"/api/files/temp-fixed/{project}")
+
+    assert response.status_code == 200
+    assert "2:    return 1;" in response.json()
+    assert stage_count("temp-fixed-files") == built + 1
+    assert stage_count("read-file") == read + 1
+
+def test_chat_compacts_history_on_stage_pool(client, project, monkeypatch):
+    monkeypatch.setitem(app.chat_sessions, project, FakeChat())
+    monkeypatch.setattr(app, "send_message_resilient", lambda chat, message, **kwargs: FakeResponse())
+    compactions = stage_count("compaction")
+
+    response = client.post("/api/chat", json={"message": "Use 1 instead", "projectId": project})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == FakeResponse.text
+    assert stage_count("compaction") == compactions + 1
+    assert app.sessions[project]["fixed_snippets"] == {"2": "    return 1;"}
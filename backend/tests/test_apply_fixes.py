@@ -0,0 +1,59 @@
+# test_apply_fixes.py - Applied fixes reach fix memory once, and only when the apply completes
+
+import asyncio
+from contextlib import closing
+
+import pytest
+
+pytest.importorskip("fastapi")
+app = pytest.importorskip("app")
+
+import fix_memory
+from fix_memory import FixMemory
+from job_queue import JobCancelled
+
+@pytest.fixture
+def memory(monkeypatch, tmp_path):
+    memory = FixMemory(str(tmp_path / "fix_memory.db"))
+    monkeypatch.setitem(fix_memory.fix_memory_settings, "enabled", True)
+    monkeypatch.setattr(fix_memory, "_memory", memory)
+    return memory
+
+@pytest.fixture
+def project(monkeypatch, tmp_path):
+    numbered = tmp_path / "p_numbered_main.cpp"
+    numbered.write_text("1:    count = count + 1;\n2:    return count;\n")
+    monkeypatch.setattr(app, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(app.sessions, "p", {
+        "numbered_file": str(numbered),
+        "original_filename": "main.cpp",
+        "fixed_snippets": {"1": "    count = count + 1U;"},
+        "llm_violations": [{"line": 1, "misra": "5-0-4", "warning": "Implicit conversion"}],
+    })
+    monkeypatch.setattr(app, "line_indexes", {})
+    return "p"
+
+def accepted(memory):
+    with closing(memory._connect()) as conn:
+        return conn.execute("SELECT SUM(accepted) FROM fixes").fetchone()[0] or 0
+
+def cancel_at(stage):
+    def progress(current, fraction=None):
+        if current == stage:
+            raise JobCancelled()
+    return progress
+
+def test_cancelled_apply_records_nothing(memory, project):
+    with pytest.raises(JobCancelled):
+        asyncio.run(app.run_apply_fixes(project, cancel_at("denumbering")))
+
+    assert accepted(memory) == 0
+    assert "fixed_file" not in app.sessions[project]
+
+def test_applying_twice_records_fixes_once(memory, project):
+    asyncio.run(app.run_apply_fixes(project))
+    asyncio.run(app.run_apply_fixes(project))
+
+    assert accepted(memory) == 1
+    with open(app.sessions[project]["fixed_file"]) as f:
+        assert "count = count + 1U;" in f.read()
@@ -0,0 +1,84 @@
+# test_export_utils.py - Patches and zips of fixed files
+
+import codecs
+import io
+import shutil
+import subprocess
+import zipfile
+
+import pytest
+
+from export_utils import stream_patch, stream_zip, unified_patch
+
+ORIGINAL = "int main() {\n    // Grüße\n    int x = 1;\n    return x;\n}\n"
+FIXED = "int main() {\n    // Grüße\n    const int x = 1;\n    return x;\n}\n"
+
+# (encoding, BOM, newline)
+FORMATS = {
+    "utf8": ("utf-8", b"", "\n"),
+    "crlf": ("utf-8", b"", "\r\n"),
+    "cp1252": ("cp1252", b"", "\n"),
+    "utf8-bom": ("utf-8", codecs.BOM_UTF8, "\n"),
+    "utf16-bom": ("utf-16-le", codecs.BOM_UTF16_LE, "\r\n"),
+}
+
+def encode(text, fmt):
+    encoding, bom, newline = FORMATS[fmt]
+    return bom + text.replace("\n", newline).encode(encoding)
+
+def write_pair(tmp_path, fmt, fixed_as_utf8=False):
+    original, fixed = tmp_path / "main.cpp", tmp_path / "fixed_main.cpp"
+    original.write_bytes(encode(ORIGINAL, fmt))
+    # Temporary fixed files are UTF-8 without BOM, but keep the original line endings
+    fixed.write_bytes(FIXED.replace("\n", FORMATS[fmt][2]).encode("utf-8") if fixed_as_utf8 else encode(FIXED, fmt))
+    return str(original), str(fixed)
+
+def test_patch_of_identical_files_is_empty(tmp_path):
+    original = tmp_path / "main.cpp"
+    original.write_text(ORIGINAL)
+    assert list(unified_patch(str(original), str(original), "main.cpp")) == []
+
+def test_patch_marks_missing_final_newline(tmp_path):
+    original, fixed = tmp_path / "a.cpp", tmp_path / "b.cpp"
+    original.write_bytes(b"int x = 1;")
+    fixed.write_bytes(b"const int x = 1;")
+
+    patch = b"".join(unified_patch(str(original), str(fixed), "a.cpp"))
+
+    assert patch.count(b"\\ No newline at end of file\n") == 2
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+@pytest.mark.parametrize("fixed_as_utf8", [False, True], ids=["applied", "temp-fixed"])
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_patch_applies_with_git(tmp_path, fmt, fixed_as_utf8):
+    original, fixed = write_pair(tmp_path, fmt, fixed_as_utf8)
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "main.cpp").write_bytes(encode(ORIGINAL, fmt))
+    (tmp_path / "fixes.patch").write_bytes(b"".join(stream_patch([{"name": "main.cpp", "original": original, "fixed": fixed}])))
+
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    subprocess.run(["git", "apply", str(tmp_path / "fixes.patch")], cwd=repo, check=True, capture_output=True)
+
+    assert (repo / "main.cpp").read_bytes() == encode(FIXED, fmt)
+
+def test_zip_contains_fixed_files_and_patches(tmp_path):
+    original, fixed = write_pair(tmp_path, "cp1252")
+
+    data = b"".join(stream_zip([{"name": "main.cpp", "original": original, "fixed": fixed}]))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.read("fixed/main.cpp") == encode(FIXED, "cp1252")
+        patch = archive.read("patches/main.cpp.patch")
+    assert b"+    const int x = 1;\n" in patch
+    assert "// Grüße".encode("cp1252") in patch
+
+@pytest.mark.parametrize("fixed_as_utf8", [False, True], ids=["applied", "temp-fixed"])
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_zip_fixed_file_keeps_original_encoding(tmp_path, fmt, fixed_as_utf8):
+    original, fixed = write_pair(tmp_path, fmt, fixed_as_utf8)
+
+    data = b"".join(stream_zip([{"name": "main.cpp", "original": original, "fixed": fixed}], include_patches=False))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.read("fixed/main.cpp") == encode(FIXED, fmt)
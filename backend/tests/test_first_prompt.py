@@ -0,0 +1,53 @@
+# test_first_prompt.py - LLM failures of the file intro answer 503/504, not a safety block
+
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+app = pytest.importorskip("app")
+
+from fastapi.testclient import TestClient
+
+from job_queue import JobQueue
+from misra_chat_client import LLMCallError, LLMDeadlineExceeded
+
+@pytest.fixture
+def project(monkeypatch, tmp_path):
+    numbered = tmp_path / "p_numbered_main.txt"
+    numbered.write_text("1: int main() {\n2:     return 0;\n3: }\n")
+    monkeypatch.setitem(app.sessions, "p", {"numbered_file": str(numbered), "original_filename": "main.cpp"})
+    monkeypatch.setattr(app, "_start_chat", lambda settings: object())
+    return "p"
+
+def failing_intro(error):
+    def send_file_intro(chat, numbered_cpp, **kwargs):
+        raise error
+    return send_file_intro
+
+@pytest.mark.parametrize("error, status", [
+    (LLMDeadlineExceeded("LLM call exceeded its deadline"), 504),
+    (LLMCallError("LLM call failed after 3 retries"), 503),
+])
+def test_first_prompt_maps_llm_errors(project, monkeypatch, error, status):
+    monkeypatch.setattr(app, "send_file_intro", failing_intro(error))
+
+    response = TestClient(app.app).post("/api/gemini/first-prompt", json={"projectId": project})
+
+    assert response.status_code == status
+    assert response.json()["detail"] == str(error)
+
+def test_first_prompt_job_reports_llm_error(project, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "job_queue", JobQueue(str(tmp_path / "jobs"), workers=1))
+    monkeypatch.setattr(app, "send_file_intro", failing_intro(LLMCallError("LLM call failed after 3 retries")))
+    client = TestClient(app.app)
+
+    job = client.post("/api/jobs", json={"kind": "first-prompt", "projectId": project}).json()
+    deadline = time.monotonic() + 5
+    while job["state"] not in ("done", "failed", "cancelled") and time.monotonic() < deadline:
+        time.sleep(0.02)
+        job = client.get(f"/api/jobs/{job['id']}").json()
+
+    assert job["state"] == "failed"
+    assert job["error"] == "LLM call failed after 3 retries"
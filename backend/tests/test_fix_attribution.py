@@ -0,0 +1,72 @@
+# test_fix_attribution.py - Which snippet regions fix which violations
+
+import pytest
+
+from fix_attribution import (
+    ACCEPTED, PENDING, AttributionConflict, AttributionIndex, build_refix_prompt, remove_regions, violation_id
+)
+
+A = {"line": 10, "misra": "6-4-1", "warning": "Missing braces"}
+B = {"line": 12, "misra": "5-0-4", "warning": "Implicit conversion"}
+C = {"line": 40, "misra": "7-1-1", "warning": "Could be const"}
+D = {"line": 90, "misra": "0-1-1", "warning": "Unreachable code"}
+
+SNIPPETS = {"10": "if (x) {", "10a": "}", "11": "y = 1U;", "12": "z = 2U;", "42": "const int n = 3;"}
+
+@pytest.fixture
+def index():
+    return AttributionIndex([A, B, C, D], SNIPPETS)
+
+def ids(*violations):
+    return [violation_id(v) for v in violations]
+
+def test_violation_id_is_stable():
+    assert violation_id(A) == violation_id(dict(A, line="10"))
+    assert violation_id(A) != violation_id(B)
+
+def test_violations_are_attributed_to_nearby_regions(index):
+    regions = {entry["id"]: entry["region"] for entry in index.to_dict()["violations"]}
+
+    assert regions == {ids(A)[0]: [10, 12], ids(B)[0]: [10, 12], ids(C)[0]: [42, 42], ids(D)[0]: None}
+    assert index.regions[0]["keys"] == ["10", "10a", "11", "12"]
+
+def test_regions_for_widens_to_violation_line(index):
+    assert index.regions_for(ids(C)) == [(40, 42)]
+
+def test_regions_for_unattributed_violation_is_its_line(index):
+    assert index.regions_for(ids(D)) == [(90, 90)]
+
+def test_regions_for_merges_overlapping_regions(index):
+    assert index.regions_for(ids(A, B)) == [(10, 12)]
+
+def test_regions_shared_with_accepted_violations_conflict(index):
+    index.set_status(ids(B), ACCEPTED)
+
+    with pytest.raises(AttributionConflict):
+        index.regions_for(ids(A))
+    assert index.regions_for(ids(A, B)) == [(10, 12)]
+
+def test_affected_lists_other_violations_in_regions(index):
+    assert index.affected([(10, 12)], ids(A)) == ids(B)
+
+def test_unknown_ids_raise_key_error(index):
+    with pytest.raises(KeyError):
+        index.set_status(["unknown"], ACCEPTED)
+
+def test_update_keeps_status(index):
+    index.set_status(ids(C), ACCEPTED)
+    index.update({"40": "const int n = 3;"})
+
+    entry = next(e for e in index.to_dict()["violations"] if e["id"] == ids(C)[0])
+    assert entry["status"] == ACCEPTED
+    assert entry["region"] == [40, 40]
+    assert next(e for e in index.to_dict()["violations"] if e["id"] == ids(A)[0])["status"] == PENDING
+
+def test_remove_regions_reverts_lines():
+    assert remove_regions(SNIPPETS, [(10, 11)]) == {"12": "z = 2U;", "42": "const int n = 3;"}
+
+def test_refix_prompt_names_regions_and_feedback():
+    prompt = build_refix_prompt("* 6-4-1 at line 10", [(10, 12), (40, 40)], feedback="  keep the else  ")
+
+    assert "original lines 10-12, 40," in prompt
+    assert "Reviewer feedback on the previous fix: keep the else" in prompt
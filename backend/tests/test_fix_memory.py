@@ -0,0 +1,62 @@
+# test_fix_memory.py - Remembered fixes replayed on other files
+
+from contextlib import closing
+
+import pytest
+
+import fix_memory
+from fix_memory import FixMemory, apply_remembered_fixes, record_accepted_fixes
+
+@pytest.fixture
+def memory(monkeypatch, tmp_path):
+    memory = FixMemory(str(tmp_path / "fix_memory.db"))
+    monkeypatch.setitem(fix_memory.fix_memory_settings, "enabled", True)
+    monkeypatch.setattr(fix_memory, "_memory", memory)
+    return memory
+
+@pytest.fixture
+def numbered(tmp_path):
+    path = tmp_path / "numbered.txt"
+    path.write_text("1:    count = count + 1;\n2:    total = total + 1;\n3:    flag = 0;\n")
+    return str(path)
+
+def test_exact_and_near_matches_are_replayed(memory, numbered):
+    memory.record("5-0-4", "    count = count + 1;", [("", "    count = count + 1U;")])
+    violations = [{"line": 1, "misra": "5-0-4"}, {"line": 2, "misra": "5-0-4"}, {"line": 3, "misra": "5-0-4"}]
+
+    snippets, handled, remaining = apply_remembered_fixes(numbered, violations)
+
+    assert snippets == {"1": "    count = count + 1U;", "2": "    total = total + 1U;"}
+    assert handled == violations[:2]
+    assert remaining == violations[2:]
+
+def test_fix_colliding_with_taken_keys_is_left_to_llm(memory, numbered):
+    memory.record("5-0-4", "    count = count + 1;", [("", "    count = count + 1U;"), ("a", "    check();")])
+    violations = [{"line": 1, "misra": "5-0-4"}]
+
+    snippets, handled, remaining = apply_remembered_fixes(numbered, violations, taken={"1a": "    }"})
+
+    assert snippets == {}
+    assert handled == []
+    assert remaining == violations
+
+def test_disabled_memory_handles_nothing(monkeypatch, numbered):
+    monkeypatch.setitem(fix_memory.fix_memory_settings, "enabled", False)
+    violations = [{"line": 1, "misra": "5-0-4"}]
+    assert apply_remembered_fixes(numbered, violations) == ({}, [], violations)
+
+def accepted(memory):
+    with closing(memory._connect()) as conn:
+        return conn.execute("SELECT SUM(accepted) FROM fixes").fetchone()[0] or 0
+
+def test_recording_is_idempotent_per_source_and_line(memory, numbered):
+    snippets = {"1": "    count = count + 1U;"}
+    violation_fixes = [{"line": 1, "misra": "5-0-4", "snippetLines": ["1"]}]
+
+    assert record_accepted_fixes(numbered, snippets, violation_fixes, source="p") == 1
+    assert record_accepted_fixes(numbered, snippets, violation_fixes, source="p") == 0
+    assert accepted(memory) == 1
+
+    # Another project accepting the same fix counts it again
+    assert record_accepted_fixes(numbered, snippets, violation_fixes, source="q") == 1
+    assert accepted(memory) == 2
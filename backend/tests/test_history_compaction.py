@@ -0,0 +1,85 @@
+# test_history_compaction.py - Chat history compaction before each turn
+
+import pytest
+
+pytest.importorskip("vertexai")
+
+from vertexai.generative_models import Content, Part
+
+import history_compaction
+from history_compaction import compact_history
+from misra_chat_client import FILE_INTRO_PROMPT
+
+def content(role, text):
+    return Content(role=role, parts=[Part.from_text(text)])
+
+def text(entry):
+    return "".join(part.text for part in entry.parts)
+
+def fix_response(first_line):
+    block = "\n".join(f"{line}:    fixed_line_{line}();" for line in range(first_line, first_line + 20))
+    return f"Here are the fixes.\n```cpp\n{block}\n```\nAll done."
+
+@pytest.fixture
+def history():
+    entries = [content("user", FILE_INTRO_PROMPT + "\n\n1: int a;\n2: int b;"), content("model", "Received.")]
+    for turn in range(4):
+        entries.append(content("user", f"Fix violations batch {turn}: " + "details " * 100))
+        entries.append(content("model", fix_response(turn * 100 + 1)))
+    return entries
+
+def test_intro_is_replaced_by_current_file(history):
+    compacted, _ = compact_history(history, "1: const int a = 0;\n2: int b;")
+
+    assert text(compacted[0]).startswith(FILE_INTRO_PROMPT)
+    assert text(compacted[0]).endswith("1: const int a = 0;\n2: int b;")
+    assert text(compacted[1]) == "Received."
+
+def merged_state(*first_lines):
+    return "\n".join(f"{line}:    fixed_line_{line}();" for first in first_lines for line in range(first, first + 20))
+
+def test_old_fix_responses_are_summarized_and_recent_kept(history):
+    compacted, stats = compact_history(history, merged_state(1, 101))
+
+    assert len(compacted) == len(history)
+    assert text(compacted[3]).startswith("[Earlier fix response: 20 line(s) changed (1, 2, 3")
+    assert "```" not in text(compacted[3])
+    assert len(text(compacted[2])) <= history_compaction.compaction_settings["summary_chars"] + 3
+    assert [text(e) for e in compacted[-4:]] == [text(e) for e in history[-4:]]
+    assert stats["tokensSaved"] == stats["tokensBefore"] - stats["tokensAfter"] > 0
+
+def test_fix_responses_missing_from_current_state_are_kept(history):
+    # Batch 1's fixes were replaced by a later batch; one of batch 0's lines was edited afterwards
+    current = merged_state(1).replace("3:    fixed_line_3();", "3:    edited_in_chat();")
+
+    compacted, _ = compact_history(history, current)
+
+    assert text(compacted[3]) == text(history[3])
+    assert text(compacted[5]) == text(history[5])
+
+    compacted, _ = compact_history(history, merged_state(1))
+    assert text(compacted[3]).startswith("[Earlier fix response: 20 line(s) changed")
+    assert text(compacted[5]) == text(history[5])
+
+def test_fix_responses_are_kept_without_current_state(history):
+    compacted, _ = compact_history(history)
+
+    assert [text(e) for e in compacted if e.role == "model"] == [text(e) for e in history if e.role == "model"]
+
+def test_oldest_exchanges_are_dropped_over_budget(history, monkeypatch):
+    monkeypatch.setitem(history_compaction.compaction_settings, "max_history_tokens", 600)
+
+    compacted, _ = compact_history(history)
+
+    assert text(compacted[0]).startswith(FILE_INTRO_PROMPT)
+    assert [entry.role for entry in compacted] == ["user", "model"] * (len(compacted) // 2)
+    assert len(compacted) < len(history)
+    assert text(compacted[-1]) == text(history[-1])
+
+def test_disabled_compaction_returns_history_unchanged(history, monkeypatch):
+    monkeypatch.setitem(history_compaction.compaction_settings, "enabled", False)
+
+    compacted, stats = compact_history(history, "1: int a;")
+
+    assert compacted == history
+    assert stats["tokensSaved"] == 0
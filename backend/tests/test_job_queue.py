@@ -0,0 +1,95 @@
+# test_job_queue.py - Background jobs: scheduling, cancellation and expiry
+
+import json
+import threading
+import time
+
+from job_queue import JobQueue, CANCELLED, DONE, FAILED, QUEUED
+
+def wait_for_state(queue, job_id, states, timeout=5.0):
+    deadline = time.time() + timeout
+    job = queue.get(job_id)
+    while job['state'] not in states and time.time() < deadline:
+        job = queue.wait_for_change(job_id, job['version'], timeout=0.1) or job
+    return job
+
+def test_job_runs_and_reports_result(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=1)
+    job = queue.submit("fix-violations", "p", lambda ctx: {"ok": True})
+
+    job = wait_for_state(queue, job['id'], {DONE})
+    assert job['result'] == {"ok": True}
+    assert json.loads((tmp_path / f"{job['id']}.json").read_text())['state'] == DONE
+
+def test_jobs_of_one_project_never_overlap(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=3)
+    active, overlaps = [], []
+    lock = threading.Lock()
+
+    def step(ctx):
+        with lock:
+            active.append(ctx.job_id)
+            overlaps.append(len(active) > 1)
+        time.sleep(0.05)
+        with lock:
+            active.remove(ctx.job_id)
+
+    jobs = [queue.submit("fix-violations", "p", step) for _ in range(3)]
+    for job in jobs:
+        assert wait_for_state(queue, job['id'], {DONE})['state'] == DONE
+    assert not any(overlaps)
+
+def test_other_projects_run_while_one_is_busy(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=2)
+    release = threading.Event()
+    busy = queue.submit("fix-violations", "a", lambda ctx: release.wait(5))
+    queue.submit("fix-violations", "a", lambda ctx: None)
+    other = queue.submit("fix-violations", "b", lambda ctx: "b")
+
+    assert wait_for_state(queue, other['id'], {DONE})['result'] == "b"
+    release.set()
+    assert wait_for_state(queue, busy['id'], {DONE})['state'] == DONE
+
+def test_cancel_queued_and_running_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=1)
+    started = threading.Event()
+
+    def step(ctx):
+        started.set()
+        while True:
+            ctx.progress("llm", 0.5)
+            time.sleep(0.01)
+
+    running = queue.submit("fix-violations", "p", step)
+    queued = queue.submit("apply-fixes", "p", lambda ctx: None)
+    started.wait(5)
+
+    assert queue.cancel(queued['id'])['state'] == CANCELLED
+    queue.cancel(running['id'])
+    assert wait_for_state(queue, running['id'], {CANCELLED, DONE, FAILED})['state'] == CANCELLED
+
+def test_failed_job_keeps_error(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=1)
+
+    def step(ctx):
+        raise ValueError("boom")
+
+    job = wait_for_state(queue, queue.submit("first-prompt", "p", step)['id'], {FAILED})
+    assert job['error'] == "boom"
+
+def test_finished_jobs_expire_after_ttl(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=1, ttl=0.05)
+    old = queue.submit("apply-fixes", "p", lambda ctx: None)
+    wait_for_state(queue, old['id'], {DONE})
+    time.sleep(0.1)
+
+    queue.submit("apply-fixes", "p", lambda ctx: None)
+
+    assert queue.get(old['id']) is None
+    assert not (tmp_path / f"{old['id']}.json").exists()
+
+def test_restart_fails_interrupted_jobs(tmp_path):
+    job = {'id': "j1", 'projectId': "p", 'state': QUEUED, 'createdAt': time.time(), 'version': 0}
+    (tmp_path / "j1.json").write_text(json.dumps(job))
+
+    assert JobQueue(str(tmp_path), workers=1).get("j1")['state'] == FAILED
@@ -0,0 +1,71 @@
+# test_line_index.py - Paginated line ranges served from the cached line index
+
+import os
+
+import pytest
+
+from line_index import count_lines, get_line_index, read_line_range
+from numbering import add_line_numbers
+from replace import merge_fixed_snippets_into_file
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "main.cpp"
+    path.write_bytes(b"".join(b"int v%d = %d;\r\n" % (i, i) for i in range(1, 11)))
+    return str(path)
+
+def pages(path, size):
+    lines, total = [], count_lines(path)
+    for start in range(1, total + 1, size):
+        page, page_total = read_line_range(path, start, size)
+        assert page_total == total
+        lines.extend(page)
+    return lines
+
+def test_pages_cover_the_file_without_gaps_or_overlap(source):
+    first, total = read_line_range(source, 1, 4)
+    second, _ = read_line_range(source, 5, 4)
+
+    assert total == 10
+    assert first == [f"int v{i} = {i};" for i in range(1, 5)]
+    assert second == [f"int v{i} = {i};" for i in range(5, 9)]
+    assert pages(source, 4) == [f"int v{i} = {i};" for i in range(1, 11)]
+
+def test_last_page_is_partial(source):
+    lines, total = read_line_range(source, 9, 4)
+    assert lines == ["int v9 = 9;", "int v10 = 10;"]
+    assert total == 10
+
+@pytest.mark.parametrize("start, count", [(11, 5), (500, 1), (3, 0)])
+def test_out_of_range_requests_return_no_lines(source, start, count):
+    assert read_line_range(source, start, count) == ([], 10)
+
+def test_start_before_the_first_line_is_clamped(source):
+    assert read_line_range(source, 0, 2) == (["int v1 = 1;", "int v2 = 2;"], 10)
+
+def test_file_without_final_newline(tmp_path):
+    path = tmp_path / "a.cpp"
+    path.write_bytes(b"int a;\nint b;")
+    assert read_line_range(str(path), 1, 10) == (["int a;", "int b;"], 2)
+
+def test_index_is_rebuilt_when_the_file_changes(source):
+    assert get_line_index(source) is get_line_index(source)
+
+    with open(source, "ab") as f:
+        f.write(b"int extra;\r\n")
+    os.utime(source, ns=(os.stat(source).st_atime_ns, os.stat(source).st_mtime_ns + 1))
+
+    assert read_line_range(source, 11, 5) == (["int extra;"], 11)
+
+def test_pages_agree_with_the_numbered_file_after_a_merge(source, tmp_path):
+    numbered, merged = str(tmp_path / "numbered.txt"), str(tmp_path / "merged.txt")
+    add_line_numbers(source, numbered)
+    merge_fixed_snippets_into_file(numbered, {"3": " const int v3 = 3;", "3a": " int inserted = 0;", "7": ""}, merged)
+
+    with open(merged, encoding="utf-8", newline="") as f:
+        expected = f.read().splitlines()
+
+    assert pages(merged, 3) == expected
+    assert expected[2:4] == ["3: const int v3 = 3;", "3a: int inserted = 0;"]
+    assert expected[7] == "7:"
+    assert count_lines(merged) == 11
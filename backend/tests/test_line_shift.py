@@ -0,0 +1,90 @@
+# test_line_shift.py - Fenwick tree and line remapping across fix iterations
+
+import random
+
+import pytest
+
+from line_shift import FenwickTree, LineShiftIndex, ProjectLineIndex, inserted_ranks
+
+def test_fenwick_matches_naive_sums():
+    rng = random.Random(7)
+    values = [rng.randint(0, 5) for _ in range(50)]
+    fenwick = FenwickTree.from_values(values)
+
+    for _ in range(100):
+        position = rng.randint(1, 50)
+        delta = rng.randint(0, 3)
+        fenwick.add(position, delta)
+        values[position - 1] += delta
+        probe = rng.randint(0, 60)
+        assert fenwick.prefix_sum(probe) == sum(values[:probe])
+
+def test_fenwick_lower_bound():
+    fenwick = FenwickTree.from_values([1, 0, 2, 1])
+
+    assert [fenwick.lower_bound(target) for target in range(1, 6)] == [1, 3, 3, 4, 5]
+
+def layout(size, insertions, deletions):
+    """Naive fixed file: (original line, inserted) for every line"""
+    lines = []
+    for line in range(1, size + 1):
+        if line not in deletions:
+            lines.append((line, False))
+        lines.extend((line, True) for _ in range(insertions.get(line, 0)))
+    return lines
+
+@pytest.mark.parametrize("seed", range(5))
+def test_index_matches_naive_layout(seed):
+    rng = random.Random(seed)
+    size = 40
+    insertions = {line: rng.randint(1, 3) for line in rng.sample(range(1, size + 1), 8)}
+    deletions = set(rng.sample([line for line in range(1, size + 1) if line not in insertions], 5))
+    index = LineShiftIndex(insertions, deletions, size=size)
+    fixed = layout(size, insertions, deletions)
+
+    for number, (original, inserted) in enumerate(fixed, 1):
+        assert index.to_original(number) == (original, inserted)
+        if not inserted:
+            assert index.to_current(original) == number
+    for line in deletions:
+        assert index.to_current(line) is None
+
+    # Lines beyond the covered range move by the total shift
+    assert index.to_current(size + 3) == len(fixed) + 3
+    assert index.to_original(len(fixed) + 3) == (size + 3, False)
+
+def test_inserted_position():
+    index = LineShiftIndex({2: 2}, size=4)
+
+    assert [index.inserted_position(2, rank) for rank in (1, 2)] == [3, 4]
+    assert index.to_current(3) == 5
+
+def test_from_snippets_counts_inserted_keys():
+    index = LineShiftIndex.from_snippets({"3": "x", "3a": "y", "3b": "z", "7": ""}, size=10)
+
+    assert index.to_current(4) == 6
+    assert index.to_current(7) == 9
+    assert index.to_original(5) == (3, True)
+
+def test_inserted_ranks():
+    assert inserted_ranks({"3": "", "3b": "", "3a": "", "9a": ""}) == {"3a": 1, "3b": 2, "9a": 1}
+
+def test_project_index_remaps_across_versions():
+    project = ProjectLineIndex()
+    project.set_version(0, LineShiftIndex({2: 1}, size=10))
+    project.set_version(1, LineShiftIndex({1: 2}, size=11))
+
+    assert project.current_version == 2
+    assert project.to_current(5, 0) == 8
+    assert project.to_version(8, 0) == 5
+    assert project.to_version(3, 0) is None
+    assert project.remap(5, 0, 1) == 6
+
+def test_reapplying_replaces_later_versions():
+    project = ProjectLineIndex()
+    project.set_version(0, LineShiftIndex({2: 1}, size=10))
+    project.set_version(1, LineShiftIndex({1: 2}, size=11))
+    project.set_version(0, LineShiftIndex({}, size=10))
+
+    assert project.current_version == 1
+    assert project.to_current(5, 0) == 5
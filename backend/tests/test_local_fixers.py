@@ -0,0 +1,108 @@
+# test_local_fixers.py - Deterministic local rewrites for mechanical rules
+
+import pytest
+
+from local_fixers import (
+    apply_local_fixes, find_fixer, fix_c_style_cast, fix_compound_body, fix_const_qualification, fix_unsigned_suffix
+)
+
+def fix(fixer, code, warning="", misra="5-2-4"):
+    return fixer({"1": code}, "1", {"line": 1, "misra": misra, "warning": warning})
+
+DECLARATIONS = {"2": "void f(float y, uint8_t count)", "3": "    unsigned long a = 0UL;", "4": "    double b;"}
+
+def fix_cast(code, misra="5-2-4"):
+    lines = dict(DECLARATIONS, **{"1": code})
+    return fix_c_style_cast(lines, "1", {"line": 1, "misra": misra, "warning": "C-style cast"})
+
+@pytest.mark.parametrize("code, expected", [
+    ("x = (int)y;", "x = static_cast<int>(y);"),
+    ("x = (unsigned  long)count;", "x = static_cast<unsigned long>(count);"),
+    ("x = (float)(a + b * 2U);", "x = static_cast<float>(a + b * 2U);"),
+    ("x = (uint8_t)1.5;", "x = static_cast<uint8_t>(1.5);"),
+])
+def test_cast_is_rewritten(code, expected):
+    assert fix_cast(code) == {"1": expected}
+
+@pytest.mark.parametrize("code", [
+    "x = (int)f(x);",
+    "x = (int)ns::v;",
+    "x = (int)obj.get();",
+    "x = (int)p->x++;",
+    "x = (int)a[b[1]];",
+    "x = (int)y + (int)b;",
+    "x = (int)y; // cast",
+    "s = \"(int)y\";",
+])
+def test_cast_left_to_llm(code):
+    assert fix_cast(code) is None
+
+@pytest.mark.parametrize("code", [
+    # Types of members, elements and undeclared names are unknown
+    "x = (uint8_t)p->len;",
+    "x = (unsigned long)s.b[2];",
+    "x = (int)undeclared;",
+    "x = (float)(a + undeclared);",
+])
+def test_cast_of_unknown_operand_left_to_llm(code):
+    assert fix_cast(code) is None
+
+def test_cast_of_pointer_or_array_left_to_llm():
+    lines = {"1": "uint32 *ptr = &value;", "2": "uint8 buf[4];", "3": "x = (uint32)ptr;", "4": "y = (uint32)buf;"}
+    violation = {"misra": "5-2-4", "warning": "C-style cast"}
+    assert fix_c_style_cast(lines, "3", violation) is None
+    assert fix_c_style_cast(lines, "4", violation) is None
+
+def test_virtual_base_cast_is_not_fixed_locally():
+    # 5-2-2 casts from a virtual base need dynamic_cast, not static_cast
+    violation = {"line": 1, "misra": "5-2-2", "warning": "Cast from virtual base class"}
+    assert find_fixer(violation) is None
+
+def test_unsigned_suffix_needs_a_single_candidate():
+    assert fix(fix_unsigned_suffix, "uint32_t m = 0xFF;", misra="2-13-3") == {"1": "uint32_t m = 0xFFU;"}
+    assert fix(fix_unsigned_suffix, "m = 0xFF | 0x10;", misra="2-13-3") is None
+
+@pytest.mark.parametrize("code, expected", [
+    ("    int limit = 10;", "    const int limit = 10;"),
+    ("static uint8_t mask{0x0F};", "static const uint8_t mask{0x0F};"),
+])
+def test_const_is_added(code, expected):
+    assert fix(fix_const_qualification, code, misra="7-1-1") == {"1": expected}
+
+@pytest.mark.parametrize("code", [
+    "int f(int a);",
+    "int x(5);",
+    "constexpr int x = 5;",
+    "static constexpr int x = 5;",
+    "return x = 5;",
+    "int a = 1, b = 2;",
+    "public: int x = 5;",
+    "private: static int y = 5;",
+    "  protected:  uint8_t z{1};",
+])
+def test_const_left_to_llm(code):
+    assert fix(fix_const_qualification, code, misra="7-1-1") is None
+
+def test_const_checks_the_named_variable():
+    assert fix(fix_const_qualification, "int a = 1;", warning="'b' could be const", misra="7-1-1") is None
+
+def test_compound_body_on_same_line():
+    assert fix(fix_compound_body, "if (x) y = 1;", misra="6-4-1") == {"1": "if (x) { y = 1; }"}
+
+def test_compound_body_on_next_line():
+    lines = {"1": "if (x)", "2": "    y = 1;", "3": "z = 2;"}
+    assert fix_compound_body(lines, "1", {"line": 1, "misra": "6-4-1"}) == {"1": "if (x) {", "2a": "}"}
+
+def test_apply_local_fixes_splits_handled_and_remaining(tmp_path):
+    numbered = tmp_path / "numbered.txt"
+    numbered.write_text("1:int a = (int)f(x);\n2:long b = (long)c;\n3:int c = 0;\n")
+    violations = [
+        {"line": 1, "misra": "5-2-4", "warning": "C-style cast"},
+        {"line": 2, "misra": "5-2-4", "warning": "C-style cast"},
+    ]
+
+    snippets, handled, remaining = apply_local_fixes(str(numbered), violations)
+
+    assert snippets == {"2": "long b = static_cast<long>(c);"}
+    assert handled == [violations[1]]
+    assert remaining == [violations[0]]
@@ -0,0 +1,154 @@
+# test_misra_chat_client.py - Retries, backoff, deadlines and hedging of LLM calls
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("vertexai")
+
+from google.api_core import exceptions as api_exceptions
+
+import misra_chat_client
+from misra_chat_client import LLMCallError, LLMDeadlineExceeded, send_file_intro, send_message_resilient
+
+class FakeChat:
+    """Chat session whose replies come from `reply(model_name)`"""
+
+    def __init__(self, reply, history=(), model_name=None):
+        self.reply = reply
+        self.history = list(history)
+        self.model_name = model_name
+
+    def send_message(self, message):
+        response = self.reply(self.model_name)
+        self.history += [message, response.text]
+        return response
+
+def reply(text):
+    return SimpleNamespace(text=text, usage_metadata=None)
+
+@pytest.fixture
+def client(monkeypatch):
+    """Forks are FakeChats; no rate limiter, no real backoff sleeps"""
+    monkeypatch.setattr(misra_chat_client, "get_rate_limiter", lambda: None)
+    monkeypatch.setattr(misra_chat_client, "_estimate_tokens", lambda chat, message: 0)
+    monkeypatch.setattr(
+        misra_chat_client, "fork_chat",
+        lambda chat, model_name=None: FakeChat(chat.reply, chat.history, model_name or chat.model_name)
+    )
+    monkeypatch.setitem(misra_chat_client.resilience_settings, "max_retries", 3)
+    monkeypatch.setitem(misra_chat_client.resilience_settings, "hedge", False)
+    delays = []
+    monkeypatch.setattr(misra_chat_client.random, "uniform", lambda low, high: delays.append(high) or 0.0)
+    return delays
+
+def failing(times, error=lambda: api_exceptions.ServiceUnavailable("unavailable")):
+    calls = []
+
+    def respond(model_name):
+        calls.append(model_name)
+        if len(calls) <= times:
+            raise error()
+        return reply("fixed")
+
+    respond.calls = calls
+    return respond
+
+def test_retries_with_exponential_backoff(client):
+    respond = failing(2)
+    chat = FakeChat(respond)
+
+    assert send_message_resilient(chat, "fix").text == "fixed"
+    assert len(respond.calls) == 3
+    assert client == [1.0, 2.0]
+    # Only the winning attempt's exchange is adopted
+    assert chat.history == ["fix", "fixed"]
+
+def test_gives_up_after_max_retries(client):
+    respond = failing(10)
+    chat = FakeChat(respond)
+
+    with pytest.raises(LLMCallError, match="after 3 retries"):
+        send_message_resilient(chat, "fix")
+    assert len(respond.calls) == 4
+    assert chat.history == []
+
+def test_non_retryable_errors_are_not_retried(client):
+    respond = failing(1, lambda: api_exceptions.InvalidArgument("bad request"))
+
+    with pytest.raises(api_exceptions.InvalidArgument):
+        send_message_resilient(FakeChat(respond), "fix")
+    assert len(respond.calls) == 1
+
+def test_deadline_exceeded(client):
+    def slow(model_name):
+        time.sleep(0.05)
+        raise api_exceptions.ServiceUnavailable("unavailable")
+
+    with pytest.raises(LLMDeadlineExceeded):
+        send_message_resilient(FakeChat(slow), "fix", deadline=0.1)
+
+def test_hedge_wins_over_slow_primary(client, monkeypatch):
+    monkeypatch.setitem(misra_chat_client.resilience_settings, "hedge_min_delay", 0.02)
+    release = threading.Event()
+
+    def respond(model_name):
+        if model_name == "fast-model":
+            return reply("hedged")
+        release.wait(5)
+        return reply("primary")
+
+    before = misra_chat_client.get_resilience_stats()
+    try:
+        response = send_message_resilient(
+            FakeChat(respond, model_name="slow-model"), "fix", hedge=True, hedge_model_name="fast-model"
+        )
+        after = misra_chat_client.get_resilience_stats()
+    finally:
+        release.set()
+
+    assert response.text == "hedged"
+    assert after["hedges"] == before["hedges"] + 1
+    assert after["hedge_wins"] == before["hedge_wins"] + 1
+    # The losing primary keeps running until it returns
+    assert after["abandoned"] == before["abandoned"] + 1
+
+def test_no_hedge_while_too_many_requests_are_abandoned(client, monkeypatch):
+    monkeypatch.setitem(misra_chat_client.resilience_settings, "hedge_min_delay", 0.02)
+    monkeypatch.setitem(misra_chat_client.resilience_settings, "max_abandoned", 0)
+
+    def respond(model_name):
+        time.sleep(0.05)
+        return reply(model_name)
+
+    before = misra_chat_client.get_resilience_stats()
+    response = send_message_resilient(FakeChat(respond, model_name="slow-model"), "fix", hedge=True, hedge_model_name="fast-model")
+
+    assert response.text == "slow-model"
+    assert misra_chat_client.get_resilience_stats()["hedges"] == before["hedges"]
+
+def test_timed_out_attempt_is_abandoned_and_released(client, monkeypatch):
+    monkeypatch.setitem(misra_chat_client.resilience_settings, "attempt_timeout", 0.05)
+    monkeypatch.setitem(misra_chat_client.resilience_settings, "max_retries", 0)
+    release = threading.Event()
+    respond = lambda model_name: release.wait(5) and reply("late")
+
+    before = misra_chat_client.get_resilience_stats()["abandoned"]
+    with pytest.raises(LLMCallError):
+        send_message_resilient(FakeChat(respond), "fix")
+    assert misra_chat_client.get_resilience_stats()["abandoned"] == before + 1
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while misra_chat_client.get_resilience_stats()["abandoned"] != before and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert misra_chat_client.get_resilience_stats()["abandoned"] == before
+
+def test_file_intro_raises_llm_errors(client):
+    with pytest.raises(LLMCallError):
+        send_file_intro(FakeChat(failing(10)), "1: int a;")
+
+def test_file_intro_returns_none_for_blocked_response(client):
+    assert send_file_intro(FakeChat(lambda model_name: reply(None)), "1: int a;") is None
@@ -0,0 +1,15 @@
+# test_misra_rules.py - Rule numbers extracted from report rule text
+
+import pytest
+
+from misra_rules import normalize_rule
+
+@pytest.mark.parametrize("rule, expected", [
+    ("MISRA C++ Rule 6.4.1", "6-4-1"),
+    ("Rule 5-0-4 (required)", "5-0-4"),
+    ("M7-1-1", "7-1-1"),
+    (" custom ", "custom"),
+    (None, ""),
+])
+def test_normalize_rule(rule, expected):
+    assert normalize_rule(rule) == expected
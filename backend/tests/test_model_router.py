@@ -0,0 +1,47 @@
+# test_model_router.py - Choice between the fast and the strong model
+
+import pytest
+
+pytest.importorskip("vertexai")
+
+import model_router
+from model_router import choose_model, should_escalate
+
+STRONG = "strong-model"
+FAST = "fast-model"
+
+@pytest.fixture(autouse=True)
+def router(monkeypatch):
+    monkeypatch.setitem(model_router.routing_settings, "enabled", True)
+    monkeypatch.setitem(model_router.routing_settings, "fast_model_name", FAST)
+    monkeypatch.setitem(model_router.routing_settings, "probe_every", 3)
+    monkeypatch.setattr(model_router, "_held_back", 0)
+    health = {FAST: {"latency": 1.0, "failure_rate": 0.0}, STRONG: {"latency": 2.0, "failure_rate": 0.0}}
+    monkeypatch.setattr(model_router, "get_model_health", lambda name: health[name])
+    return health
+
+def test_simple_batch_goes_to_fast_model():
+    assert choose_model([{"misra": "5-0-4"}], 1000, STRONG) == (FAST, "simple batch")
+
+def test_hard_rules_and_large_batches_go_to_strong_model():
+    assert choose_model([{"misra": "Rule 6-5-1"}], 1000, STRONG)[0] == STRONG
+    assert choose_model([{"misra": "5-0-4"}] * 16, 1000, STRONG)[0] == STRONG
+
+def test_unhealthy_fast_model_is_probed_every_nth_batch(router):
+    router[FAST]["failure_rate"] = 0.9
+
+    models = [choose_model([{"misra": "5-0-4"}], 1000, STRONG) for _ in range(6)]
+
+    assert [model for model, _ in models] == [STRONG, STRONG, FAST, STRONG, STRONG, FAST]
+    assert models[2][1].startswith("health probe")
+
+def test_recovered_fast_model_is_used_again(router):
+    router[FAST]["failure_rate"] = 0.9
+    assert choose_model([{"misra": "5-0-4"}], 1000, STRONG)[0] == STRONG
+    router[FAST]["failure_rate"] = 0.1
+    assert choose_model([{"misra": "5-0-4"}], 1000, STRONG)[0] == FAST
+
+def test_should_escalate_only_failed_fast_results():
+    assert should_escalate(FAST, STRONG, {"valid": False})
+    assert not should_escalate(FAST, STRONG, {"valid": True})
+    assert not should_escalate(STRONG, STRONG, {"valid": False})
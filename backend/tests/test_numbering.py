@@ -0,0 +1,56 @@
+# test_numbering.py - Numbering and denumbering round trip across encodings and line endings
+
+import codecs
+
+import pytest
+
+from denumbering import remove_line_numbers
+from numbering import add_line_numbers
+from source_buffer import SourceEncodingError, detect_encoding, detect_newline, encode_from_utf8
+
+TEXT = "int main() {\n    // Grüße\n    return 0;\n}\n"
+
+@pytest.mark.parametrize("raw", [
+    TEXT.encode("utf-8"),
+    TEXT.replace("\n", "\r\n").encode("utf-8"),
+    TEXT.rstrip("\n").encode("utf-8"),
+    TEXT.encode("cp1252"),
+    codecs.BOM_UTF8 + TEXT.encode("utf-8"),
+    codecs.BOM_UTF16_LE + TEXT.replace("\n", "\r\n").encode("utf-16-le"),
+    b"",
+], ids=["utf8", "crlf", "no-final-newline", "cp1252", "utf8-bom", "utf16-bom", "empty"])
+def test_round_trip_is_byte_identical(tmp_path, raw):
+    source, numbered, restored = tmp_path / "a.cpp", tmp_path / "numbered.txt", tmp_path / "restored.cpp"
+    source.write_bytes(raw)
+
+    source_format = add_line_numbers(str(source), str(numbered))
+    remove_line_numbers(str(numbered), str(restored), source_format)
+
+    assert restored.read_bytes() == raw
+
+def test_numbered_file_is_utf8_with_prefixes(tmp_path):
+    source, numbered = tmp_path / "a.cpp", tmp_path / "numbered.txt"
+    source.write_bytes(TEXT.encode("cp1252"))
+
+    source_format = add_line_numbers(str(source), str(numbered))
+
+    assert source_format == {"encoding": "cp1252", "bom": False, "newline": "\n"}
+    assert numbered.read_text(encoding="utf-8").splitlines()[1] == "2:     // Grüße"
+
+def test_detection():
+    assert detect_encoding(codecs.BOM_UTF16_BE + "x".encode("utf-16-be")) == ("utf-16-be", True)
+    assert detect_encoding(b"\x81\x8d") == ("latin-1", False)
+    assert detect_newline(b"a\r\nb\n") == "\r\n"
+
+def test_unencodable_fix_names_the_line():
+    source_format = {"encoding": "cp1252", "bom": False, "newline": "\n"}
+    with pytest.raises(SourceEncodingError, match="Line 2"):
+        encode_from_utf8("int a;\nconst char *s = \"→\";\n".encode("utf-8"), source_format)
+
+def test_unencodable_fix_leaves_no_output(tmp_path):
+    numbered, restored = tmp_path / "numbered.txt", tmp_path / "restored.cpp"
+    numbered.write_bytes("1: int a; // ✓\n".encode("utf-8"))
+
+    with pytest.raises(SourceEncodingError):
+        remove_line_numbers(str(numbered), str(restored), {"encoding": "cp1252", "bom": False, "newline": "\n"})
+    assert not restored.exists()
@@ -0,0 +1,59 @@
+# test_profiling.py - Request profiles covering the event loop and the stage threads
+
+import asyncio
+import pstats
+import time
+
+import pytest
+
+import profiling
+from executors import StageExecutor, executor_settings
+from profiling import get_profile, requested_mode, stage_timer, start_profiler, stop_profiler, track_request
+
+def busy_stage(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+    return "done"
+
+@pytest.fixture
+def profile_dir(monkeypatch, tmp_path):
+    monkeypatch.setitem(profiling.profiling_settings, "profile_dir", str(tmp_path))
+    monkeypatch.setitem(profiling.profiling_settings, "sample_interval", 0.001)
+    return tmp_path
+
+async def profiled_request(mode):
+    executor = StageExecutor(dict(executor_settings, thread_workers=2))
+    profiler = start_profiler(mode)
+    try:
+        assert await executor.run("validation", busy_stage, 0.2) == "done"
+    finally:
+        profile_id = stop_profiler(profiler, mode, "POST", "/api/test", 0.2)
+        executor.shutdown()
+    return get_profile(profile_id)["file"]
+
+def test_sampling_profile_includes_stage_threads(profile_dir):
+    path = asyncio.run(profiled_request("sampling"))
+
+    with open(path, encoding="utf-8") as f:
+        stacks = f.read().splitlines()
+    assert any(line.startswith("[validation];") and "busy_stage" in line for line in stacks)
+
+def test_cprofile_includes_stage_threads(profile_dir):
+    path = asyncio.run(profiled_request("cprofile"))
+
+    functions = {name for _, _, name in pstats.Stats(path).stats}
+    assert "busy_stage" in functions
+
+def test_requested_mode(monkeypatch):
+    monkeypatch.setitem(profiling.profiling_settings, "enabled", True)
+    monkeypatch.setitem(profiling.profiling_settings, "profile_all", False)
+    assert requested_mode("cprofile") == "cprofile"
+    assert requested_mode("1") == profiling.profiling_settings["mode"]
+    assert requested_mode(None) is None
+
+def test_stage_timer_records_inside_tracked_request():
+    with track_request() as stages:
+        with stage_timer("merge"):
+            pass
+    assert [stage["stage"] for stage in stages] == ["merge"]
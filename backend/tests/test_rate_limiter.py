@@ -0,0 +1,50 @@
+# test_rate_limiter.py - Shared quota buckets and fair queuing
+
+from contextlib import closing
+
+import pytest
+
+from rate_limiter import RateLimiter, RateLimitTimeout, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+def clock(limiter, project):
+    with closing(limiter._connect()) as conn:
+        row = conn.execute("SELECT vtime FROM clocks WHERE project = ?", (project,)).fetchone()
+    return row[0] if row else None
+
+def test_acquire_takes_request_and_tokens(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limiter.db"), requests_per_minute=10, tokens_per_minute=1000)
+    limiter.acquire("p", tokens=100, max_wait=0)
+
+    available = limiter.stats()["available"]
+    assert available["requests"] == pytest.approx(9, abs=0.01)
+    assert available["tokens"] == pytest.approx(900, abs=1)
+    assert clock(limiter, "p") == 100
+
+def test_timeout_does_not_charge_project(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limiter.db"), requests_per_minute=1, tokens_per_minute=1000)
+    limiter.acquire("p", tokens=100, max_wait=0)
+
+    for _ in range(3):
+        with pytest.raises(RateLimitTimeout):
+            limiter.acquire("p", tokens=100, max_wait=0)
+
+    assert clock(limiter, "p") == 100
+    assert limiter.stats()["waiting"] == []
+
+def test_queued_waiters_of_a_project_are_ordered(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limiter.db"), requests_per_minute=10, tokens_per_minute=1000)
+    first = limiter._enqueue("p", PRIORITY_BULK, 100)
+    second = limiter._enqueue("p", PRIORITY_BULK, 100)
+
+    assert limiter._try_take(second, 100) is not None
+    assert limiter._try_take(first, 100) is None
+    assert limiter._try_take(second, 100) is None
+    assert clock(limiter, "p") == 200
+
+def test_interactive_waiters_go_first(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limiter.db"), requests_per_minute=10, tokens_per_minute=1000)
+    bulk = limiter._enqueue("a", PRIORITY_BULK, 10)
+    chat = limiter._enqueue("b", PRIORITY_INTERACTIVE, 10)
+
+    assert limiter._try_take(bulk, 10) is not None
+    assert limiter._try_take(chat, 10) is None
@@ -0,0 +1,62 @@
+# test_report_delta.py - New, persisting and resolved violations between two reports
+
+from line_shift import LineShiftIndex
+from report_delta import classify_violations
+
+def violation(line, rule="MISRA C++ Rule 5-0-4", warning="Implicit conversion"):
+    return {"line": line, "misra": rule, "warning": warning}
+
+def test_exact_matches_persist():
+    previous = [violation(10), violation(20, warning="Missing braces")]
+    current = [violation(10), violation(30)]
+
+    delta = classify_violations(previous, current)
+
+    assert delta["persisting"] == [current[0]]
+    assert delta["new"] == [current[1]]
+    assert delta["resolved"] == [previous[1]]
+
+def test_rule_spelling_and_whitespace_do_not_matter():
+    previous = [violation(10, rule="5.0.4", warning="Implicit   conversion")]
+    current = [violation(10, rule="Rule 5-0-4")]
+
+    assert classify_violations(previous, current)["persisting"] == current
+
+def test_nearby_lines_match_within_window():
+    previous = [violation(10), violation(40)]
+    current = [violation(12), violation(45)]
+
+    delta = classify_violations(previous, current)
+
+    assert delta["persisting"] == [current[0]]
+    assert delta["new"] == [current[1]]
+    assert delta["resolved"] == [previous[1]]
+
+def test_exact_matches_take_precedence_over_nearby_ones():
+    previous = [violation(10), violation(11)]
+    current = [violation(11), violation(13)]
+
+    delta = classify_violations(previous, current)
+
+    assert delta["persisting"] == current
+    assert delta["resolved"] == []
+
+def test_lines_are_remapped_through_applied_fixes():
+    # Ten lines were inserted after line 5, so line 50 moved to 60
+    index = LineShiftIndex({5: 10}, size=100)
+    previous = [violation(50), violation(3)]
+    current = [violation(60), violation(3)]
+
+    delta = classify_violations(previous, current, remap=index.to_current)
+
+    assert delta["persisting"] == current
+    assert delta["new"] == []
+
+def test_duplicates_match_one_to_one():
+    previous = [violation(10)]
+    current = [violation(10), violation(10)]
+
+    delta = classify_violations(previous, current)
+
+    assert len(delta["persisting"]) == 1
+    assert len(delta["new"]) == 1
@@ -0,0 +1,70 @@
+# test_snippet_validation.py - Local checks of fixed snippets and targeted re-asks
+
+import pytest
+
+from snippet_validation import (
+    base_line, snippet_regions, check_line_keys, check_balance, failing_regions, build_reask_prompt, replace_regions
+)
+
+@pytest.fixture
+def numbered(tmp_path):
+    path = tmp_path / "numbered.txt"
+    path.write_text(
+        "1:int f(int x) {\n"
+        "2:    if (x)\n"
+        "3:        return 1;\n"
+        "4:    return 0;\n"
+        "5:}\n"
+        "6:#ifdef DEBUG\n"
+        "7:int g;\n"
+        "8:#endif\n"
+    )
+    return str(path)
+
+def test_base_line():
+    assert base_line("12") == 12
+    assert base_line("100ab") == 100
+
+def test_snippet_regions_group_contiguous_lines():
+    assert snippet_regions({"2": "", "3": "", "3a": "", "7": ""}) == [(2, 3), (7, 7)]
+
+def test_balanced_fix_passes(numbered):
+    snippets = {"2": "    if (x) {", "3": "        return 1;", "3a": "    }"}
+    response = "```cpp\n2:    if (x) {\n3:        return 1;\n3a:    }\n```"
+
+    assert check_line_keys(response, snippets, numbered) == []
+    assert check_balance(snippets, numbered) == []
+
+def test_line_key_issues(numbered):
+    response = "```cpp\n2:    if (x) {\n    return 1;\n2:    if (y) {\n```"
+    snippets = {"2": "    if (y) {", "9": "int h;", "4": "4:    return 0;"}
+
+    kinds = {issue["kind"] for issue in check_line_keys(response, snippets, numbered)}
+
+    assert kinds == {"missing_prefix", "duplicate_key", "unknown_line", "double_prefix"}
+
+def test_balance_issues(numbered):
+    issues = check_balance({"2": "    if (x) {", "6": "#if DEBUG", "6a": "#ifdef TRACE"}, numbered)
+
+    assert [(issue["kind"], issue["line"]) for issue in issues] == [("brace_balance", 2), ("preprocessor_balance", 6)]
+
+def test_braces_in_literals_and_comments_are_ignored(numbered):
+    assert check_balance({"4": '    return "{"; // }}'}, numbered) == []
+
+def test_failing_regions_cover_issue_lines():
+    snippets = {"2": "", "3": "", "7": ""}
+    issues = [{"line": 3}, {"line": 9}, {"line": None}]
+
+    assert failing_regions(issues, snippets) == [(2, 3), (9, 9)]
+
+def test_replace_regions_only_takes_corrected_lines_inside_regions():
+    snippets = {"2": "old 2", "3": "old 3", "7": "kept 7"}
+    corrected = {"2": "new 2", "2a": "new 2a", "7": "changed 7", "12": "stray 12"}
+
+    assert replace_regions(snippets, corrected, [(2, 3)]) == {"2": "new 2", "2a": "new 2a", "7": "kept 7"}
+
+def test_reask_prompt_names_regions():
+    prompt = build_reask_prompt([{"message": "Lines 2-3 change the brace balance by +1"}], [(2, 3), (7, 7)])
+
+    assert "brace balance by +1" in prompt
+    assert "original lines 2-3, 7." in prompt
@@ -0,0 +1,73 @@
+# test_speculative.py - Speculative pipeline tasks and the speculative file intro
+
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from speculative import SpeculativePipeline, SpeculationCancelled, speculation_settings
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setitem(speculation_settings, "enabled", True)
+
+def test_take_returns_result_once(enabled):
+    pipeline = SpeculativePipeline(workers=1)
+    pipeline.start("p", "numbering", "u1", lambda cancelled, value: value * 2, 21)
+
+    assert pipeline.take("p", "numbering", "u1").result(timeout=5) == 42
+    assert pipeline.take("p", "numbering", "u1") is None
+
+def test_take_with_stale_key_misses(enabled):
+    pipeline = SpeculativePipeline(workers=1)
+    pipeline.start("p", "numbering", "u1", lambda cancelled: "old")
+
+    assert pipeline.take("p", "numbering", "u2") is None
+    assert pipeline.stats()["misses"] == 1
+
+def test_new_key_cancels_running_task(enabled):
+    pipeline = SpeculativePipeline(workers=2)
+    started = threading.Event()
+
+    def slow(cancelled):
+        started.set()
+        cancelled.wait(5)
+        if cancelled.is_set():
+            raise SpeculationCancelled()
+        return "stale"
+
+    first = pipeline.start("p", "intro", "k1", slow)
+    started.wait(5)
+    pipeline.start("p", "intro", "k2", lambda cancelled: "fresh")
+
+    with pytest.raises(SpeculationCancelled):
+        first.result(timeout=5)
+    assert pipeline.take("p", "intro", "k2").result(timeout=5) == "fresh"
+
+def test_disabled_starts_nothing(monkeypatch):
+    monkeypatch.setitem(speculation_settings, "enabled", False)
+    assert SpeculativePipeline(workers=1).start("p", "numbering", "u1", lambda cancelled: 1) is None
+
+def test_speculative_intro_runs_at_bulk_priority(enabled, monkeypatch, tmp_path):
+    pytest.importorskip("fastapi")
+    app = pytest.importorskip("app")
+    from rate_limiter import PRIORITY_BULK
+
+    numbered_file = tmp_path / "numbered_main.txt"
+    numbered_file.write_text("1:int main() { return 0; }\n")
+    calls = []
+
+    def fake_intro(chat, numbered_cpp, project_id=None, priority=None):
+        calls.append((chat, numbered_cpp, project_id, priority))
+        return "ready"
+
+    monkeypatch.setattr(app, "_start_chat", lambda settings: "chat")
+    monkeypatch.setattr(app, "send_file_intro", fake_intro)
+
+    numbering = Future()
+    numbering.set_result((str(numbered_file), None))
+    pipeline = SpeculativePipeline(workers=1)
+    pipeline.start("p", "intro", "k", app._speculate_intro, numbering, dict(app.model_settings), "p")
+
+    assert pipeline.take("p", "intro", "k").result(timeout=5) == ("chat", "ready")
+    assert calls == [("chat", "1:int main() { return 0; }\n", "p", PRIORITY_BULK)]
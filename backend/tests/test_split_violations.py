@@ -0,0 +1,67 @@
+# test_split_violations.py - Local and remembered fixes are validated before they skip the LLM
+
+import pytest
+
+pytest.importorskip("fastapi")
+app = pytest.importorskip("app")
+
+import fix_memory
+from executors import get_executor
+from fix_memory import FixMemory
+
+CAST = {"line": 1, "misra": "5-2-4", "warning": "C-style cast"}
+CONVERSION = {"line": 3, "misra": "5-0-4", "warning": "Implicit conversion"}
+OTHER = {"line": 2, "misra": "0-1-1", "warning": "Unreachable code"}
+
+@pytest.fixture
+def numbered(tmp_path):
+    path = tmp_path / "numbered.txt"
+    path.write_text("1:    long b = (long)c;\n2:    int c = 0;\n3:    y = x + 1;\n")
+    return str(path)
+
+@pytest.fixture
+def memory(monkeypatch, tmp_path):
+    memory = FixMemory(str(tmp_path / "fix_memory.db"))
+    monkeypatch.setitem(fix_memory.fix_memory_settings, "enabled", True)
+    monkeypatch.setattr(fix_memory, "_memory", memory)
+    monkeypatch.setitem(app.local_fixer_settings, "enabled", True)
+    monkeypatch.setitem(app.validation_settings, "enabled", True)
+    monkeypatch.setitem(app.validation_settings, "syntax_check_cmd", None)
+    return memory
+
+def test_valid_local_and_remembered_fixes_skip_the_llm(memory, numbered):
+    memory.record("5-0-4", "    y = x + 1;", [("", "    y = x + 1U;")])
+
+    snippets, local_fixed, remembered, remaining = app._split_violations(numbered, [CAST, OTHER, CONVERSION])
+
+    assert snippets == {"1": "    long b = static_cast<long>(c);", "3": "    y = x + 1U;"}
+    assert local_fixed == [CAST]
+    assert remembered == [CONVERSION]
+    assert remaining == [OTHER]
+
+def test_remembered_fix_failing_validation_goes_to_the_llm(memory, numbered):
+    memory.record("5-0-4", "    y = x + 1;", [("", "    y = x + 1U; {")])
+
+    snippets, local_fixed, remembered, remaining = app._split_violations(numbered, [CAST, OTHER, CONVERSION])
+
+    assert snippets == {"1": "    long b = static_cast<long>(c);"}
+    assert local_fixed == [CAST]
+    assert remembered == []
+    assert remaining == [OTHER, CONVERSION]
+
+def test_validation_can_be_disabled(memory, numbered, monkeypatch):
+    monkeypatch.setitem(app.validation_settings, "enabled", False)
+    memory.record("5-0-4", "    y = x + 1;", [("", "    y = x + 1U; {")])
+
+    _, _, remembered, _ = app._split_violations(numbered, [CONVERSION])
+
+    assert remembered == [CONVERSION]
+
+def test_validation_runs_in_the_calling_thread(memory, numbered):
+    stages = lambda: get_executor().stats()["stages"].get("validation", {}).get("count", 0)
+    before = stages()
+
+    _, local_fixed, _, _ = app._split_violations(numbered, [CAST])
+
+    assert local_fixed == [CAST]
+    assert stages() == before
@@ -0,0 +1,120 @@
+# test_structured_logging.py - Structured records from request, thread and process stages
+
+import asyncio
+import contextvars
+import io
+import json
+import logging
+
+import pytest
+
+import structured_logging
+from executors import PROCESS, THREAD, StageExecutor, executor_settings
+from structured_logging import SamplingFilter, StructuredFormatter, bind_project, get_logger, new_correlation_id
+
+def log_from_stage(message):
+    get_logger("stage_test").info(message)
+    return message
+
+@pytest.fixture
+def fresh_logging(capfd, monkeypatch):
+    """
+    Configure logging from scratch. The listener writes to a buffer; forked
+    process workers write to the inherited stderr, captured by capfd.
+    """
+    root = logging.getLogger("misra")
+    saved = root.handlers[:]
+    monkeypatch.setattr(structured_logging, "_listener", None)
+    monkeypatch.setattr(structured_logging, "_configured", False)
+    monkeypatch.setitem(structured_logging.log_settings, "format", "json")
+    structured_logging.configure_logging()
+    buffer = io.StringIO()
+    structured_logging._listener.handlers[0].setStream(buffer)
+    yield buffer
+    structured_logging._stop_listener()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in saved:
+        root.addHandler(handler)
+
+def read_records(buffer, capfd):
+    # Stopping the listener writes out everything still queued
+    structured_logging._stop_listener()
+    output = buffer.getvalue() + capfd.readouterr().err
+    return [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+
+async def run_stage(kind, message):
+    executor = StageExecutor(dict(executor_settings, thread_workers=1, process_workers=1, start_method="fork"))
+    try:
+        new_correlation_id(f"corr-{kind}")
+        bind_project("proj")
+        return await executor.run("logging", log_from_stage, message, kind=kind)
+    finally:
+        executor.shutdown()
+
+def test_process_stage_records_reach_the_log(fresh_logging, capfd):
+    assert asyncio.run(run_stage(PROCESS, "from a process worker")) == "from a process worker"
+
+    records = [r for r in read_records(fresh_logging, capfd) if r["message"] == "from a process worker"]
+    assert len(records) == 1
+    assert records[0]["logger"] == "misra.stage_test"
+    assert records[0]["correlation"] == "corr-process"
+    assert records[0]["project"] == "proj"
+
+def test_thread_stage_records_carry_correlation_and_project(fresh_logging, capfd):
+    asyncio.run(run_stage(THREAD, "from a stage thread"))
+
+    records = [r for r in read_records(fresh_logging, capfd) if r["message"] == "from a stage thread"]
+    assert len(records) == 1
+    assert records[0]["level"] == "INFO"
+    assert records[0]["correlation"] == "corr-thread"
+    assert records[0]["project"] == "proj"
+
+def test_records_outside_a_request_have_no_ids(fresh_logging, capfd):
+    contextvars.Context().run(get_logger("stage_test").warning, "no request")
+
+    record = next(r for r in read_records(fresh_logging, capfd) if r["message"] == "no request")
+    assert "correlation" not in record and "project" not in record
+
+def test_long_messages_and_arguments_are_truncated(fresh_logging, capfd, monkeypatch):
+    monkeypatch.setitem(structured_logging.log_settings, "max_chars", 10)
+    get_logger("stage_test").info("response: %s", "x" * 50)
+
+    record = next(r for r in read_records(fresh_logging, capfd) if r["message"].startswith("response"))
+    assert record["message"] == "response: xxxxxxxxxx... [40 more chars]"
+
+def test_exceptions_are_kept_separate_from_the_message(fresh_logging, capfd):
+    try:
+        raise ValueError("bad snippet")
+    except ValueError:
+        get_logger("stage_test").exception("merge failed")
+
+    record = next(r for r in read_records(fresh_logging, capfd) if r["message"] == "merge failed")
+    assert record["level"] == "ERROR"
+    assert "ValueError: bad snippet" in record["exception"]
+
+def make_record(msg, level=logging.WARNING):
+    return logging.LogRecord("misra.test", level, __file__, 1, msg, None, None)
+
+def test_repeated_warnings_are_sampled_and_counted():
+    sampler = SamplingFilter(burst=2, window=60.0)
+
+    passed = [sampler.filter(make_record("retry %d")) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    # Errors and other templates are never held back
+    assert sampler.filter(make_record("retry %d", logging.ERROR))
+    assert sampler.filter(make_record("other"))
+
+    # The first record of the next window reports what was suppressed
+    sampler.window = 0.0
+    record = make_record("retry %d")
+    assert sampler.filter(record)
+    assert record.suppressed == 3
+
+def test_text_format():
+    record = make_record("Merged output written")
+    record.correlation_id, record.project_id = "abc", "proj"
+
+    line = StructuredFormatter(as_json=False).format(record)
+
+    assert line.endswith("WARNING misra.test: Merged output written [project=proj correlation=abc]")
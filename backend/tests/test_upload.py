@@ -0,0 +1,30 @@
+# test_upload.py - A new source upload starts the project over
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+app = pytest.importorskip("app")
+
+from fastapi.testclient import TestClient
+
+from fix_attribution import AttributionIndex
+
+def test_reupload_clears_previous_attribution(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(app.speculation_settings, "enabled", False)
+    monkeypatch.setitem(app.sessions, "p", {"cpp_file": str(tmp_path / "p_old.cpp"), "original_filename": "old.cpp"})
+    monkeypatch.setitem(
+        app.attributions, "p",
+        AttributionIndex([{"line": 3, "misra": "6-4-1", "warning": "Missing braces"}], {"3": "if (x) {"})
+    )
+    client = TestClient(app.app)
+    assert client.get("/api/violations/p/attribution").status_code == 200
+
+    response = client.post(
+        "/api/upload/cpp-file", data={"projectId": "p"}, files={"file": ("main.cpp", b"int main() { return 0; }\n")}
+    )
+
+    assert response.status_code == 200
+    assert "p" not in app.attributions
+    assert client.get("/api/violations/p/attribution").status_code == 404
@@ -0,0 +1,69 @@
+# test_violation_compaction.py - Deduplicated, grouped violation prompts and the mapping back
+
+from violation_compaction import (
+    format_violations_prompt, group_violations, map_snippets_to_violations, normalize_violations
+)
+
+def violation(line, misra="6-4-1", warning="Missing braces", file="main.cpp", path="src"):
+    return {"file": file, "path": path, "line": line, "misra": misra, "warning": warning}
+
+def test_exact_duplicates_are_dropped_in_report_order():
+    first, second = violation(12), violation(5, misra="5-0-4", warning="Implicit conversion")
+    # Line numbers as text and as numbers are the same violation
+    violations = [first, second, violation("12"), dict(second)]
+
+    assert normalize_violations(violations) == [first, second]
+
+def test_same_line_with_another_rule_is_kept():
+    violations = [violation(12), violation(12, misra="5-0-4")]
+    assert normalize_violations(violations) == violations
+
+def test_groups_collect_sorted_lines_in_order_of_first_appearance():
+    groups = group_violations([
+        violation(30),
+        violation(8, misra="5-0-4", warning="Implicit conversion"),
+        violation(4),
+        violation(30),
+        violation("n/a"),
+    ])
+
+    assert [(g["misra"], g["lines"]) for g in groups] == [("6-4-1", [4, 30]), ("5-0-4", [8])]
+
+def test_groups_are_split_by_file():
+    groups = group_violations([violation(1), violation(2, file="util.cpp")])
+    assert [(g["file"], g["lines"]) for g in groups] == [("main.cpp", [1]), ("util.cpp", [2])]
+
+def test_prompt_factors_out_a_shared_file():
+    prompt = format_violations_prompt([
+        violation(30), violation(4), violation(30), violation(8, misra="5-0-4", warning="Implicit conversion"),
+    ])
+
+    assert prompt.count("File: main.cpp") == 1
+    assert prompt.count("Rule: 6-4-1") == 1
+    assert "Lines: 4, 30\n" in prompt
+    assert prompt.index("Rule: 6-4-1") < prompt.index("Rule: 5-0-4")
+
+def test_prompt_names_the_file_of_each_group_when_files_differ():
+    prompt = format_violations_prompt([violation(1), violation(2, file="util.cpp", path="lib")])
+
+    assert "File: main.cpp\nPath: src\nRule: 6-4-1" in prompt
+    assert "File: util.cpp\nPath: lib\nRule: 6-4-1" in prompt
+
+def test_snippets_map_back_to_every_original_violation():
+    snippets = {"10": "if (x) {", "10a": "}", "11": "y = 1U;", "40": "const int n = 3;"}
+    violations = [violation(10), violation(10), violation(13), violation(40, misra="7-1-1"), violation(90)]
+
+    mapping = map_snippets_to_violations(snippets, violations)
+
+    assert [m["index"] for m in mapping] == [0, 1, 2, 3, 4]
+    assert sorted(mapping[0]["snippetLines"]) == ["10", "10a", "11"]
+    assert mapping[1]["snippetLines"] == mapping[0]["snippetLines"]
+    # A fix landing within the window of the violation's line still counts
+    assert mapping[2]["snippetLines"] == mapping[0]["snippetLines"]
+    assert mapping[3] == {"index": 3, "line": 40, "misra": "7-1-1", "snippetLines": ["40"]}
+    assert mapping[4]["snippetLines"] == []
+
+def test_mapping_without_snippets_is_empty_per_violation():
+    assert map_snippets_to_violations({}, [violation(3)]) == [
+        {"index": 0, "line": 3, "misra": "6-4-1", "snippetLines": []}
+    ]
@@ -0,0 +1,132 @@
+# violation_compaction.py - Compact violation lists into smaller fix prompts
+
+from typing import Any, Dict, List, Optional
+
+from snippet_validation import base_line, snippet_regions
+
+def _line_number(line) -> Optional[int]:
+    try:
+        return int(line)
+    except (TypeError, ValueError):
+        return None
+
+def _identity(v: dict) -> tuple:
+    return (v.get('file'), v.get('path'), _line_number(v.get('line')), v.get('misra'), v.get('warning'))
+
+def normalize_violations(violations: List[dict]) -> List[dict]:
+    """
+    Drop exact duplicate violations, keeping the first occurrence and report order.
+
+    Args:
+        violations: Violations as returned by extract_violations_for_file
+
+    Returns:
+        List of unique violations
+    """
+    seen = set()
+    unique = []
+    for v in violations:
+        identity = _identity(v)
+        if identity not in seen:
+            seen.add(identity)
+            unique.append(v)
+    return unique
+
+def group_violations(violations: List[dict]) -> List[Dict[str, Any]]:
+    """
+    Group violations by file, rule and message, collecting their line numbers.
+
+    Returns:
+        List of groups in order of first appearance, each with
+        'file', 'path', 'misra', 'warning' and sorted 'lines'
+    """
+    groups = {}
+    for v in violations:
+        key = (v.get('file'), v.get('path'), v.get('misra'), v.get('warning'))
+        group = groups.setdefault(key, {
+            'file': v.get('file'),
+            'path': v.get('path'),
+            'misra': v.get('misra'),
+            'warning': v.get('warning'),
+            'lines': set()
+        })
+        line = _line_number(v.get('line'))
+        if line is not None:
+            group['lines'].add(line)
+
+    return [{**group, 'lines': sorted(group['lines'])} for group in groups.values()]
+
+def format_violations_prompt(violations: List[dict]) -> str:
+    """
+    Format violations for the fix prompt with duplicates removed, shared
+    File/Path factored out and one entry per rule and message.
+
+    Args:
+        violations: Violations to send
+
+    Returns:
+        Prompt text listing the violations
+    """
+    groups = group_violations(normalize_violations(violations))
+    locations = {(g['file'], g['path']) for g in groups}
+    shared = len(locations) == 1
+
+    blocks = ["Violations are grouped by rule and message; each group lists every affected line.\n"]
+    if shared:
+        file_name, path = next(iter(locations))
+        blocks.append(f"File: {file_name}\nPath: {path}\n")
+
+    for g in groups:
+        block = ""
+        if not shared:
+            block += f"File: {g['file']}\nPath: {g['path']}\n"
+        block += (
+            f"Rule: {g['misra']}\n"
+            f"Message: {g['warning']}\n"
+            f"Lines: {', '.join(str(line) for line in g['lines'])}\n"
+        )
+        blocks.append(block)
+
+    return "\n".join(blocks)
+
+def map_snippets_to_violations(snippets: dict, violations: List[dict], window: int = 3) -> List[Dict[str, Any]]:
+    """
+    Map returned snippet lines back to each original violation.
+
+    A violation gets the snippet region that contains its line, or the
+    nearest region within `window` lines when the fix landed next to it.
+
+    Args:
+        snippets: Dictionary of line key -> fixed code
+        violations: Original (un-deduplicated) violations
+        window: Maximum distance between a violation and a neighbouring region
+
+    Returns:
+        One entry per violation with its index, line, rule and snippet line keys
+    """
+    regions = snippet_regions(snippets)
+    keys_by_region = {region: [] for region in regions}
+    for key in snippets:
+        line = base_line(key)
+        region = next(r for r in regions if r[0] <= line <= r[1])
+        keys_by_region[region].append(key)
+
+    mapping = []
+    for index, v in enumerate(violations):
+        line = _line_number(v.get('line'))
+        region = None
+        if line is not None and regions:
+            distance, region = min(
+                (max(r[0] - line, line - r[1], 0), r) for r in regions
+            )
+            if distance > window:
+                region = None
+
+        mapping.append({
+            'index': index,
+            'line': line,
+            'misra': v.get('misra'),
+            'snippetLines': keys_by_region[region] if region else []
+        })
+
+    return mapping
@@ -25,6 +25,38 @@ export interface GeminiResponse {
   codeSnippets?: string[];
 }
 
+export interface LineRangeResponse {
+  start: number;
+  count: number;
+  totalLines: number;
+  lines: string[];
+}
+
+export interface ReportDeltaResponse {
+  violations: ViolationResponse[];
+  new: ViolationResponse[];
+  persisting: ViolationResponse[];
+  resolved: ViolationResponse[];
+  hasPrevious: boolean;
+}
+
+export interface AttributionResponse {
+  attribution: {
+    violations: {
+      id: string;
+      line: number | null;
+      misra: string;
+      warning: string;
+      status: 'pending' | 'accepted' | 'rejected' | 'refixed';
+      region: [number, number] | null;
+    }[];
+    regions: { first: number; last: number; keys: string[]; violations: string[] }[];
+  };
+  affected: string[];
+  response?: string;
+  validation?: Record<string, any>;
+}
+
 class ApiClient {
   private baseUrl: string;
 
@@ -90,6 +122,23 @@ class ApiClient {
     });
   }
 
+  async uploadMisraReportDelta(
+    file: File,
+    projectId: string,
+    targetFile: string
+  ): Promise<ApiResponse<ReportDeltaResponse>> {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('projectId', projectId);
+    formData.append('targetFile', targetFile);
+
+    return this.request('/upload/misra-report-delta', {
+      method: 'POST',
+      body: formData,
+      headers: {}, // Let browser set Content-Type for FormData
+    });
+  }
+
   // Processing endpoints
   async addLineNumbers(projectId: string): Promise<ApiResponse<{ numberedFilePath: string }>> {
     return this.request('/process/add-line-numbers', {
@@ -130,6 +179,38 @@ class ApiClient {
     });
   }
 
+  // Per-violation review of the current fixes
+  async getAttribution(projectId: string): Promise<ApiResponse<AttributionResponse>> {
+    return this.request(`/violations/${projectId}/attribution`, {
+      method: 'GET',
+    });
+  }
+
+  async acceptViolations(projectId: string, violationIds: string[]): Promise<ApiResponse<AttributionResponse>> {
+    return this.request('/violations/accept', {
+      method: 'POST',
+      body: JSON.stringify({ projectId, violationIds }),
+    });
+  }
+
+  async rejectViolations(projectId: string, violationIds: string[]): Promise<ApiResponse<AttributionResponse>> {
+    return this.request('/violations/reject', {
+      method: 'POST',
+      body: JSON.stringify({ projectId, violationIds }),
+    });
+  }
+
+  async refixViolations(
+    projectId: string,
+    violationIds: string[],
+    feedback?: string
+  ): Promise<ApiResponse<AttributionResponse>> {
+    return this.request('/violations/refix', {
+      method: 'POST',
+      body: JSON.stringify({ projectId, violationIds, feedback }),
+    });
+  }
+
   // Download endpoints
   async downloadFixedFile(projectId: string): Promise<Blob | null> {
     try {
@@ -146,6 +227,27 @@ class ApiClient {
     }
   }
 
+  async exportFixes(
+    projectIds: string[],
+    format: 'zip' | 'patch' = 'zip',
+    source: 'fixed' | 'temp-fixed' = 'fixed'
+  ): Promise<Blob | null> {
+    try {
+      const params = new URLSearchParams({ format, source });
+      projectIds.forEach(id => params.append('projectIds', id));
+      const response = await fetch(`${this.baseUrl}/export?${params.toString()}`);
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.blob();
+    } catch (error) {
+      console.error('Export failed:', error);
+      return null;
+    }
+  }
+
   // File content endpoints for Fix View Modal
   async getNumberedFile(projectId: string): Promise<string | null> {
     try {
@@ -177,6 +279,19 @@ class ApiClient {
     }
   }
 
+  // Paginated line ranges for virtual scrolling of large files
+  async getNumberedFileLines(projectId: string, start: number, count: number): Promise<ApiResponse<LineRangeResponse>> {
+    return this.request(`/files/numbered/${projectId}/lines?start=${start}&count=${count}`, {
+      method: 'GET',
+    });
+  }
+
+  async getTempFixedFileLines(projectId: string, start: number, count: number): Promise<ApiResponse<LineRangeResponse>> {
+    return this.request(`/files/temp-fixed/${projectId}/lines?start=${start}&count=${count}`, {
+      method: 'GET',
+    });
+  }
+
   // New diff endpoint
   async getDiff(projectId: string): Promise<ApiResponse<{
     original: string, 